@@ -1,21 +1,19 @@
-import json
+from CluodAPI_Terminal_Client import json_codec
 import threading
 import time
+from concurrent.futures import Future
 from CluodAPI_Terminal_Client.key_hold_control import key_control
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler, get_scheduler
+from CluodAPI_Terminal_Client.stick_encoder import encode_stick_control
+from CluodAPI_Terminal_Client.altitude_controller import AltitudeController
+from CluodAPI_Terminal_Client.link_metrics import LinkMetrics
+from CluodAPI_Terminal_Client.stick_lane import StickLane
+from CluodAPI_Terminal_Client.publish_lanes import SAFETY, CONTROL, BULK, get_priority_publisher
+from CluodAPI_Terminal_Client.mqtt_transport import get_transport
+from CluodAPI_Terminal_Client.osd_rate_policy import OSD_RATE_CONTROL
 
 video_id = "1581F7FVC257X00D6KZ2/88-0-0/normal-0"
 
-standard_control_message = {
-    "seq": 0,
-    "method": "stick_control",
-    "data": {
-        "roll": 1024,
-        "pitch": 1024,
-        "throttle": 1024,
-        "yaw": 1024
-    }
-}
-
 standard_camera_message = {
     "data": {
         "payload_index": "88-0-0", #DJI Matrice 4E Camera
@@ -36,10 +34,12 @@ standard_camera_zoom_message = {
 }
 
 class DRC_controler:
-    def __init__(self, gateway_sn, client, flight_state, writer=print, main_writer=print):
+    def __init__(self, gateway_sn, client, flight_state, writer=print, main_writer=print, scheduler: DRCScheduler = None):
         self.gateway_sn = gateway_sn
         self.topic = f"thing/product/{self.gateway_sn}/drc/down" 
         self.seq = 0
+        self.seq_lock = threading.Lock()    # 杆量/心跳/云台指令来自不同线程, seq 分配需互斥
+        self.stick_count = 0                # 已发送的杆量指令数 (统计用)
         self.is_print = False
         self.drc_state = False
         self.writer = writer
@@ -49,126 +49,172 @@ class DRC_controler:
         self.heart_freq = 1.0  # 心跳频率，单位Hz
         self.client = client
         self.flight_state = flight_state
+        # 所有周期流 (杆量/心跳) 由共用调度器驱动, key 为 (gateway_sn, 名称); 杆量流同名互相替换
+        self.scheduler = scheduler or get_scheduler()
+        self.stick_key = (self.gateway_sn, "stick")
+        # 所有下行消息按优先级发布 (同一连接共用); 杆量经合并通道发送: 发送阻塞时只保留最新一条, 不堆积旧杆量
+        self.publisher = get_priority_publisher(self.client)
+        self.stick_lane = StickLane(self.client, self.topic, publisher=self.publisher)
+        self.altitude_controller = None
+        # 按需调整 OSD 频率 (OSDRatePolicy), 由 DJIMQTTClient 设置
+        self.osd_policy = None
+        # 心跳往返/时钟偏差、杆量 -> OSD 响应延迟、OSD 抖动统计
+        self.link = LinkMetrics(self.gateway_sn)
+        self.flight_state.add_listener(self.link.on_osd)
         self.start_heartbeat()
 
-    def send_stick_control_command(self, roll, pitch, throttle, yaw):
+    def next_seq(self):
+        with self.seq_lock:
+            seq = self.seq
+            self.seq += 1
+            return seq
+
+    def send_stick_control_command(self, roll, pitch, throttle, yaw, priority: int = BULK):
         """发送控制命令到DRC"""
-        message = standard_control_message.copy()
-        message["seq"] = self.seq
-        message["data"]["roll"] = roll
-        message["data"]["pitch"] = pitch
-        message["data"]["throttle"] = throttle
-        message["data"]["yaw"] = yaw
-        payload = json.dumps(message)
-        self.client.publish(self.topic, payload)
-        self.seq += 1
+        seq = self.next_seq()
+        self.stick_lane.submit(encode_stick_control(seq, roll, pitch, throttle, yaw), priority)
+        self.stick_count += 1
+        self.link.on_stick(roll, pitch, throttle, yaw, time.time())
         if self.is_print:
-            self.writer(f"已发送控制命令:seq={self.seq} roll={roll}, pitch={pitch}, throttle={throttle}, yaw={yaw}")
+            self.writer(f"已发送控制命令:seq={seq + 1} roll={roll}, pitch={pitch}, throttle={throttle}, yaw={yaw}")
 
-    def send_timing_control_command(self, roll, pitch, throttle, yaw, duration, frequency):
+    def send_timing_control_command(self, roll, pitch, throttle, yaw, duration, frequency, priority: int = BULK):
         """发送定时控制命令到DRC"""
-        interval = 1.0 / frequency
-        total_messages = int(duration * frequency)
-
-        def send_commands():
-            for _ in range(total_messages):
-                self.send_stick_control_command(roll, pitch, throttle, yaw)
-                time.sleep(interval)
-
-        thread = threading.Thread(target=send_commands)
-        thread.daemon = True
-        thread.start()
-
-    def send_stick_to_height(self, height, stick_vlaue):
-        """控制飞机解锁并起飞至指定高度(相对高度)"""
-        def send_commands():
-            self.writer(f"设定相对高度{height}米,起飞指令执行中...")
-            interval = 1.0 / 20
-            total_messages = int(1 * 20)
-            for _ in range(total_messages):
+        def send_command(now):
+            self.send_stick_control_command(roll, pitch, throttle, yaw, priority)
+
+        self.scheduler.add(self.stick_key, send_command, frequency, max_count=int(duration * frequency))
+        self.follow_stick_stream()
+
+    def send_stick_to_height(self, height, stick_vlaue, closed_loop: bool = True) -> Future:
+        """控制飞机解锁并起飞至指定高度(相对高度), 返回在到达 (True) 或中止 (False) 时完成的 Future;
+        closed_loop 时解锁后由 AltitudeController 按每条 OSD 闭环控制, stick_vlaue 为油门最大偏移;
+        否则以固定油门 stick_vlaue 爬升至指定高度"""
+        self.writer(f"设定相对高度{height}米,起飞指令执行中...")
+        frequency = 20
+        unlock_messages = int(1 * frequency)
+        done = Future()
+        if self.osd_policy is not None:
+            # 起飞过程按完整频率接收 OSD, 结束后撤销
+            self.osd_policy.set_demand("altitude", OSD_RATE_CONTROL)
+            done.add_done_callback(lambda future: self.osd_policy.set_demand("altitude"))
+        if closed_loop:
+            controller = AltitudeController(self, height, max_offset=stick_vlaue)
+            self.altitude_controller = controller
+
+            def unlock(now):
                 self.send_stick_control_command(1680, 365, 365, 365)
-                time.sleep(interval)
-            last = time.time()
-            initial_height = self.flight_state.height 
-            self.flight_state.takeoff_height = initial_height
-            while self.flight_state.elevation < height:
-                now = time.time()
-                self.send_stick_control_command(1024, 1024, 1024 + stick_vlaue, 1024)
-                if self.flight_state.elevation < height/10 and now - last > 10:
-                    self.writer(f"无人机{self.gateway_sn}响应超时,请检查连接状态")
-                    break
-                time.sleep(interval)
-            else:
-                self.writer(f"无人机{self.gateway_sn} 已飞行至指定高度,相对起飞高度{self.flight_state.elevation}米")
-
-        thread = threading.Thread(target=send_commands)
-        thread.daemon = True
-        thread.start()
-        
+
+            def climb(stream):
+                # 解锁流被其他指令替换时不再起飞
+                if stream.cancelled:
+                    done.set_result(False)
+                    return
+                self.flight_state.takeoff_height = self.flight_state.height
+                controller.start().add_done_callback(lambda future: done.set_result(future.result()))
+
+            # 先以内八杆位解锁 1 秒, 再交给闭环控制器爬升
+            self.scheduler.add(self.stick_key, unlock, frequency, max_count=unlock_messages, on_done=climb)
+            return done
+
+        state = {"sent": 0, "last": None}
+
+        def send_command(now):
+            # 先以内八杆位解锁 1 秒, 再推油门爬升至指定高度
+            if state["sent"] < unlock_messages:
+                self.send_stick_control_command(1680, 365, 365, 365)
+                state["sent"] += 1
+                return True
+            snap = self.flight_state.snapshot()
+            if state["last"] is None:
+                state["last"] = now
+                self.flight_state.takeoff_height = snap.height
+            # 尚未收到含高度的 OSD 时 elevation 为 None, 按未到达处理
+            elevation = snap.elevation
+            if elevation is not None and elevation >= height:
+                self.writer(f"无人机{self.gateway_sn} 已飞行至指定高度,相对起飞高度{elevation}米")
+                state["ok"] = True
+                return False
+            self.send_stick_control_command(1024, 1024, 1024 + stick_vlaue, 1024)
+            if (elevation is None or elevation < height/10) and now - state["last"] > 10:
+                self.writer(f"无人机{self.gateway_sn}响应超时,请检查连接状态")
+                return False
+            return True
+
+        self.scheduler.add(self.stick_key, send_command, frequency, on_done=lambda stream: done.set_result(state.get("ok", False)))
+        return done
+
+    def preempt_sticks(self):
+        """安全指令发出前调用: 结束当前杆量流 (起飞、定时指令、键盘控制) 并丢弃未发出的杆量"""
+        self.scheduler.cancel(self.stick_key)
+        self.stick_lane.clear()
+
     def send_land_command(self):
-        def send_commands():
-            limit_time = 30
-            last_time = time.time()
-            while True:
-                self.send_stick_control_command(1024, 1024, 365, 1024)
-                now_time = time.time()
-                if now_time - last_time > limit_time:
-                    (f"无人机{self.gateway_sn}降落超时,请检查连接状态")
-                    break
-                if self.flight_state.mode_code == 0:
-                    (f"无人机{self.gateway_sn}降落成功,正在待机")
-                    break
-                time.sleep(0.1)
-
-        thread = threading.Thread(target=send_commands)
-        thread.daemon = True
-        thread.start()
+        self.preempt_sticks()
+        limit_time = 30
+        last_time = time.perf_counter()
+
+        def send_command(now):
+            self.send_stick_control_command(1024, 1024, 365, 1024, SAFETY)
+            if now - last_time > limit_time:
+                self.writer(f"无人机{self.gateway_sn}降落超时,请检查连接状态")
+                return False
+            if self.flight_state.mode_code == 0:
+                self.writer(f"无人机{self.gateway_sn}降落成功,正在待机")
+                return False
+            return True
+
+        self.scheduler.add(self.stick_key, send_command, 10)
+        self.follow_stick_stream()
+
+    def follow_stick_stream(self):
+        """杆量流开始后立即按控制频率接收 OSD, 不等 OSDRatePolicy 的周期检查"""
+        if self.osd_policy is not None:
+            self.osd_policy.update()
+
+    def stop_stick_stream(self):
+        """取消当前的杆量指令流"""
+        return self.scheduler.cancel(self.stick_key)
 
     def send_camera_reset_command(self, user_input_num):
         """发送云台复位命令到DRC"""
-        message = standard_camera_message.copy()
-        message["seq"] = self.seq
-        message["data"]["reset_mode"] = user_input_num
-        payload = json.dumps(message)
-        self.client.publish(self.topic, payload)
-        self.seq += 1
+        message = {**standard_camera_message, "data": {**standard_camera_message["data"], "reset_mode": user_input_num}}
+        message["seq"] = self.next_seq()
+        payload = json_codec.dumps(message)
+        self.publisher.publish(self.topic, payload, BULK)
 
     def send_camera_zoom_command(self, user_input_num):
         """发送云台变焦命令到DRC"""
-        message = standard_camera_zoom_message.copy()
-        message["seq"] = self.seq
-        message["data"]["zoom_factor"] = user_input_num
-        payload = json.dumps(message)
-        self.client.publish(self.topic, payload)
-        self.seq += 1
+        message = {**standard_camera_zoom_message, "data": {**standard_camera_zoom_message["data"], "zoom_factor": user_input_num}}
+        message["seq"] = self.next_seq()
+        payload = json_codec.dumps(message)
+        self.publisher.publish(self.topic, payload, BULK)
 
     def publish_heartbeat(self):
         if self.is_beat:
+            seq = self.next_seq()
+            sent_ts = time.time()
             heartbeat_msg = {
-                "data": {"timestamp": int(time.time()*100)},
+                "data": {"timestamp": int(sent_ts * 1000)},
                 "method": "heart_beat",
-                "seq": self.seq,
+                "seq": seq,
             }
-            self.client.publish(self.topic, payload=json.dumps(heartbeat_msg), qos=1)
-            self.seq += 1
+            self.link.on_heartbeat_sent(seq, sent_ts)
+            self.publisher.publish(self.topic, json_codec.dumps(heartbeat_msg), CONTROL, qos=1)
 
     def start_heartbeat(self):
-        def heartbeat_loop():
-            while True:
-                try:
-                    self.publish_heartbeat()
-                except Exception as e:
-                    self.writer(f"心跳线程错误: {e}")
-                time.sleep(1.0 / self.heart_freq)
-        t = threading.Thread(target=heartbeat_loop)
-        t.daemon = True
-        t.start()
+        def send_heartbeat(now):
+            self.publish_heartbeat()
+
+        # 心跳必须一直运行: 回调出错时不结束该流
+        self.scheduler.add((self.gateway_sn, "heartbeat"), send_heartbeat, self.heart_freq, persistent=True)
 
     def command_unlock(self):
         self.send_timing_control_command(1680, 365, 365, 365, 2, 10)
 
     def command_lock(self):
-        self.send_timing_control_command(1024, 1024, 365, 1024, 2, 10)
+        self.preempt_sticks()
+        self.send_timing_control_command(1024, 1024, 365, 1024, 2, 10, priority=SAFETY)
 
     def command_key_control(self):
         key_control(self)
@@ -225,6 +271,20 @@ class DRC_controler:
         self.is_beat = not self.is_beat
         self.main_writer("DRC心跳是否开启:", self.is_beat)
 
+    def command_print_streams(self):
+        self.main_writer(f"无人机{self.gateway_sn} 周期指令流:")
+        self.main_writer(self.scheduler.get_stats_str(self.gateway_sn))
+        self.main_writer(self.stick_lane.get_stats_str())
+        self.main_writer(self.publisher.get_stats_str())
+
+    def command_print_link_stats(self):
+        self.main_writer(self.link.get_stats_str())
+        if self.osd_policy is not None:
+            self.main_writer(self.osd_policy.get_stats_str())
+        transport = get_transport(self.client)
+        if transport is not None:
+            self.main_writer(transport.get_stats_str())
+
     def command_change_drc_print(self):
         self.is_print = not self.is_print
         self.main_writer("DRC消息是否开启:", self.is_print)  
@@ -0,0 +1,175 @@
+"""事件驱动的闭环高度控制
+
+原 send_stick_to_height 在 20 Hz 周期里轮询 elevation, 以固定油门爬升, 到达目标高度才松杆,
+惯性会让飞机冲过目标高度, 每一拍都发一条杆量。AltitudeController:
+- 在 FlightState 上注册 OSD 监听, 每条新的 OSD 样本到达时立即计算油门, 不再按固定周期轮询
+- 油门偏移 = kp * 高度误差 + ki * 积分 - kd * vertical_speed; 微分项直接用 OSD 的垂直速度,
+  积分只在误差 INTEGRAL_ZONE 以内累积, 避免爬升阶段积分饱和;
+  输出限制在 ±max_offset, 每秒变化不超过 slew_rate
+- 油门变化小于 STICK_DEADBAND 时不重发, 但至少每 1/MIN_STICK_FREQ 秒发送一次, 保持杆量流不中断
+- 误差在 tolerance 以内且垂直速度在 SETTLE_SPEED 以内持续 settle_time 秒视为稳定, 回中杆量并结束
+- 调度器上占用该机的杆量 key 运行低频看门狗流: OSD 中断时回中补发、检查超时;
+  其他杆量指令 (降落、定时指令、键盘控制) 替换该 key 时控制器随之结束
+每一步记录 (时间, 高度, 油门, OSD 处理延迟, 发布耗时), 结束时输出统计; DRC 打印开启时逐步输出。
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+STICK_CENTER = 1024
+
+ALT_KP = 300.0              # 杆量 / 米
+ALT_KI = 20.0               # 杆量 / (米·秒)
+ALT_KD = 60.0               # 杆量 / (米/秒)
+INTEGRAL_ZONE = 1.0         # 误差在该范围内才累积积分 (米)
+SLEW_RATE = 1500.0          # 油门每秒最大变化 (杆量)
+STICK_DEADBAND = 4          # 油门变化小于该值不重发 (杆量)
+MIN_STICK_FREQ = 10.0       # 杆量最低发送频率 (Hz)
+WATCHDOG_FREQ = 10.0        # 看门狗流频率 (Hz)
+SETTLE_TOLERANCE = 0.3      # 稳定判据: 高度误差 (米)
+SETTLE_SPEED = 0.3          # 稳定判据: 垂直速度 (米/秒)
+SETTLE_TIME = 0.5           # 稳定判据: 持续时间 (秒)
+OSD_STALE = 1.0             # 超过该时间没有新 OSD 则回中等待 (秒)
+CLIMB_TIMEOUT = 10.0        # 该时间后仍未升到目标高度的 1/10 视为无响应 (秒)
+ALTITUDE_TIMEOUT = 60.0     # 总超时 (秒)
+
+
+def _clamp(value, limit):
+    return max(-limit, min(limit, value))
+
+
+class AltitudeController:
+    def __init__(self, drc_controler, target: float, max_offset: float = 400, kp: float = ALT_KP, ki: float = ALT_KI,
+                 kd: float = ALT_KD, slew_rate: float = SLEW_RATE, tolerance: float = SETTLE_TOLERANCE,
+                 settle_time: float = SETTLE_TIME, timeout: float = ALTITUDE_TIMEOUT, writer=None):
+        """target: 相对起飞点高度 (米); max_offset: 油门偏离中位的最大杆量"""
+        self.drc = drc_controler
+        self.flight_state = drc_controler.flight_state
+        self.target = target
+        self.max_offset = abs(max_offset)
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.slew_rate = slew_rate
+        self.tolerance = tolerance
+        self.settle_time = settle_time
+        self.timeout = timeout
+        self.writer = writer or drc_controler.writer
+        self.lock = threading.Lock()    # OSD 回调 (网络线程) 与看门狗 (调度线程) 互斥
+        self.done = Future()
+        self.stream = None
+        self.integral = 0.0
+        self.output = 0.0
+        self.last_step = None
+        self.last_send = 0.0
+        self.last_throttle = None
+        self.settle_since = None
+        # 统计
+        self.start_time = None
+        self.elapsed = 0.0
+        self.commands = 0
+        self.max_elevation = None
+        self.steps = []     # (时间, 高度, 油门, OSD 处理延迟, 发布耗时 或 None)
+
+    def start(self) -> Future:
+        """开始控制, 返回的 Future 在稳定 (True) 或中止 (False) 时完成"""
+        self.start_time = time.perf_counter()
+        self.stream = self.drc.scheduler.add(self.drc.stick_key, self._watchdog, WATCHDOG_FREQ, on_done=self._on_stream_done)
+        self.flight_state.add_listener(self.on_osd)
+        return self.done
+
+    def _send(self, throttle, now):
+        t0 = time.perf_counter()
+        self.drc.send_stick_control_command(STICK_CENTER, STICK_CENTER, throttle, STICK_CENTER)
+        self.last_send = now
+        self.last_throttle = throttle
+        self.commands += 1
+        return time.perf_counter() - t0
+
+    def on_osd(self, snap):
+        elevation = snap.elevation
+        if elevation is None:
+            return
+        with self.lock:
+            if self.done.done() or self.stream is None or self.stream.cancelled:
+                return
+            now = time.perf_counter()
+            osd_latency = time.time() - snap.recv_ts
+            dt = now - self.last_step if self.last_step is not None else 0.0
+            self.last_step = now
+            if self.max_elevation is None or elevation > self.max_elevation:
+                self.max_elevation = elevation
+            error = self.target - elevation
+            vertical_speed = snap.vertical_speed or 0.0
+
+            if abs(error) <= self.tolerance and abs(vertical_speed) <= SETTLE_SPEED:
+                self.settle_since = self.settle_since or now
+                if now - self.settle_since >= self.settle_time:
+                    self._finish(True, f"已稳定在指定高度,相对起飞高度{elevation:.2f}米")
+                    return
+            else:
+                self.settle_since = None
+            if now - self.start_time > CLIMB_TIMEOUT and elevation < self.target / 10:
+                self._finish(False, "响应超时,请检查连接状态")
+                return
+
+            if abs(error) <= INTEGRAL_ZONE:
+                self.integral = _clamp(self.integral + error * dt, self.max_offset / max(self.ki, 1e-6))
+            command = _clamp(self.kp * error + self.ki * self.integral - self.kd * vertical_speed, self.max_offset)
+            self.output += _clamp(command - self.output, self.slew_rate * dt)
+            throttle = STICK_CENTER + round(self.output)
+            send_time = None
+            if self.last_throttle is None or abs(throttle - self.last_throttle) >= STICK_DEADBAND \
+                    or now - self.last_send >= 1.0 / MIN_STICK_FREQ:
+                send_time = self._send(throttle, now)
+            step = (now - self.start_time, elevation, throttle, osd_latency, send_time)
+            self.steps.append(step)
+        if self.drc.is_print:
+            self.writer(f"高度控制 t={step[0]:.2f}s 高度={elevation:.2f} 油门={throttle} "
+                        f"OSD延迟={osd_latency * 1000:.1f}ms" + (f" 发布={send_time * 1e6:.0f}us" if send_time is not None else ""))
+
+    def _watchdog(self, now):
+        with self.lock:
+            if self.done.done():
+                return False
+            if now - self.start_time > self.timeout:
+                self._finish(False, f"{self.timeout:.0f}秒内未能稳定在指定高度")
+                return False
+            recv_ts = self.flight_state.recv_ts
+            if recv_ts is None or time.time() - recv_ts > OSD_STALE:
+                # 没有新的 OSD, 回中悬停等待
+                self.output = 0.0
+                self.integral = 0.0
+                self._send(STICK_CENTER, now)
+            elif now - self.last_send >= 1.0 / MIN_STICK_FREQ:
+                self._send(self.last_throttle or STICK_CENTER, now)
+        return True
+
+    def _on_stream_done(self, stream):
+        with self.lock:
+            if not self.done.done():
+                self._finish(False, "被其他杆量指令接替")
+
+    def _finish(self, ok, message):
+        """调用方持有 self.lock"""
+        self.elapsed = time.perf_counter() - self.start_time
+        self.flight_state.remove_listener(self.on_osd)
+        if ok:
+            # 油门回中悬停, 并结束看门狗流
+            self._send(STICK_CENTER, time.perf_counter())
+            if self.drc.scheduler.get(self.drc.stick_key) is self.stream:
+                self.drc.scheduler.cancel(self.drc.stick_key)
+        self.writer(f"无人机{self.drc.gateway_sn} {message}")
+        self.writer(f"无人机{self.drc.gateway_sn} 高度控制: {self.get_stats_str()}")
+        self.done.set_result(ok)
+
+    def get_stats_str(self):
+        latencies = [step[3] for step in self.steps]
+        send_times = [step[4] for step in self.steps if step[4] is not None]
+        overshoot = max(0.0, self.max_elevation - self.target) if self.max_elevation is not None else 0.0
+        text = f"用时 {self.elapsed:.2f} 秒, OSD {len(self.steps)} 条, 杆量 {self.commands} 条, 超调 {overshoot:.2f} 米"
+        if latencies:
+            text += f", OSD 处理延迟 平均 {sum(latencies) / len(latencies) * 1000:.2f} ms / 最大 {max(latencies) * 1000:.2f} ms"
+        if send_times:
+            text += f", 发布 平均 {sum(send_times) / len(send_times) * 1e6:.0f} us / 最大 {max(send_times) * 1e6:.0f} us"
+        return text
@@ -0,0 +1,218 @@
+"""DRC 周期指令流调度器
+
+原先每条定时杆量指令、起飞/降落流程和每架无人机的心跳都各占一个线程, 用 time.sleep 控制节奏,
+频率会漂移, 线程数随机群规模和指令数增长。DRCScheduler 用一个线程 + 按截止时间排序的堆
+驱动所有无人机的所有周期流:
+- 每条流按绝对截止时间 start + n * interval 触发, 不累积 sleep 误差; 落后超过一个周期时跳过错过的拍
+- 流以 key (通常为 (gateway_sn, 名称)) 标识, 同 key 新流替换旧流, 可随时取消
+- 每条流统计实际频率、平均/最大抖动和跳拍数
+回调在调度线程中执行, 应只做发布等短操作; 回调返回 False 时结束该流, 连续 MAX_CALLBACK_ERRORS 次抛出异常时也结束该流
+(只打印这几次错误, 不会按流的频率一直刷屏)。persistent=True 的流 (心跳、OSD 频率检查) 出错后继续调度,
+错误日志每 ERROR_LOG_INTERVAL 秒最多打印一次。流在回调执行期间被取消时同样调用 on_done。
+"""
+import heapq
+import itertools
+import threading
+import time
+
+MAX_CALLBACK_ERRORS = 5     # 回调连续出错多少次后结束该流 (persistent 流除外)
+ERROR_LOG_INTERVAL = 10.0   # persistent 流错误日志的最小间隔 (秒)
+
+
+class PeriodicStream:
+    __slots__ = ("key", "callback", "interval", "deadline", "end_time", "max_count", "on_done",
+                 "cancelled", "persistent", "count", "missed", "errors", "last_error_log", "first_fire", "last_fire", "jitter_sum", "jitter_max")
+
+    def __init__(self, key, callback, interval, start, end_time=None, max_count=None, on_done=None, persistent=False):
+        self.key = key
+        self.callback = callback
+        self.interval = interval
+        self.deadline = start
+        self.end_time = end_time
+        self.max_count = max_count
+        self.on_done = on_done
+        self.cancelled = False
+        self.persistent = persistent
+        self.count = 0
+        self.missed = 0
+        self.errors = 0         # 连续出错次数
+        self.last_error_log = None
+        self.first_fire = None
+        self.last_fire = None
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+
+    @property
+    def rate(self):
+        if self.count < 2:
+            return 0.0
+        return (self.count - 1) / (self.last_fire - self.first_fire)
+
+    @property
+    def jitter_mean(self):
+        return self.jitter_sum / self.count if self.count else 0.0
+
+    def get_stats_str(self):
+        name = self.key[-1] if isinstance(self.key, tuple) else self.key
+        return (f"{name}: 目标 {1.0 / self.interval:.1f} Hz, 实际 {self.rate:.2f} Hz, 已发 {self.count}, 跳拍 {self.missed}, "
+                f"抖动 平均 {self.jitter_mean * 1000:.2f} ms / 最大 {self.jitter_max * 1000:.2f} ms")
+
+
+class DRCScheduler:
+    def __init__(self, writer=print):
+        self.writer = writer
+        self.streams = {}   # key -> PeriodicStream
+        self.heap = []      # (deadline, seq, stream)
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+
+    def add(self, key, callback, frequency: float, duration: float = None, max_count: int = None,
+            on_done=None, start_delay: float = 0.0, persistent: bool = False):
+        """新建周期流, 同 key 的旧流被取消;
+        callback(now) 返回 False 时结束; duration / max_count 限制持续时间 / 次数;
+        on_done(stream) 在流结束 (含取消) 时于调度线程中调用;
+        persistent: 回调抛出异常时不结束该流 (心跳等必须一直运行的流)"""
+        now = time.perf_counter()
+        start = now + start_delay
+        stream = PeriodicStream(key, callback, 1.0 / frequency, start,
+                                end_time=start + duration if duration is not None else None,
+                                max_count=max_count, on_done=on_done, persistent=persistent)
+        with self.cond:
+            old = self.streams.get(key)
+            if old is not None:
+                old.cancelled = True
+            self.streams[key] = stream
+            heapq.heappush(self.heap, (stream.deadline, next(self.seq), stream))
+            self.cond.notify()
+        self.start()
+        return stream
+
+    def cancel(self, key):
+        with self.cond:
+            stream = self.streams.pop(key, None)
+            if stream is not None:
+                stream.cancelled = True
+                self.cond.notify()
+        return stream is not None
+
+    def cancel_owner(self, owner):
+        """取消 key 为 (owner, ...) 的所有流"""
+        with self.cond:
+            for key in [key for key in self.streams if isinstance(key, tuple) and key[0] == owner]:
+                self.streams.pop(key).cancelled = True
+            self.cond.notify()
+
+    def get(self, key):
+        return self.streams.get(key)
+
+    def active(self, owner=None):
+        return [stream for key, stream in list(self.streams.items())
+                if owner is None or (isinstance(key, tuple) and key[0] == owner)]
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify()
+
+    def _finish(self, stream):
+        with self.cond:
+            if self.streams.get(stream.key) is stream:
+                del self.streams[stream.key]
+        if stream.on_done is not None:
+            try:
+                stream.on_done(stream)
+            except Exception as e:
+                self.writer(f"调度流 {stream.key} 结束回调出错: {e}")
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self.cond:
+                while not self.stop_event.is_set():
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+                    deadline, _, stream = self.heap[0]
+                    if stream.cancelled:
+                        heapq.heappop(self.heap)
+                        break
+                    delay = deadline - time.perf_counter()
+                    if delay <= 0:
+                        heapq.heappop(self.heap)
+                        break
+                    self.cond.wait(delay)
+                else:
+                    return
+            if stream.cancelled:
+                if stream.on_done is not None:
+                    self._finish(stream)
+                continue
+            now = time.perf_counter()
+            if stream.end_time is not None and now >= stream.end_time:
+                self._finish(stream)
+                continue
+            # 统计
+            lateness = now - deadline
+            stream.jitter_sum += lateness
+            stream.jitter_max = max(stream.jitter_max, lateness)
+            if stream.first_fire is None:
+                stream.first_fire = now
+            stream.last_fire = now
+            stream.count += 1
+            try:
+                keep = stream.callback(now)
+                stream.errors = 0
+            except Exception as e:
+                stream.errors += 1
+                if stream.persistent:
+                    keep = True
+                    if stream.last_error_log is None or now - stream.last_error_log >= ERROR_LOG_INTERVAL:
+                        stream.last_error_log = now
+                        self.writer(f"调度流 {stream.key} 执行出错: {e} (连续 {stream.errors} 次, 继续运行)")
+                else:
+                    keep = stream.errors < MAX_CALLBACK_ERRORS
+                    self.writer(f"调度流 {stream.key} 执行出错: {e}" + ("" if keep else f", 连续出错 {stream.errors} 次, 已结束"))
+            if keep is False or (stream.max_count is not None and stream.count >= stream.max_count):
+                self._finish(stream)
+                continue
+            # 下一个绝对截止时间, 落后超过一个周期时跳过错过的拍
+            next_deadline = deadline + stream.interval
+            if next_deadline < now:
+                skipped = int((now - next_deadline) / stream.interval) + 1
+                stream.missed += skipped
+                next_deadline += skipped * stream.interval
+            stream.deadline = next_deadline
+            with self.cond:
+                cancelled = stream.cancelled
+                if not cancelled:
+                    heapq.heappush(self.heap, (next_deadline, next(self.seq), stream))
+            if cancelled:
+                # 回调执行期间被取消 (如安全指令抢占正在执行的杆量流), 仍需通知 on_done
+                self._finish(stream)
+
+    def get_stats_str(self, owner=None):
+        streams = self.active(owner)
+        if not streams:
+            return "无活动的周期指令流"
+        return "\n".join(stream.get_stats_str() for stream in streams)
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> DRCScheduler:
+    """进程内共用的调度器, 所有 DRC_controler 默认使用它"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = DRCScheduler()
+        return _default_scheduler
@@ -0,0 +1,64 @@
+"""机群共用的单条 MQTT 连接
+
+原先每架无人机一个 mqtt.Client + 一个 loop_forever 线程, 连接数和网络线程数随机群规模线性增长。
+FleetConnection 只建立一条连接, 用通配符订阅所有网关的上行 topic,
+再按 topic 中的 gateway_sn 把消息路由到对应无人机的分发表。
+连接经 MQTTTransport 建立 (MQTT_PROTOCOL=5 时使用 topic 别名与持久会话, 会话恢复时不重新订阅)。
+"""
+import threading
+import paho.mqtt.client as mqtt
+from CluodAPI_Terminal_Client.mqtt_transport import MQTTTransport, create_client, make_client_id
+
+FLEET_TOPICS = [
+    "thing/product/+/drc/up",
+    "thing/product/+/events",
+    "thing/product/+/services_reply",
+    "sys/product/+/status",
+]
+
+
+class FleetConnection:
+    def __init__(self, host_addr, username, password, port: int = 1883, is_deamon: bool = True, writer=print, client=None):
+        """client: 可传入与 paho 接口兼容的客户端(如 LoopbackClient), 默认新建 paho 客户端"""
+        self.host_addr = host_addr
+        self.port = port
+        self.is_deamon = is_deamon
+        self.writer = writer
+        self.routes = {}    # gateway_sn -> dispatch(topic, payload)
+        self.unrouted = 0
+        self.client = client or create_client(make_client_id("fleet"))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.username_pw_set(f"{username}", password)
+        self.transport = MQTTTransport(self.client)
+
+    def add_route(self, gateway_sn, dispatch):
+        """注册一架无人机, dispatch(topic, payload) 通常为 DJIMQTTClient.dispatcher.dispatch"""
+        self.routes[gateway_sn] = dispatch
+
+    def remove_route(self, gateway_sn):
+        self.routes.pop(gateway_sn, None)
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        self.writer(f"Fleet connection ({len(self.routes)} UAV) connected with result code " + str(rc))
+        if self.transport.session_present:
+            return
+        client.subscribe([(topic, 0) for topic in FLEET_TOPICS])
+
+    def on_message(self, client: mqtt.Client, userdata, msg: mqtt.MQTTMessage):
+        topic = msg.topic
+        # thing/product/{sn}/... 与 sys/product/{sn}/status 中 sn 都在第三段
+        dispatch = self.routes.get(topic.split("/", 3)[2])
+        if dispatch is None:
+            self.unrouted += 1
+            return
+        dispatch(topic, msg.payload)
+
+    def run(self):
+        """运行共享连接的网络线程"""
+        thread = threading.Thread(target=self.transport.loop_forever, args=(self.host_addr, self.port, 60))
+        thread.daemon = self.is_deamon
+        thread.start()
+
+    def disconnect(self):
+        self.client.disconnect()
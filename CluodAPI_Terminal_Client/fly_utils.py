@@ -1,11 +1,18 @@
-import uuid
+import os
+import threading
+from collections import namedtuple
+from CluodAPI_Terminal_Client.telemetry_ring import TelemetryRing
 from geopy.distance import geodesic
 from geopy.point import Point
 import time
 
+# UUID 第 17 位十六进制数字 (variant) 只能是 8/9/a/b
+_UUID_VARIANT = dict(zip("0123456789abcdef", "89ab89ab89ab89ab"))
+
 def generate_uuid():
-    """生成标准UUID格式的随机ID"""
-    return str(uuid.uuid4())
+    """生成标准UUID格式的随机ID, 与 str(uuid.uuid4()) 格式相同 (version 4), 不构造 UUID 对象"""
+    h = os.urandom(16).hex()
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{_UUID_VARIANT[h[16]]}{h[17:20]}-{h[20:]}"
 
 def move_coordinates(lat, lon, distance_east, distance_north):
     """
@@ -59,33 +66,112 @@ class Time_counter:
     def get_time_minus(self):
         return self.now_time - self.last_time
 
+# 一次完整状态的不可变快照, 读取方拿到后字段之间保证来自同一条 OSD 消息
+OSDSnapshot = namedtuple("OSDSnapshot", [
+    "version",              # 每次更新 +1
+    "recv_ts",              # 收到该 OSD 消息的本地时间 (time.time())
+    "lon", "lat", "height", "elevation", "attitude_head",
+    "horizontal_speed", "vertical_speed",
+    "mode_code", "battery_percentage",
+])
+
+EMPTY_SNAPSHOT = OSDSnapshot(0, 0.0, None, None, None, None, None, None, None, None, None)
+
+
 class FlightState:
+    """无人机状态
+
+    网络线程整包更新: 在锁内基于当前快照构造新的 OSDSnapshot 再替换引用;
+    读取方调用 snapshot() 直接取引用, 不加锁, 也不会读到半条消息。
+    lat / lon / elevation 等属性保留原有读取方式, 每次访问各取一次最新快照,
+    需要多个字段一致时请使用 snapshot()。
+    ring 保存近期位置/航向样本, 用于按视频帧采集时刻插值位姿。
+    add_listener 注册的回调在每条 OSD 整包更新后于网络线程中以新快照调用, 用于事件驱动的控制。
+    """
+    __slots__ = ("_snap", "_lock", "ring", "takeoff_height", "device_sn", "_listeners")
     mode_dict = {0:"待机",1:"起飞准备",2:"起飞准备完毕",3:"手动飞行",
                  4:"自动起飞",5:"航线飞行",6:"全景拍照",7:"智能跟随",
                  8:"ADS-B 躲避",9:"自动返航",10:"自动降落",11:"强制降落",
                  12:"三桨叶降落",13:"升级中",14:"未连接",15:"APAS",
                  16:"虚拟摇杆状态",17:"指令飞行"}
-    def __init__(self):
-        self.lon = None
-        self.lat = None
-        self.height = None
-        self.attitude_head = None
-        self.mode_code = None
+    def __init__(self, ring_capacity: int = 1024):
+        self._snap = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self.ring = TelemetryRing(ring_capacity)
         self.takeoff_height = None
-        self.battery_percentage = None
         self.device_sn = None
-        self.elevation = None
+        self._listeners = ()
+
+    def snapshot(self) -> OSDSnapshot:
+        return self._snap
+
+    def add_listener(self, callback):
+        """callback(snap) 在每条 OSD 更新后调用, 应只做短操作"""
+        with self._lock:
+            self._listeners = self._listeners + (callback,)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners = tuple(listener for listener in self._listeners if listener != callback)
+
+    def update_osd(self, data: dict, recv_ts: float):
+        """用一条 osd_info_push 的 data 整包更新位置/姿态/速度"""
+        lon = data.get("longitude", None)
+        lat = data.get("latitude", None)
+        elevation = data.get("elevation", None)
+        attitude_head = data.get("attitude_head", None)
+        with self._lock:
+            snap = self._snap
+            self._snap = snap._replace(
+                version=snap.version + 1,
+                recv_ts=recv_ts,
+                lon=lon,
+                lat=lat,
+                height=data.get("height", None),
+                elevation=elevation,
+                attitude_head=attitude_head,
+                horizontal_speed=data.get("horizontal_speed", None),
+                vertical_speed=data.get("vertical_speed", None),
+            )
+            if lat is not None and lon is not None and elevation is not None and attitude_head is not None:
+                self.ring.push(recv_ts, lat, lon, elevation, attitude_head)
+            snap = self._snap
+            listeners = self._listeners
+        # 回调在锁外执行, 回调中可以注销自己
+        for listener in listeners:
+            listener(snap)
+
+    def update_mode(self, mode_code):
+        with self._lock:
+            snap = self._snap
+            self._snap = snap._replace(version=snap.version + 1, mode_code=mode_code)
+
+    def update_battery(self, battery_percentage):
+        with self._lock:
+            snap = self._snap
+            self._snap = snap._replace(version=snap.version + 1, battery_percentage=battery_percentage)
+
+    lon = property(lambda self: self._snap.lon)
+    lat = property(lambda self: self._snap.lat)
+    height = property(lambda self: self._snap.height)
+    elevation = property(lambda self: self._snap.elevation)
+    attitude_head = property(lambda self: self._snap.attitude_head)
+    mode_code = property(lambda self: self._snap.mode_code)
+    battery_percentage = property(lambda self: self._snap.battery_percentage)
+    version = property(lambda self: self._snap.version)
+    recv_ts = property(lambda self: self._snap.recv_ts)
 
     def get_uav_info_str(self):
         # 将每个属性单独成行，便于在终端或 TUI 中分行显示
+        snap = self._snap
         lines = [
-            f"经度: {self.lon if self.lon is not None else '未知'}",
-            f"纬度: {self.lat if self.lat is not None else '未知'}",
-            f"高度: {self.height:.2f} 米" if self.height is not None else '高度: 未知',
-            f"相对起飞高度: {self.elevation:.2f} 米" if self.elevation is not None else '相对起飞高度: 未知',
-            f"航向: {self.attitude_head if self.attitude_head is not None else '未知'} 度",
-            f"模式: {self.mode_dict.get(self.mode_code, '未知模式') if self.mode_code is not None else '未知'}",
-            f"电池电量: {self.battery_percentage if self.battery_percentage is not None else '未知'}%",
+            f"经度: {snap.lon if snap.lon is not None else '未知'}",
+            f"纬度: {snap.lat if snap.lat is not None else '未知'}",
+            f"高度: {snap.height:.2f} 米" if snap.height is not None else '高度: 未知',
+            f"相对起飞高度: {snap.elevation:.2f} 米" if snap.elevation is not None else '相对起飞高度: 未知',
+            f"航向: {snap.attitude_head if snap.attitude_head is not None else '未知'} 度",
+            f"模式: {self.mode_dict.get(snap.mode_code, '未知模式') if snap.mode_code is not None else '未知'}",
+            f"电池电量: {snap.battery_percentage if snap.battery_percentage is not None else '未知'}%",
             f"设备SN: {self.device_sn if self.device_sn is not None else '未知'}",
         ]
         return "\n".join(lines)
@@ -0,0 +1,130 @@
+"""多航点指点飞行任务
+
+publish_flyto_list_command 每个航点一次 fly_to_point, 等到 wayline_ok 再发下一个,
+每个点都要付出一次指令往返并在航点处停住。FlyToMission 把航线打包成尽量少的请求:
+- 每条 fly_to_point 携带最多 chunk_size 个点 (data.points 本身就是列表)
+- 按 fly_to_point_progress 中的 way_point_index 跟踪整条航线上的当前点
+- 当前段飞到最后一个点且 remaining_time 小于 lead_time 时提前发送下一段,
+  新指令接替旧指令, 不在段间停顿; 被接替的旧段随后的 wayline_cancel 被忽略
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# 单条 fly_to_point 允许的最大航点数, 取决于机型/固件
+FLYTO_MAX_POINTS = int(os.environ.get("FLYTO_MAX_POINTS", "20"))
+# 当前段剩余时间小于该值时发送下一段 (秒)
+MISSION_LEAD_TIME = 3.0
+
+
+class FlyToMission:
+    def __init__(self, publisher, pos_list, chunk_size: int = FLYTO_MAX_POINTS, lead_time: float = MISSION_LEAD_TIME,
+                 max_speed=None, writer=print):
+        """publisher: Ser_puberlisher; pos_list: [[lat, lon, 相对起飞点高度], ...]"""
+        self.publisher = publisher
+        self.pos_list = pos_list
+        self.chunk_size = max(1, chunk_size)
+        self.lead_time = lead_time
+        self.max_speed = max_speed
+        self.writer = writer
+        self.done = Future()
+        # 应答/进度 (网络线程、超时清理线程) 与 cancel() (界面线程、返航) 可能同时结束任务, 只取第一个结果
+        self.finish_lock = threading.Lock()
+        self.finished = False
+        self.chunk = None           # (fly_to_id, 起始下标, 结束下标)
+        self.next_start = 0         # 下一段的起始下标
+        self.current_index = 0      # 整条航线上正在飞往的点
+        # 统计
+        self.requests = 0
+        self.start_time = None
+        self.elapsed = 0.0
+
+    def start(self) -> Future:
+        self.start_time = time.perf_counter()
+        self.writer("="*50)
+        self.writer(f"无人机{self.publisher.gateway_sn}开始执行航线任务,共{len(self.pos_list)}个点,每段最多{self.chunk_size}个点")
+        if not self.pos_list:
+            self._finish(True)
+        else:
+            self._send_chunk()
+        return self.done
+
+    def _send_chunk(self):
+        publisher = self.publisher
+        start = self.next_start
+        end = min(start + self.chunk_size, len(self.pos_list))
+        takeoff_height = publisher.flight_state.takeoff_height
+        points = [(pos[0], pos[1], takeoff_height + pos[2]) for pos in self.pos_list[start:end]]
+        previous = self.chunk
+        publisher.update_flyto_id()
+        fly_to_id = publisher.flyto_id
+        self.chunk = (fly_to_id, start, end)
+        self.next_start = end
+        if previous is not None:
+            # 旧段被新指令接替, 不再等待它的结束事件
+            publisher.pending.discard_flyto(previous[0])
+        progress = publisher.pending.add_flyto(fly_to_id, on_progress=lambda data: self._on_progress(fly_to_id, data))
+        progress.add_done_callback(lambda future: self._on_chunk_done(fly_to_id, future))
+        reply = publisher.publish_request(publisher.build_flyto_message(fly_to_id, points, self.max_speed))
+        reply.add_done_callback(lambda future: self._on_reply(fly_to_id, future))
+        self.requests += 1
+        self.writer(f"航线任务发送第 {start + 1}~{end} 个点 ({fly_to_id})")
+
+    def _on_reply(self, fly_to_id, future: Future):
+        try:
+            result = future.result().get("result", -1)
+        except Exception as e:
+            result = str(e)
+        if result != 0 and not self.done.done():
+            self.publisher.pending.discard_flyto(fly_to_id)
+            if self._finish(False):
+                self.writer(f"❌ 航线任务 {fly_to_id} 被拒绝: {result}")
+
+    def _on_progress(self, fly_to_id, data):
+        if self.chunk is None or self.chunk[0] != fly_to_id:
+            return
+        _, start, end = self.chunk
+        self.current_index = start + data.get("way_point_index", 0)
+        remaining_time = data.get("remaining_time", None)
+        if end < len(self.pos_list) and self.current_index >= end - 1 \
+                and remaining_time is not None and remaining_time <= self.lead_time:
+            self._send_chunk()
+
+    def _on_chunk_done(self, fly_to_id, future: Future):
+        if future.cancelled() or self.done.done():
+            return
+        if self.chunk is None or self.chunk[0] != fly_to_id:
+            return
+        try:
+            status = future.result().get("status", None)
+        except Exception:
+            if self._finish(False):
+                self.writer("❌ 航线任务状态更新超时，请检查连接是否正常")
+            return
+        if status != "wayline_ok":
+            if self._finish(False):
+                self.writer(f"❌ 航线任务在第 {self.current_index + 1} 个点中断: {status}")
+        elif self.next_start < len(self.pos_list):
+            # 提前发送未触发 (段太短), 在段结束时补发
+            self._send_chunk()
+        else:
+            self._finish(True)
+
+    def _finish(self, ok) -> bool:
+        """结束任务, 已经结束时返回 False"""
+        with self.finish_lock:
+            if self.finished:
+                return False
+            self.finished = True
+        self.elapsed = time.perf_counter() - self.start_time
+        # 在锁外完成 Future: 完成回调可能再次调用 cancel()
+        self.done.set_result(ok)
+        if ok:
+            self.writer(f"无人机{self.publisher.gateway_sn}航线任务执行完毕,共{len(self.pos_list)}个点,{self.requests}条请求,用时{self.elapsed:.1f}秒")
+        return True
+
+    def cancel(self):
+        if self.chunk is not None:
+            self.publisher.pending.discard_flyto(self.chunk[0])
+        self._finish(False)
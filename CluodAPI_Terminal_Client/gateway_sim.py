@@ -0,0 +1,372 @@
+"""DJI 网关/无人机运动学模拟器
+
+在本地模拟任意数量的网关, 使用与客户端相同的 topic:
+- drc/down: 响应 stick_control (简单一阶运动学)、heart_beat (回显)
+- drc/up: 按各机 osd_frequency 发布 osd_info_push, 按 state_rate 发布 drc_drone_state_push / drc_batteries_info_push
+- services / services_reply: 应答所有服务请求, fly_to_point 按航点飞行并在 events 上发布 fly_to_point_progress,
+  return_home 飞回起点降落, drc_mode_enter 按请求设置 OSD 频率 (osd_frequency <= 0 时拒绝)
+- sys/product/{sn}/status: 启动时发布 update_topo
+所有无人机共用一个 MQTT 客户端和一个仿真线程, 可扩展到数百架。
+网络线程中的消息回调只整体替换杆量指令 (stick / stick_time); 服务请求放入队列, 由仿真线程在每拍开始时执行并应答,
+因此航线、飞行模式、OSD 频率等运动学状态只在仿真线程中修改, 不需要加锁 (应答最多晚一拍)。
+"""
+import math
+import threading
+import time
+from collections import deque
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.services_publisher import OSD_FREQ
+
+STICK_CENTER = 1024
+STICK_RANGE = 660           # 364 ~ 1684
+STICK_TIMEOUT = 0.5         # 超过该时间没有杆量则悬停
+MAX_HORIZONTAL_SPEED = 10.0 # m/s
+MAX_VERTICAL_SPEED = 5.0    # m/s
+MAX_YAW_RATE = 90.0         # deg/s
+RESPONSE_TAU = 0.4          # 速度一阶响应时间常数 (s)
+UNLOCK_HOLD = 0.5           # 内八杆位保持该时间后解锁 (s)
+METERS_PER_DEG_LAT = 111320.0
+RESULT_NOT_FLYING = 314001      # 未起飞
+RESULT_INVALID_PARAM = 314002   # 参数错误 (模拟器自定义)
+
+SIM_TOPICS = [
+    "thing/product/+/drc/down",
+    "thing/product/+/services",
+]
+
+
+def _stick(value):
+    """杆量 -> [-1, 1]"""
+    return max(-1.0, min(1.0, (value - STICK_CENTER) / STICK_RANGE))
+
+
+class SimulatedDrone:
+    def __init__(self, gateway_sn, lat=39.0417860, lon=117.7241893, ground_height=-6.5, heading=0.0):
+        self.gateway_sn = gateway_sn
+        self.device_sn = f"{gateway_sn}-AC"
+        self.home = (lat, lon)
+        self.lat = lat
+        self.lon = lon
+        self.ground_height = ground_height
+        self.elevation = 0.0
+        self.heading = heading
+        self.vx = 0.0   # 北向 m/s
+        self.vy = 0.0   # 东向 m/s
+        self.vz = 0.0   # 向上 m/s
+        self.armed = False
+        self.mode_code = 0
+        self.battery = 100.0
+        self.osd_frequency = OSD_FREQ
+        self.next_osd = 0.0
+        self.next_state = 0.0
+        self.seq = 0
+        # 由消息回调整体替换的指令
+        self.stick = (STICK_CENTER, STICK_CENTER, STICK_CENTER, STICK_CENTER)
+        self.stick_time = 0.0
+        self.unlock_since = None
+        self.lock_since = None
+        self.nav = None     # (fly_to_id, [(lat, lon, height), ...], max_speed, is_return_home)
+        self.outbox = []    # 指令处理中产生、随下一拍发布的事件
+        self.nav_index = 0
+        self.next_progress = 0.0
+
+    # --- 运动学 ---
+    def _distance_to(self, lat, lon):
+        north = (lat - self.lat) * METERS_PER_DEG_LAT
+        east = (lon - self.lon) * METERS_PER_DEG_LAT * math.cos(math.radians(self.lat))
+        return north, east
+
+    def step(self, now, dt, events):
+        """推进 dt 秒, 需要发布的 fly_to_point_progress 事件追加到 events"""
+        roll, pitch, throttle, yaw = self.stick
+        stick_active = now - self.stick_time <= STICK_TIMEOUT
+        target_vn = target_ve = target_vz = yaw_rate = 0.0
+
+        while self.outbox:
+            events.append(self.outbox.pop(0))
+        if self.nav is not None:
+            target_vn, target_ve, target_vz = self._nav_target(now, events)
+        elif stick_active:
+            # 内八解锁 / 油门最低上锁
+            if roll > 1600 and pitch < 450 and throttle < 450 and yaw < 450:
+                self.unlock_since = self.unlock_since or now
+                if not self.armed and now - self.unlock_since >= UNLOCK_HOLD:
+                    self.armed = True
+                    self.mode_code = 16
+            else:
+                self.unlock_since = None
+            if self.armed:
+                forward = _stick(pitch) * MAX_HORIZONTAL_SPEED
+                right = _stick(roll) * MAX_HORIZONTAL_SPEED
+                heading = math.radians(self.heading)
+                target_vn = forward * math.cos(heading) - right * math.sin(heading)
+                target_ve = forward * math.sin(heading) + right * math.cos(heading)
+                target_vz = _stick(throttle) * MAX_VERTICAL_SPEED
+                yaw_rate = _stick(yaw) * MAX_YAW_RATE
+                if self.unlock_since is not None:
+                    target_vn = target_ve = target_vz = yaw_rate = 0.0
+        else:
+            self.unlock_since = None
+
+        alpha = min(1.0, dt / RESPONSE_TAU)
+        self.vx += (target_vn - self.vx) * alpha
+        self.vy += (target_ve - self.vy) * alpha
+        self.vz += (target_vz - self.vz) * alpha
+        self.heading = (self.heading + yaw_rate * dt + 180.0) % 360.0 - 180.0
+        self.lat += self.vx * dt / METERS_PER_DEG_LAT
+        self.lon += self.vy * dt / (METERS_PER_DEG_LAT * math.cos(math.radians(self.lat)))
+        self.elevation += self.vz * dt
+
+        if self.elevation <= 0.0:
+            self.elevation = 0.0
+            self.vz = max(0.0, self.vz)
+            self.vx = self.vy = 0.0
+            # 落地后油门保持最低 1 秒自动上锁
+            if self.armed and stick_active and throttle < 450 and self.unlock_since is None:
+                self.lock_since = self.lock_since or now
+                if now - self.lock_since >= 1.0:
+                    self.armed = False
+                    self.mode_code = 0
+            else:
+                self.lock_since = None
+        if self.armed:
+            self.battery = max(0.0, self.battery - dt * 100.0 / 1800.0)
+
+    def _nav_target(self, now, events):
+        fly_to_id, points, max_speed, is_return_home = self.nav
+        lat, lon, height = points[self.nav_index]
+        north, east = self._distance_to(lat, lon)
+        dz = (height - self.ground_height) - self.elevation
+        distance = math.sqrt(north * north + east * east + dz * dz)
+        remaining = distance
+        for i in range(self.nav_index + 1, len(points)):
+            prev = points[i - 1]
+            n = (points[i][0] - prev[0]) * METERS_PER_DEG_LAT
+            e = (points[i][1] - prev[1]) * METERS_PER_DEG_LAT * math.cos(math.radians(self.lat))
+            remaining += math.sqrt(n * n + e * e)
+        last = self.nav_index + 1 >= len(points)
+        # 中间航点不减速, 进入切换半径即飞向下一点; 最后一个点减速停稳
+        if distance < (1.0 if last else max(1.0, max_speed * 0.5)):
+            if not last:
+                self.nav_index += 1
+            else:
+                self.nav = None
+                if is_return_home:
+                    self.mode_code = 10
+                    self.stick = (STICK_CENTER, STICK_CENTER, 364, STICK_CENTER)
+                    self.stick_time = now + 30.0
+                else:
+                    self.mode_code = 16
+                    events.append(self._progress(fly_to_id, "wayline_ok", 0.0, max_speed))
+                return 0.0, 0.0, 0.0
+        if not is_return_home and now >= self.next_progress:
+            self.next_progress = now + 1.0
+            events.append(self._progress(fly_to_id, "wayline_progress", remaining, max_speed))
+        speed = min(max_speed, distance) if last else max_speed
+        return north / distance * speed, east / distance * speed, max(-MAX_VERTICAL_SPEED, min(MAX_VERTICAL_SPEED, dz))
+
+    def _progress(self, fly_to_id, status, remaining, max_speed):
+        return {
+            "fly_to_id": fly_to_id,
+            "status": status,
+            "result": 0,
+            "way_point_index": self.nav_index,
+            "remaining_distance": remaining,
+            "remaining_time": remaining / max(0.1, max_speed),
+        }
+
+    # --- 指令 ---
+    def start_fly_to(self, fly_to_id, points, max_speed):
+        if not self.armed:
+            return RESULT_NOT_FLYING
+        if self.nav is not None and not self.nav[3]:
+            # 新指令接替正在执行的指点飞行
+            self.outbox.append(self._progress(self.nav[0], "wayline_cancel", 0.0, self.nav[2]))
+        self.nav_index = 0
+        self.next_progress = 0.0
+        self.nav = (fly_to_id, [(p["latitude"], p["longitude"], p["height"]) for p in points], max_speed, False)
+        self.mode_code = 17
+        return 0
+
+    def start_return_home(self):
+        if not self.armed:
+            return RESULT_NOT_FLYING
+        rth_height = self.ground_height + max(self.elevation, 30.0)
+        self.nav_index = 0
+        self.nav = ("return_home", [(self.lat, self.lon, rth_height), (self.home[0], self.home[1], rth_height)], 10.0, True)
+        self.mode_code = 9
+        return 0
+
+    # --- 遥测 ---
+    def osd_data(self):
+        horizontal_speed = math.sqrt(self.vx * self.vx + self.vy * self.vy)
+        north, east = self._distance_to(*self.home)
+        return {
+            "attitude_head": round(self.heading),
+            "elevation": self.elevation,
+            "height": self.ground_height + self.elevation,
+            "home_distance": math.sqrt(north * north + east * east),
+            "horizontal_speed": horizontal_speed,
+            "latitude": self.lat,
+            "longitude": self.lon,
+            "speed_x": self.vx,
+            "speed_y": self.vy,
+            "speed_z": self.vz,
+            "ultrasonic_height": self.elevation if self.elevation < 10.0 else -1,
+            "vertical_speed": self.vz,
+            "wind_direction": 0,
+            "wind_speed": 0,
+        }
+
+
+class GatewaySimulator:
+    def __init__(self, sn_list, client, tick_hz: float = 100.0, state_rate: float = 2.0, osd_frequency: int = OSD_FREQ, writer=print):
+        """sn_list: 模拟的网关 SN 列表; client: paho 客户端或 LoopbackClient"""
+        self.drones = {sn: SimulatedDrone(sn, lat=39.0417860 + 0.0002 * i, heading=0.0) for i, sn in enumerate(sn_list)}
+        for drone in self.drones.values():
+            drone.osd_frequency = osd_frequency
+        self.client = client
+        self.tick_hz = tick_hz
+        self.state_rate = state_rate
+        self.writer = writer
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.services = deque()     # (drone, method, message), 网络线程放入, 仿真线程取出
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        # 统计
+        self.published = 0
+        self.received = 0
+        self.ticks = 0
+        self.max_tick_lag = 0.0
+
+    @staticmethod
+    def make_sn_list(num, prefix="SIM"):
+        return [f"{prefix}{i:0{14 - len(prefix)}d}" for i in range(num)]
+
+    # --- MQTT ---
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        client.subscribe([(topic, 0) for topic in SIM_TOPICS])
+        for drone in self.drones.values():
+            self._publish(f"sys/product/{drone.gateway_sn}/status", {
+                "method": "update_topo",
+                "timestamp": int(time.time() * 1000),
+                "data": {"sub_devices": [{"sn": drone.device_sn, "domain": 0}]},
+            })
+
+    def on_message(self, client, userdata, msg):
+        self.received += 1
+        topic = msg.topic
+        parts = topic.split("/")
+        drone = self.drones.get(parts[2])
+        if drone is None:
+            return
+        message = json_codec.loads(msg.payload)
+        method = message.get("method", None)
+        if parts[-1] == "down":
+            if method == "stick_control":
+                data = message["data"]
+                drone.stick = (data["roll"], data["pitch"], data["throttle"], data["yaw"])
+                drone.stick_time = time.time()
+            elif method == "heart_beat":
+                self._publish(f"thing/product/{drone.gateway_sn}/drc/up", {
+                    "method": "heart_beat",
+                    "seq": message.get("seq", 0),
+                    "data": {"timestamp": int(time.time() * 1000)},
+                })
+        elif parts[-1] == "services":
+            # 航线、模式和 OSD 频率由仿真线程修改, 这里只排队
+            self.services.append((drone, method, message))
+
+    def _handle_service(self, drone, method, message):
+        """仿真线程中执行服务请求并应答"""
+        data = message.get("data", None) or {}
+        result = 0
+        if method == "fly_to_point":
+            result = drone.start_fly_to(data["fly_to_id"], data["points"], data.get("max_speed", 12))
+        elif method == "return_home":
+            result = drone.start_return_home()
+        elif method == "drc_mode_enter":
+            frequency = data.get("osd_frequency", OSD_FREQ)
+            if not isinstance(frequency, (int, float)) or frequency <= 0:
+                result = RESULT_INVALID_PARAM
+            else:
+                # 新频率从上一条 OSD 起算, 提高频率时不必等到按旧频率排定的下一条
+                drone.next_osd = min(drone.next_osd, drone.next_osd - 1.0 / drone.osd_frequency + 1.0 / frequency)
+                drone.osd_frequency = frequency
+        self._publish(f"thing/product/{drone.gateway_sn}/services_reply", {
+            "bid": message.get("bid", None),
+            "tid": message.get("tid", None),
+            "method": method,
+            "timestamp": int(time.time() * 1000),
+            "data": {"result": result},
+        })
+
+    def _publish(self, topic, message):
+        self.client.publish(topic, json_codec.dumps(message))
+        self.published += 1
+
+    # --- 仿真线程 ---
+    def _tick(self, now, dt):
+        services = self.services
+        while services:
+            drone, method, message = services.popleft()
+            try:
+                self._handle_service(drone, method, message)
+            except Exception as e:
+                self.writer(f"模拟器处理 {method} 出错: {e}")
+        for drone in self.drones.values():
+            events = []
+            drone.step(now, dt, events)
+            up_topic = f"thing/product/{drone.gateway_sn}/drc/up"
+            if now >= drone.next_osd:
+                drone.next_osd = max(drone.next_osd + 1.0 / drone.osd_frequency, now - 1.0 / drone.osd_frequency)
+                drone.seq += 1
+                self._publish(up_topic, {"data": drone.osd_data(), "method": "osd_info_push", "seq": drone.seq, "timestamp": int(now * 1000)})
+            if now >= drone.next_state:
+                drone.next_state = now + 1.0 / self.state_rate
+                self._publish(up_topic, {"data": {"mode_code": drone.mode_code}, "method": "drc_drone_state_push", "seq": drone.seq, "timestamp": int(now * 1000)})
+                self._publish(up_topic, {"data": {"capacity_percent": int(drone.battery)}, "method": "drc_batteries_info_push", "seq": drone.seq, "timestamp": int(now * 1000)})
+            for event in events:
+                self._publish(f"thing/product/{drone.gateway_sn}/events", {
+                    "bid": event["fly_to_id"], "tid": event["fly_to_id"], "method": "fly_to_point_progress",
+                    "timestamp": int(now * 1000), "data": event,
+                })
+
+    def _run(self):
+        interval = 1.0 / self.tick_hz
+        start = time.time()
+        last = start
+        while not self.stop_event.is_set():
+            self.ticks += 1
+            deadline = start + self.ticks * interval
+            delay = deadline - time.time()
+            if delay > 0:
+                if self.stop_event.wait(delay):
+                    break
+            else:
+                self.max_tick_lag = max(self.max_tick_lag, -delay)
+            now = time.time()
+            try:
+                self._tick(now, now - last)
+            except Exception as e:
+                self.writer(f"模拟器仿真出错: {e}")
+            last = now
+
+    def start(self, host_addr=None, port: int = 1883):
+        """连接 broker 并启动网络线程与仿真线程"""
+        self.client.connect(host_addr, port, 60)
+        self.client.loop_start()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def get_stats_str(self):
+        return f"{len(self.drones)} 架, 发布 {self.published} 条, 接收 {self.received} 条, 仿真 {self.ticks} 拍, 最大滞后 {self.max_tick_lag * 1000:.1f} ms"
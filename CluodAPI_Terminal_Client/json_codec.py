@@ -0,0 +1,55 @@
+"""MQTT 消息统一 JSON 编解码层
+
+所有上行解析与下行发布都经过这里:
+- 安装了 orjson 时使用 orjson, 否则回退到标准库 json
+- loads 直接接收 bytes (paho 的 msg.payload), 不经过中间 str
+- dumps 统一返回 UTF-8 bytes, 可直接作为 publish 的 payload
+
+可通过环境变量 DJI_JSON_BACKEND=json 强制使用标准库, 或运行时调用 use_backend()。
+调用方应使用 json_codec.loads / json_codec.dumps, 而不是 from ... import loads, 以便切换后端生效。
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ("orjson", "json")
+
+backend = None
+loads = None
+dumps = None
+
+
+def _json_loads(payload):
+    return json.loads(payload)
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def available_backends():
+    """返回当前环境可用的后端名称列表"""
+    return [name for name in BACKENDS if name != "orjson" or orjson is not None]
+
+
+def use_backend(name: str):
+    """切换编解码后端, name 为 "orjson" 或 "json" """
+    global backend, loads, dumps
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("orjson 未安装, 无法使用 orjson 后端")
+        loads = orjson.loads
+        dumps = orjson.dumps
+    elif name == "json":
+        loads = _json_loads
+        dumps = _json_dumps
+    else:
+        raise ValueError(f"未知的 JSON 后端: {name}")
+    backend = name
+
+
+use_backend(os.environ.get("DJI_JSON_BACKEND", available_backends()[0]))
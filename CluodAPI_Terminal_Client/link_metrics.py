@@ -0,0 +1,187 @@
+"""每架无人机的链路时延统计
+
+原先 publish_heartbeat 发出 timestamp/seq 后没有人读取回显, 也无从知道杆量指令多久反映到遥测、
+无人机时钟与本机相差多少。LinkMetrics 挂在 DRC_controler 上:
+- 心跳: 发送时按 seq 记录本机时间, drc/up 上的 heart_beat 回显到达时得到往返时间 RTT;
+  回显中的 timestamp 为无人机时钟, 时钟偏差 = 对端时间 - (发送时间 + 接收时间) / 2 (NTP 单向假设),
+  取窗口内 RTT 最小的样本作为偏差估计 (排队延迟最小, 不对称误差最小)
+- 杆量 -> OSD 响应: 某个杆量相对上一条变化超过 STEP_THRESHOLD 时开始一次探测, 记录发送时间和当时的速度/航向,
+  之后第一条速度或航向发生相应变化的 OSD 到达时记为一次响应延迟; RESPONSE_TIMEOUT 内无变化计为无响应
+  (如解锁杆位、未起飞)。同一时间只有一个探测
+- OSD 到达间隔与抖动: 抖动为到达间隔与窗口中位数之差的绝对值
+各项保留最近 window 个样本, 按需计算分位数; 回调都在网络线程或发送线程中执行, 只做常数时间的记录。
+"""
+import math
+import threading
+from collections import deque
+
+METRICS_WINDOW = 256            # 每项保留的样本数
+STEP_THRESHOLD = 100            # 杆量变化超过该值时开始响应探测
+RESPONSE_TIMEOUT = 2.0          # 响应探测超时 (秒)
+RESPONSE_SPEED = 0.1            # 速度变化超过该值视为已响应 (米/秒)
+RESPONSE_HEADING = 1.0          # 航向变化超过该值视为已响应 (度)
+HEARTBEAT_PENDING = 64          # 等待回显的心跳最多保留条数
+
+
+class RollingStats:
+    """最近 window 个样本的滚动统计, 分位数在读取时排序计算"""
+    __slots__ = ("samples", "total")
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.total += 1
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentiles(self, *ps):
+        """返回各百分位 (0~100) 的值, 无样本时为 None"""
+        values = sorted(self.samples)
+        if not values:
+            return tuple(None for _ in ps)
+        last = len(values) - 1
+        return tuple(values[min(last, int(round(p / 100.0 * last)))] for p in ps)
+
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    def format_ms(self, name):
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        if p50 is None:
+            return f"{name}: 无数据"
+        return f"{name}: p50 {p50 * 1000:.1f} / p95 {p95 * 1000:.1f} / p99 {p99 * 1000:.1f} ms (n={self.total})"
+
+
+class LinkMetrics:
+    def __init__(self, gateway_sn, window: int = METRICS_WINDOW):
+        self.gateway_sn = gateway_sn
+        self.lock = threading.Lock()
+        # 心跳
+        self.heartbeats = {}            # seq -> 发送时间 (time.time())
+        self.rtt = RollingStats(window)
+        self.offsets = deque(maxlen=window)     # (rtt, 时钟偏差)
+        self.heartbeat_lost = 0
+        self.heartbeat_unmatched = 0
+        # 杆量 -> OSD 响应
+        self.last_stick = None
+        self.probe = None               # (发送时间, 变化的轴, 垂直速度, 水平速度, 航向)
+        self.response = RollingStats(window)
+        self.response_timeouts = 0
+        self.last_snap = None
+        # OSD 到达间隔
+        self.last_osd = None
+        self.intervals = RollingStats(window)
+
+    # --- 心跳 ---
+    def on_heartbeat_sent(self, seq, sent_ts: float):
+        with self.lock:
+            if len(self.heartbeats) >= HEARTBEAT_PENDING:
+                # 最早的心跳一直没有回显, 计为丢失
+                del self.heartbeats[next(iter(self.heartbeats))]
+                self.heartbeat_lost += 1
+            self.heartbeats[seq] = sent_ts
+
+    def on_heartbeat_reply(self, message, recv_ts: float):
+        """drc/up 上的 heart_beat 回显, message 中的 data.timestamp 为无人机时钟 (毫秒)"""
+        with self.lock:
+            sent_ts = self.heartbeats.pop(message.get("seq", None), None)
+            if sent_ts is None:
+                self.heartbeat_unmatched += 1
+                return
+            rtt = recv_ts - sent_ts
+            self.rtt.add(rtt)
+            remote_ts = (message.get("data", None) or {}).get("timestamp", None)
+            if remote_ts is not None:
+                self.offsets.append((rtt, remote_ts / 1000.0 - (sent_ts + recv_ts) / 2))
+
+    @property
+    def clock_offset(self):
+        """无人机时钟 - 本机时钟 (秒), 取窗口内 RTT 最小的样本, 无样本时为 None"""
+        offsets = list(self.offsets)
+        return min(offsets)[1] if offsets else None
+
+    # --- 杆量 -> OSD 响应 ---
+    def on_stick(self, roll, pitch, throttle, yaw, sent_ts: float):
+        """调度线程中调用; probe / last_snap 与网络线程的 on_osd 共用, 在锁内读写"""
+        stick = (roll, pitch, throttle, yaw)
+        with self.lock:
+            last = self.last_stick
+            self.last_stick = stick
+            if last is None or self.probe is not None:
+                return
+            axes = tuple(abs(a - b) >= STEP_THRESHOLD for a, b in zip(stick, last))
+            if not any(axes):
+                return
+            snap = self.last_snap
+            if snap is None:
+                return
+            self.probe = (sent_ts, axes, snap.vertical_speed or 0.0, snap.horizontal_speed or 0.0, snap.attitude_head or 0.0)
+
+    def _check_probe(self, snap):
+        """调用方持有 self.lock"""
+        sent_ts, (roll, pitch, throttle, yaw), vertical_speed, horizontal_speed, heading = self.probe
+        if snap.recv_ts - sent_ts > RESPONSE_TIMEOUT:
+            self.probe = None
+            self.response_timeouts += 1
+            return
+        responded = (throttle and abs((snap.vertical_speed or 0.0) - vertical_speed) >= RESPONSE_SPEED) \
+            or ((roll or pitch) and abs((snap.horizontal_speed or 0.0) - horizontal_speed) >= RESPONSE_SPEED) \
+            or (yaw and abs(((snap.attitude_head or 0.0) - heading + 180.0) % 360.0 - 180.0) >= RESPONSE_HEADING)
+        if responded:
+            self.probe = None
+            self.response.add(snap.recv_ts - sent_ts)
+
+    # --- OSD ---
+    def on_osd(self, snap):
+        """FlightState 监听回调 (网络线程)"""
+        recv_ts = snap.recv_ts
+        if self.last_osd is not None:
+            self.intervals.add(recv_ts - self.last_osd)
+        self.last_osd = recv_ts
+        with self.lock:
+            if self.probe is not None:
+                self._check_probe(snap)
+            self.last_snap = snap
+
+    def osd_jitter(self):
+        """返回 (到达间隔中位数, 抖动 p95, 抖动最大值), 单位秒"""
+        intervals = list(self.intervals.samples)
+        if not intervals:
+            return None, None, None
+        median = sorted(intervals)[len(intervals) // 2]
+        jitter = sorted(abs(interval - median) for interval in intervals)
+        return median, jitter[min(len(jitter) - 1, int(round(0.95 * (len(jitter) - 1))))], jitter[-1]
+
+    # --- 输出 ---
+    def get_summary_str(self):
+        """TUI 信息栏用的简短统计"""
+        rtt, = self.rtt.percentiles(50)
+        response, = self.response.percentiles(50)
+        offset = self.clock_offset
+        median, jitter, _ = self.osd_jitter()
+        return "\n".join([
+            f"心跳RTT: {rtt * 1000:.0f} ms" if rtt is not None else "心跳RTT: 未知",
+            f"时钟偏差: {offset * 1000:+.0f} ms" if offset is not None else "时钟偏差: 未知",
+            f"杆量响应: {response * 1000:.0f} ms" if response is not None else "杆量响应: 未知",
+            f"OSD间隔: {median * 1000:.0f} ms, 抖动p95 {jitter * 1000:.1f} ms" if median is not None else "OSD间隔: 未知",
+        ])
+
+    def get_stats_str(self):
+        median, jitter, jitter_max = self.osd_jitter()
+        offset = self.clock_offset
+        lines = [
+            f"无人机{self.gateway_sn} 链路统计:",
+            self.rtt.format_ms("心跳 RTT") + f", 丢失 {self.heartbeat_lost}, 未匹配 {self.heartbeat_unmatched}",
+            f"时钟偏差 (无人机 - 本机): {offset * 1000:+.1f} ms" if offset is not None else "时钟偏差: 无数据",
+            self.response.format_ms("杆量 -> OSD 响应") + f", 无响应 {self.response_timeouts}",
+        ]
+        if median is not None:
+            lines.append(f"OSD 到达间隔 中位数 {median * 1000:.1f} ms ({1.0 / median if median > 0 else math.inf:.1f} Hz), "
+                         f"抖动 p95 {jitter * 1000:.2f} / 最大 {jitter_max * 1000:.2f} ms")
+        else:
+            lines.append("OSD 到达间隔: 无数据")
+        return "\n".join(lines)
@@ -0,0 +1,166 @@
+"""进程内 MQTT broker 替身
+
+LoopbackClient 提供与 paho mqtt.Client 相同的常用接口 (connect / connect_async / subscribe / publish / loop_forever /
+on_connect / on_message / on_publish), 消息经 LoopbackBroker 按 MQTT 通配符规则同步投递给订阅者。
+用于离线回放、模拟器和压测, 不需要真实的 emqx。
+"""
+import itertools
+import threading
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT 订阅通配符匹配, 支持 + 与 #"""
+    if pattern == topic:
+        return True
+    p_parts = pattern.split("/")
+    t_parts = topic.split("/")
+    for i, p in enumerate(p_parts):
+        if p == "#":
+            return True
+        if i >= len(t_parts):
+            return False
+        if p != "+" and p != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class LoopbackMessage:
+    """与 paho MQTTMessage 相同的只读字段"""
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "properties", "timestamp")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0, properties=None, timestamp=0.0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+        self.properties = properties
+        self.timestamp = timestamp
+
+
+class LoopbackPublishInfo:
+    """与 paho MQTTMessageInfo 相同的常用接口, 消息在 publish 返回前已投递完成"""
+    __slots__ = ("mid", "rc")
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        return
+
+
+class LoopbackBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = []     # [(pattern, client)]
+        self.match_cache = {}       # topic -> [client]
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, pattern, client):
+        with self.lock:
+            if (pattern, client) not in self.subscriptions:
+                self.subscriptions.append((pattern, client))
+            self.match_cache = {}
+
+    def unsubscribe(self, pattern, client):
+        with self.lock:
+            self.subscriptions = [sub for sub in self.subscriptions if sub != (pattern, client)]
+            self.match_cache = {}
+
+    def remove_client(self, client):
+        with self.lock:
+            self.subscriptions = [sub for sub in self.subscriptions if sub[1] is not client]
+            self.match_cache = {}
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        targets = self.match_cache.get(topic)
+        if targets is None:
+            with self.lock:
+                targets = []
+                for pattern, client in self.subscriptions:
+                    if client not in targets and topic_matches(pattern, topic):
+                        targets.append(client)
+                self.match_cache[topic] = targets
+        self.published += 1
+        for client in targets:
+            client.deliver(topic, payload, qos, retain, properties)
+            self.delivered += 1
+
+
+class LoopbackClient:
+    def __init__(self, broker: LoopbackBroker, client_id: str = ""):
+        self.broker = broker
+        self.client_id = client_id
+        self.on_connect = None
+        self.on_message = None
+        self.on_publish = None
+        self.on_disconnect = None
+        self.userdata = None
+        self.connected = False
+        self._mids = itertools.count(1)
+        self._stop = threading.Event()
+
+    # --- 与 paho 兼容的接口 ---
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host=None, port=1883, keepalive=60, **kwargs):
+        self.connected = True
+        self._stop.clear()
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {"session present": 0}, 0, None)
+        return 0
+
+    def connect_async(self, host=None, port=1883, keepalive=60, **kwargs):
+        return self.connect(host, port, keepalive)
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def loop_forever(self, *args, **kwargs):
+        self._stop.wait()
+        return 0
+
+    def loop_start(self):
+        return 0
+
+    def loop_stop(self):
+        return 0
+
+    def disconnect(self, *args, **kwargs):
+        self.connected = False
+        self.broker.remove_client(self)
+        self._stop.set()
+        if self.on_disconnect:
+            self.on_disconnect(self, self.userdata, {}, 0, None)
+        return 0
+
+    def subscribe(self, topic, qos=0, **kwargs):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for pattern, _ in topics:
+            self.broker.subscribe(pattern, self)
+        return 0, next(self._mids)
+
+    def unsubscribe(self, topic, **kwargs):
+        for pattern in (topic if isinstance(topic, list) else [topic]):
+            self.broker.unsubscribe(pattern, self)
+        return 0, next(self._mids)
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        info = LoopbackPublishInfo(next(self._mids))
+        self.broker.publish(topic, payload, qos, retain, properties)
+        if self.on_publish:
+            self.on_publish(self, self.userdata, info.mid, 0, None)
+        return info
+
+    # --- broker 回调 ---
+    def deliver(self, topic, payload, qos, retain, properties):
+        if self.on_message:
+            self.on_message(self, self.userdata, LoopbackMessage(topic, payload, qos, retain, properties=properties))
@@ -0,0 +1,218 @@
+"""MQTT 连接层: MQTT 5 topic alias、持久会话与指数退避重连
+
+原先客户端按 paho 默认参数 (MQTT 3.1.1, clean session) 连接, 每条 50 Hz 的 stick_control 都带着完整的
+thing/product/{sn}/drc/down topic; 断线重连后会话清空, 需要重新订阅才能收到 OSD。
+MQTT_PROTOCOL=5 时 (默认仍为 3.1.1, 与原有部署一致) MQTTTransport:
+- 上行: CONNACK 中 broker 允许的 TopicAliasMaximum 范围内, 为 ALIAS_SUFFIXES 结尾的 topic 分配别名,
+  第一条消息带完整 topic 与别名 (登记), 之后只发别名和空 topic。只对 QoS 0 使用别名:
+  paho 重连后会原样重发未确认的 QoS 1 消息, 而别名在新连接上已失效
+- 下行: CONNECT 中声明 TOPIC_ALIAS_MAXIMUM, broker 可以对 drc/up 等高频 topic 使用别名, 收到时还原 topic
+- 持久会话: 固定 client_id + SessionExpiryInterval, 只在进程首次连接时 clean start;
+  重连时 broker 保留订阅, CONNACK 带 session present, 应用可跳过重新订阅 (session_present)
+- 重连: loop_forever 按 RECONNECT_MIN_DELAY 起步、每次翻倍、上限 RECONNECT_MAX_DELAY 退避重连, 连接成功后复位
+- 统计: 使用别名的消息数与节省的字节数、断线到重连成功、重连 (断线) 到收到第一条 OSD 的时间
+3.1.1 模式下只启用退避重连和统计, 别名与持久会话不生效。
+别名表在断线时清空, 连接代次 (generation) 变化后不再确认旧连接上的登记。
+"""
+import os
+import threading
+import time
+import weakref
+import paho
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+
+# MQTT_PROTOCOL=5 时使用 MQTT 5 (topic alias + 持久会话)
+MQTT_PROTOCOL = os.environ.get("MQTT_PROTOCOL", "3.1.1")
+
+ALIAS_SUFFIXES = ("/drc/down",)    # 上行使用别名的 topic
+TOPIC_ALIAS_MAXIMUM = 64            # 允许 broker 对下行 topic 使用的别名数
+SESSION_EXPIRY = 300                # 断线后 broker 保留会话的时间 (秒)
+RECONNECT_MIN_DELAY = 0.25          # 首次重连等待 (秒), 之后每次翻倍
+RECONNECT_MAX_DELAY = 30            # 重连等待上限 (秒)
+ALIAS_PROPERTY_SIZE = 3             # TopicAlias 属性占用的字节数 (标识 1 + 值 2)
+
+
+def create_client(client_id: str = "", protocol: str = MQTT_PROTOCOL) -> mqtt.Client:
+    """按 protocol ("3.1.1" 或 "5") 新建 paho 客户端, 持久会话需要固定的 client_id"""
+    if protocol == "5":
+        return mqtt.Client(paho.mqtt.enums.CallbackAPIVersion.VERSION2, client_id=client_id, transport="tcp",
+                           protocol=mqtt.MQTTv5)
+    return mqtt.Client(paho.mqtt.enums.CallbackAPIVersion.VERSION2, client_id=client_id, transport="tcp")
+
+
+def make_client_id(role: str) -> str:
+    """同一进程内重连使用相同的 client_id 才能恢复会话; 带上进程号, 避免多个终端互相踢线"""
+    return f"dji_terminal_{role}_{os.getpid()}"
+
+
+class MQTTTransport:
+    def __init__(self, client, session_expiry: int = SESSION_EXPIRY, alias_suffixes=ALIAS_SUFFIXES):
+        """client: paho 客户端或与其接口兼容的客户端 (如 LoopbackClient); 在设置好 on_connect / on_message 之后创建"""
+        self.client = client
+        self.v5 = getattr(client, "protocol", None) == mqtt.MQTTv5
+        self.session_expiry = session_expiry
+        self.alias_suffixes = alias_suffixes
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.alias_maximum = 0          # broker 允许的上行别名数, 未连接时为 0
+        self.aliases = {}               # topic -> [别名, 是否已登记]
+        self.alias_properties = {}      # (别名, id(原属性)) -> (原属性, 带别名的属性)
+        self.inbound = {}               # 下行别名 -> topic
+        self.session_present = False
+        self.connected_at = None
+        self.disconnected_at = None
+        self.waiting_osd = False
+        # 统计
+        self.connects = 0
+        self.aliased = 0
+        self.bytes_saved = 0
+        self.inbound_aliased = 0
+        self.outage = RollingStats()            # 断线到重连成功
+        self.connect_to_osd = RollingStats()    # 连接成功到第一条 OSD
+        self.outage_to_osd = RollingStats()     # 断线到重连后第一条 OSD
+        self.previous_connect = client.on_connect
+        self.previous_disconnect = getattr(client, "on_disconnect", None)
+        self.previous_message = client.on_message
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+        client.on_message = self.on_message
+        if hasattr(client, "reconnect_delay_set"):
+            client.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        _transports[client] = self
+
+    # --- 连接 ---
+    def connect_properties(self):
+        if not self.v5:
+            return None
+        properties = Properties(PacketTypes.CONNECT)
+        properties.SessionExpiryInterval = self.session_expiry
+        properties.TopicAliasMaximum = TOPIC_ALIAS_MAXIMUM
+        return properties
+
+    def loop_forever(self, host_addr, port: int = 1883, keepalive: int = 60):
+        """连接并运行网络循环, 首次连接失败和断线都按退避间隔重试"""
+        self.client.connect_async(host_addr, port, keepalive, properties=self.connect_properties())
+        self.client.loop_forever(retry_first_connection=True)
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        if getattr(rc, "is_failure", rc != 0):
+            # 连接被拒绝, 仍按退避间隔重试
+            if self.previous_connect is not None:
+                self.previous_connect(client, userdata, flags, rc, properties)
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.generation += 1
+            self.aliases = {}
+            self.alias_properties = {}
+            self.inbound = {}
+            self.alias_maximum = getattr(properties, "TopicAliasMaximum", 0) if self.v5 and properties is not None else 0
+            self.session_present = bool(getattr(flags, "session_present", False))
+        self.connects += 1
+        self.connected_at = now
+        if self.disconnected_at is not None:
+            self.outage.add(now - self.disconnected_at)
+        self.waiting_osd = True
+        if self.previous_connect is not None:
+            self.previous_connect(client, userdata, flags, rc, properties)
+
+    def on_disconnect(self, client, userdata, flags, rc, properties=None):
+        with self.lock:
+            self.generation += 1
+            self.alias_maximum = 0
+            self.aliases = {}
+            self.alias_properties = {}
+        self.disconnected_at = time.perf_counter()
+        self.waiting_osd = False
+        if self.previous_disconnect is not None:
+            self.previous_disconnect(client, userdata, flags, rc, properties)
+
+    # --- 下行 ---
+    def on_message(self, client, userdata, msg):
+        if self.v5:
+            alias = getattr(msg.properties, "TopicAlias", None)
+            if alias is not None:
+                self.inbound_aliased += 1
+                if msg.topic:
+                    self.inbound[alias] = msg.topic
+                else:
+                    topic = self.inbound.get(alias)
+                    if topic is None:
+                        return
+                    msg.topic = topic.encode()
+        if self.waiting_osd and b"osd_info_push" in msg.payload:
+            now = time.perf_counter()
+            self.waiting_osd = False
+            self.connect_to_osd.add(now - self.connected_at)
+            if self.disconnected_at is not None:
+                self.outage_to_osd.add(now - self.disconnected_at)
+        if self.previous_message is not None:
+            self.previous_message(client, userdata, msg)
+
+    # --- 上行 ---
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        """与 client.publish 相同, 可用别名时替换 topic"""
+        if qos != 0 or not self.alias_maximum or not topic.endswith(self.alias_suffixes):
+            return self.client.publish(topic, payload, qos=qos, retain=retain, properties=properties)
+        with self.lock:
+            generation = self.generation
+            entry = self.aliases.get(topic)
+            if entry is None and len(self.aliases) < self.alias_maximum:
+                entry = self.aliases[topic] = [len(self.aliases) + 1, False]
+            if entry is not None:
+                alias, registered = entry
+                aliased_properties = self._alias_properties(alias, properties)
+        if entry is None:
+            # 别名已用完
+            return self.client.publish(topic, payload, qos=qos, retain=retain, properties=properties)
+        if registered:
+            info = self.client.publish("", payload, qos=qos, retain=retain, properties=aliased_properties)
+            if info.rc == 0:
+                self.aliased += 1
+                self.bytes_saved += len(topic) - ALIAS_PROPERTY_SIZE
+            return info
+        # 登记: 完整 topic + 别名; 登记写入发送队列之前其他线程也按登记发送
+        info = self.client.publish(topic, payload, qos=qos, retain=retain, properties=aliased_properties)
+        if info.rc == 0:
+            self.bytes_saved -= ALIAS_PROPERTY_SIZE
+            with self.lock:
+                if self.generation == generation:
+                    entry[1] = True
+        return info
+
+    def _alias_properties(self, alias, properties):
+        """调用方持有 self.lock; 在原属性上加 TopicAlias, 按 (别名, 原属性) 缓存"""
+        key = (alias, id(properties))
+        cached = self.alias_properties.get(key)
+        if cached is not None and cached[0] is properties:
+            return cached[1]
+        aliased = Properties(PacketTypes.PUBLISH)
+        if properties is not None:
+            for name, value in properties.json().items():
+                setattr(aliased, name, value)
+        aliased.TopicAlias = alias
+        self.alias_properties[key] = (properties, aliased)
+        return aliased
+
+    def get_stats_str(self):
+        mode = "MQTT 5" if self.v5 else "MQTT 3.1.1"
+        lines = [f"连接 ({mode}): 连接 {self.connects} 次, 会话恢复 {'是' if self.session_present else '否'}, "
+                 f"上行别名 {len(self.aliases)}/{self.alias_maximum}, 下行别名 {len(self.inbound)}",
+                 f"别名消息: 上行 {self.aliased} 条, 节省 {self.bytes_saved} 字节"
+                 + (f" ({self.bytes_saved / self.aliased:.1f} 字节/条)" if self.aliased else "")
+                 + f", 下行 {self.inbound_aliased} 条",
+                 self.outage.format_ms("断线到重连"),
+                 self.outage_to_osd.format_ms("断线到首条 OSD"),
+                 self.connect_to_osd.format_ms("连接到首条 OSD")]
+        return "\n".join(lines)
+
+
+_transports = weakref.WeakKeyDictionary()
+
+
+def get_transport(client):
+    """client 对应的 MQTTTransport, 未创建时为 None"""
+    return _transports.get(client)
@@ -0,0 +1,43 @@
+"""按 (topic, method) 精确匹配的 MQTT 消息分发表
+
+分发表在客户端初始化时构建一次, on_message 热路径上只做字典查找:
+1. topic 未注册 -> 直接丢弃, 不解析 JSON
+2. payload 中不包含任何已注册的 "method" 字符串 -> 直接丢弃, 不解析 JSON
+   (只做子串查找, 可能误放行但不会漏掉真正需要处理的消息)
+3. 其余消息解析后按 method 调用对应处理函数
+"""
+from CluodAPI_Terminal_Client import json_codec
+
+
+class MessageDispatcher:
+    def __init__(self):
+        self.routes = {}        # topic -> {method: handler}
+        self.method_keys = {}   # topic -> (b'"method"', ...), 用于解析前预筛选
+        self.dispatched = 0
+        self.skipped = 0
+
+    def register(self, topic, method, handler):
+        """注册 (topic, method) 对应的处理函数, handler(message: dict)"""
+        self.routes.setdefault(topic, {})[method] = handler
+        self.method_keys[topic] = self.method_keys.get(topic, ()) + (b'"' + method.encode("utf-8") + b'"',)
+
+    def dispatch(self, topic, payload: bytes):
+        """分发一条消息, 返回是否有处理函数被调用"""
+        methods = self.routes.get(topic)
+        if methods is None:
+            self.skipped += 1
+            return False
+        for key in self.method_keys[topic]:
+            if key in payload:
+                break
+        else:
+            self.skipped += 1
+            return False
+        message = json_codec.loads(payload)
+        handler = methods.get(message.get("method", None))
+        if handler is None:
+            self.skipped += 1
+            return False
+        handler(message)
+        self.dispatched += 1
+        return True
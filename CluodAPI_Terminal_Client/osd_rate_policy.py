@@ -0,0 +1,127 @@
+"""按需调整每架无人机的 OSD 推送频率
+
+原先 drc_mode_enter 对所有无人机固定 osd_frequency = 50 Hz, 不管是否有人在用这些数据;
+机群规模大时 broker 转发和客户端解码的负载大部分花在地面待机、界面不可见的无人机上。
+OSDRatePolicy 每架无人机一个, 各功能按"来源"登记所需频率 (set_demand), 取最大值:
+- OSD_RATE_CONTROL: 闭环高度控制、直播目标定位、OSD 记录、该机有杆量流 (降落、键盘控制、定时指令)
+- OSD_RATE_VIEW: TUI 中该机标签页可见
+- 无人登记时按状态取下限: 地面待机 OSD_RATE_IDLE, 空中 (或状态未知) OSD_RATE_AIRBORNE
+频率变化时才重新发送 drc_mode_enter (ServiceMessageBuilder 按频率缓存编码):
+- 提高立即生效; 降低需目标频率持续 OSD_RATE_HOLD 秒, 避免来回切换
+- 同一时间只有一个请求在途, 应答到达后再按最新需求重新评估; 失败后 OSD_RATE_RETRY 秒内不重试
+- 首次 drc_mode_enter (菜单 j / 连接遥控器) 成功之前不主动发送
+调度器上的低频流 (OSD_RATE_CHECK Hz) 检查杆量流、飞行状态和降频保持时间, 并累计各频率的持续时间。
+"""
+import threading
+import time
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler
+
+OSD_RATE_CONTROL = 50       # 闭环控制 / 目标定位 / 记录 (Hz)
+OSD_RATE_VIEW = 10          # 界面可见 (Hz)
+OSD_RATE_AIRBORNE = 5       # 空中, 无人使用 (Hz)
+OSD_RATE_IDLE = 1           # 地面待机, 无人使用 (Hz)
+OSD_RATE_HOLD = 5.0         # 降频前目标频率需持续的时间 (秒)
+OSD_RATE_RETRY = 5.0        # drc_mode_enter 失败后的重试间隔 (秒)
+OSD_RATE_CHECK = 1.0        # 检查频率 (Hz)
+
+GROUND_MODES = (0, 1, 2, 14)    # 待机、起飞准备、起飞准备完毕、未连接
+
+
+class OSDRatePolicy:
+    def __init__(self, drc_controler, ser_puberlisher, scheduler: DRCScheduler = None, writer=print):
+        self.drc = drc_controler
+        self.ser = ser_puberlisher
+        self.gateway_sn = drc_controler.gateway_sn
+        self.flight_state = drc_controler.flight_state
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.demands = {}           # 来源 -> Hz
+        self.entered = False        # 已成功进入 DRC 模式
+        self.requesting = None      # 在途请求的频率
+        self.applied = None         # 当前生效的频率
+        self.lower_since = None
+        self.failed_at = None
+        # 统计
+        self.requests = 0
+        self.failures = 0
+        self.rate_time = {}         # Hz -> 累计秒数
+        self.last_tick = None
+        self.scheduler = scheduler or drc_controler.scheduler
+        self.scheduler.add((self.gateway_sn, "osd_rate"), self._tick, OSD_RATE_CHECK, persistent=True)
+
+    def set_demand(self, source, hz=None):
+        """登记 source 所需的 OSD 频率, hz 为 None 时撤销"""
+        with self.lock:
+            if hz is None:
+                self.demands.pop(source, None)
+            else:
+                self.demands[source] = hz
+        self.update()
+
+    def target(self) -> int:
+        with self.lock:
+            demand = max(self.demands.values(), default=0)
+        if self.drc.scheduler.get(self.drc.stick_key) is not None:
+            demand = max(demand, OSD_RATE_CONTROL)
+        mode_code = self.flight_state.snapshot().mode_code
+        return max(demand, OSD_RATE_IDLE if mode_code in GROUND_MODES else OSD_RATE_AIRBORNE)
+
+    def update(self):
+        target = self.target()
+        now = time.perf_counter()
+        with self.lock:
+            if not self.entered or self.requesting is not None:
+                return
+            if target == self.applied:
+                self.lower_since = None
+                return
+            if self.failed_at is not None and now - self.failed_at < OSD_RATE_RETRY:
+                return
+            if self.applied is not None and target < self.applied:
+                self.lower_since = self.lower_since or now
+                if now - self.lower_since < OSD_RATE_HOLD:
+                    return
+            self.lower_since = None
+            self.requesting = target
+        self.ser.publish_enter_live_flight_controls_mode(target)
+
+    def on_enter(self, osd_frequency, future):
+        """Ser_puberlisher 每次发送 drc_mode_enter 时调用 (含菜单手动进入)"""
+        with self.lock:
+            self.requesting = osd_frequency
+            self.requests += 1
+        future.add_done_callback(lambda f: self._on_reply(osd_frequency, f))
+
+    def _on_reply(self, osd_frequency, future):
+        ok = not future.cancelled() and future.exception() is None and (future.result() or {}).get("result", 0) == 0
+        with self.lock:
+            self.requesting = None
+            if ok:
+                self.entered = True
+                self.applied = osd_frequency
+                self.failed_at = None
+            else:
+                self.failures += 1
+                self.failed_at = time.perf_counter()
+        if ok and self.drc.is_print:
+            self.writer(f"无人机{self.gateway_sn} OSD 频率 {osd_frequency} Hz")
+        self.update()
+
+    def _tick(self, now):
+        if self.applied is not None and self.last_tick is not None:
+            self.rate_time[self.applied] = self.rate_time.get(self.applied, 0.0) + now - self.last_tick
+        self.last_tick = now
+        self.update()
+        return True
+
+    def stop(self):
+        self.scheduler.cancel((self.gateway_sn, "osd_rate"))
+
+    def get_stats_str(self):
+        total = sum(self.rate_time.values())
+        mean = sum(hz * seconds for hz, seconds in self.rate_time.items()) / total if total else None
+        text = (f"OSD 频率: 当前 {self.applied if self.applied is not None else '未设置'} Hz, 目标 {self.target()} Hz, "
+                f"需求 {dict(self.demands) or '无'}, drc_mode_enter {self.requests} 次 (失败 {self.failures})")
+        if mean is not None:
+            text += f", 平均 {mean:.1f} Hz (固定 {OSD_RATE_CONTROL} Hz 的 {mean / OSD_RATE_CONTROL * 100:.0f}%)"
+        return text
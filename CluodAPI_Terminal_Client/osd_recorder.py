@@ -0,0 +1,175 @@
+"""后台缓冲的 OSD 记录器
+
+paho 网络线程只把 (timestamp, data) 放入有界队列, 不做任何文件操作;
+独立的写线程批量写入、按间隔 flush, 并按文件大小/时长滚动。
+队列满时直接丢弃并计数, 保证开启记录不会拖慢遥测接收。
+"""
+import os
+import queue
+import threading
+import time
+from CluodAPI_Terminal_Client import json_codec
+
+
+class JsonLinesSink:
+    """JSON 行格式, 每行 {"timestamp": ..., "data": {...}}, 与原 out/osd_data_N.json 一致"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+
+    def write_batch(self, records):
+        chunk = b"".join([json_codec.dumps({"timestamp": ts, "data": data}) + b"\n" for ts, data in records])
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class OSDRecorder:
+    def __init__(
+        self,
+        path: str,
+        sink_factory=JsonLinesSink,
+        max_queue: int = 4096,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_seconds: float = 3600.0,
+        writer=print,
+    ):
+        self.path = path
+        self.sink_factory = sink_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.writer = writer
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.stop_event = threading.Event()
+        # 保护 thread / stop_event 的启停交接与 dropped (网络线程与写线程都会累加)
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.sink = None
+        self.sink_opened = 0.0
+        # 统计
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.rotations = 0
+
+    # --- 生产者侧(网络线程) ---
+    def record(self, timestamp, data):
+        """非阻塞地提交一条 OSD 记录, 队列已满时丢弃并返回 False"""
+        try:
+            self.queue.put_nowait((timestamp, data))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        self.recorded += 1
+        return True
+
+    # --- 启停 ---
+    def start(self):
+        with self.lock:
+            # stop() 超时后写线程可能仍在写剩余记录: 清除停止标志让它继续运行;
+            # 已决定退出的写线程在同一把锁下清空了 self.thread, 此时启动新线程
+            self.stop_event.clear()
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """停止写线程, 写完队列中剩余的记录后关闭文件"""
+        with self.lock:
+            self.stop_event.set()
+            thread = self.thread
+        if thread:
+            thread.join(timeout)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def get_stats_str(self):
+        return f"已提交 {self.recorded} 条, 已写入 {self.written} 条, 丢弃 {self.dropped} 条, 文件滚动 {self.rotations} 次"
+
+    # --- 写线程 ---
+    def _open_sink(self):
+        save_dir = os.path.dirname(self.path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        self.sink = self.sink_factory(self.path)
+        self.sink_opened = time.time()
+
+    def _rotate(self):
+        """关闭当前文件并以打开时间重命名, 之后在原路径重新开始记录"""
+        self.sink.close()
+        stem, suffix = os.path.splitext(self.path)
+        rotated = f"{stem}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.sink_opened))}{suffix}"
+        index = 1
+        while os.path.exists(rotated):
+            rotated = f"{stem}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.sink_opened))}_{index}{suffix}"
+            index += 1
+        os.replace(self.path, rotated)
+        self.rotations += 1
+        self._open_sink()
+
+    def _drain(self, batch, block_timeout):
+        try:
+            batch.append(self.queue.get(timeout=block_timeout))
+        except queue.Empty:
+            return
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run(self):
+        try:
+            self._open_sink()
+        except Exception as e:
+            self.writer(f"❌ 打开 OSD 记录文件失败: {e}")
+            return
+        last_flush = time.time()
+        try:
+            while True:
+                stopping = self.stop_event.is_set()
+                batch = []
+                self._drain(batch, 0 if stopping else max(0.0, last_flush + self.flush_interval - time.time()))
+                if batch:
+                    try:
+                        self.sink.write_batch(batch)
+                        self.written += len(batch)
+                    except Exception as e:
+                        with self.lock:
+                            self.dropped += len(batch)
+                        self.writer(f"❌ 保存 OSD 数据失败: {e}")
+                now = time.time()
+                if now - last_flush >= self.flush_interval:
+                    self.sink.flush()
+                    last_flush = now
+                    if self.sink.size >= self.max_bytes or now - self.sink_opened >= self.max_seconds:
+                        self._rotate()
+                if stopping and not batch:
+                    with self.lock:
+                        # start() 可能已清除停止标志, 此时继续运行; 退出前在锁内关闭文件, 新的写线程随后才会打开
+                        if self.stop_event.is_set():
+                            self._close_sink()
+                            self.thread = None
+                            return
+        except Exception as e:
+            self.writer(f"❌ OSD 记录线程异常退出: {e}")
+            self._close_sink()
+
+    def _close_sink(self):
+        try:
+            self.sink.close()
+        except Exception:
+            pass
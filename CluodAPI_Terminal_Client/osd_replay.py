@@ -0,0 +1,133 @@
+"""OSD 记录回放引擎
+
+读取 out/osd_data_*.json (JSON 行) 或 .osdc (列式二进制) 记录, 还原为 drc/up 上的 osd_info_push 消息,
+按原始时间间隔 (可按倍速缩放) 或尽可能快地送入真实的客户端处理逻辑:
+- 直接调用 DJIMQTTClient.on_message
+- 或发布到 LoopbackBroker, 经订阅/路由走完整的接收路径
+多架无人机的记录按时间戳合并后回放。
+"""
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.telemetry_log import SUFFIX as OSDC_SUFFIX, TelemetryLogReader
+
+
+def load_osd_records(path):
+    """逐条产出 (timestamp, data)"""
+    if path.endswith(OSDC_SUFFIX):
+        with TelemetryLogReader(path) as reader:
+            names = [name for name in reader.names if name != "timestamp"]
+            columns = [reader[name].tolist() for name in names]
+            for i, ts in enumerate(reader["timestamp"].tolist()):
+                yield ts, {name: column[i] for name, column in zip(names, columns)}
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record["timestamp"], record["data"]
+
+
+def gateway_code_from_path(path, default):
+    """out/osd_data_N.json -> N, 无法识别时返回 default"""
+    match = re.search(r"osd_data_(\d+)", os.path.basename(path))
+    return int(match.group(1)) if match else default
+
+
+def assign_sources(paths, sn_list):
+    """按文件名中的编号 N 把 osd_data_N 记录分配给 sn_list[N], 返回 [(N, gateway_sn, path)]"""
+    assigned = []
+    for i, path in enumerate(paths):
+        code = gateway_code_from_path(path, i)
+        gateway_sn = sn_list[code] if code < len(sn_list) else f"REPLAY{code:03d}"
+        assigned.append((code, gateway_sn, path))
+    return assigned
+
+
+class OSDReplayer:
+    def __init__(self, sources: dict, speed: float = 1.0, max_gap: float = 5.0, preload: bool = None, writer=print):
+        """sources: {gateway_sn: 记录文件路径}; speed: 回放倍速, 0 表示不等待、尽可能快;
+        max_gap: 记录中超过该秒数的空档(多次飞行之间)压缩为 max_gap;
+        preload: 回放前先把全部消息编码好, 默认在 speed=0 (测吞吐) 时开启"""
+        self.sources = sources
+        self.speed = speed
+        self.max_gap = max_gap
+        self.preload = speed <= 0 if preload is None else preload
+        self.writer = writer
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        # 统计
+        self.sent = 0
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+
+    @staticmethod
+    def _stream(gateway_sn, path):
+        topic = f"thing/product/{gateway_sn}/drc/up"
+        for ts, data in load_osd_records(path):
+            yield ts, topic, data
+
+    def _messages(self):
+        """按时间戳合并所有无人机的记录, 产出 (timestamp, topic, payload)"""
+        streams = [self._stream(gateway_sn, path) for gateway_sn, path in self.sources.items()]
+        seq = itertools.count()
+        for ts, topic, data in heapq.merge(*streams, key=lambda item: item[0]):
+            message = {"data": data, "method": "osd_info_push", "seq": next(seq), "timestamp": int(ts * 1000)}
+            yield ts, topic, json_codec.dumps(message)
+
+    def run(self, sink):
+        """阻塞回放, sink(topic, payload) 负责把消息送入客户端"""
+        self.sent = 0
+        self.max_lag = 0.0
+        messages = list(self._messages()) if self.preload else self._messages()
+        start = time.perf_counter()
+        first_ts = None
+        last_ts = None
+        skipped = 0.0
+        for ts, topic, payload in messages:
+            if self.stop_event.is_set():
+                break
+            if self.speed > 0:
+                if first_ts is None:
+                    first_ts = last_ts = ts
+                if ts - last_ts > self.max_gap:
+                    skipped += ts - last_ts - self.max_gap
+                last_ts = ts
+                deadline = start + (ts - first_ts - skipped) / self.speed
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    if self.stop_event.wait(delay):
+                        break
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            sink(topic, payload)
+            self.sent += 1
+        self.elapsed = time.perf_counter() - start
+
+    def start_in_thread(self, sink, daemon: bool = True):
+        if self.thread and self.thread.is_alive():
+            return self.thread
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run_and_report, args=(sink,), daemon=daemon)
+        self.thread.start()
+        return self.thread
+
+    def _run_and_report(self, sink):
+        try:
+            self.run(sink)
+        except Exception as e:
+            self.writer(f"❌ 回放出错: {e}")
+        self.writer(f"回放结束: {self.get_stats_str()}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats_str(self):
+        rate = self.sent / self.elapsed if self.elapsed > 0 else 0.0
+        return f"{self.sent} 条消息, 用时 {self.elapsed:.2f} 秒, {rate:.0f} msg/s, 最大落后 {self.max_lag * 1000:.1f} ms"
@@ -0,0 +1,146 @@
+"""服务请求/应答关联表
+
+原先 publish 之后用 time.sleep(0.1) 轮询 flyto_reply_flag / flyto_state_code, 每架无人机同时只能有一个请求,
+每个等待方占用一个线程。PendingRequests 按 tid 登记请求、按 fly_to_id 登记指点飞行,
+services_reply / fly_to_point_progress 到达时由网络线程完成对应的 concurrent.futures.Future:
+- add_request(tid) -> Future, 结果为应答消息的 data; 超时则 Future 抛出 TimeoutError
+- add_flyto(fly_to_id) -> Future, 结果为最后一条进度事件的 data (status 为 wayline_ok/failed/cancel);
+  超时按"无进度更新"计, 每条进度事件都会刷新截止时间
+超时由调度器上的清理流检查, 表空时清理流自动结束。Future 可用 asyncio.wrap_future 转为 awaitable。
+"""
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler, get_scheduler
+
+REPLY_TIMEOUT = 10.0        # 等待 services_reply 的超时 (秒)
+PROGRESS_TIMEOUT = 10.0     # 指点飞行无进度更新的超时 (秒)
+SWEEP_FREQ = 5.0            # 超时检查频率 (Hz)
+
+FLYTO_FINAL_STATUS = ("wayline_ok", "wayline_failed", "wayline_cancel")
+
+
+def _complete(future: Future, result=None, exception: BaseException = None) -> bool:
+    """完成 Future; 已被取消或完成 (如在出表之后被 discard_flyto 取消) 时返回 False"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        return False
+    return True
+
+
+class PendingEntry:
+    __slots__ = ("future", "method", "deadline", "timeout", "on_progress")
+
+    def __init__(self, future, method, timeout, on_progress=None):
+        self.future = future
+        self.method = method
+        self.timeout = timeout
+        self.deadline = time.perf_counter() + timeout
+        self.on_progress = on_progress
+
+
+class PendingRequests:
+    def __init__(self, owner, scheduler: DRCScheduler = None, writer=print):
+        """owner: 通常为 gateway_sn, 用作调度流 key"""
+        self.owner = owner
+        self.scheduler = scheduler or get_scheduler()
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.requests = {}  # tid -> PendingEntry
+        self.flytos = {}    # fly_to_id -> PendingEntry
+        self.sweeping = False
+        # 统计
+        self.resolved = 0
+        self.timed_out = 0
+        self.unmatched = 0
+
+    def _ensure_sweeper(self):
+        # 调用方持有 self.lock
+        if not self.sweeping:
+            self.sweeping = True
+            self.scheduler.add((self.owner, "pending"), self._sweep, SWEEP_FREQ, on_done=self._sweeper_done)
+
+    def _sweeper_done(self, stream):
+        # 清理流因连续出错被调度器结束时, 允许下一次登记重新启动
+        with self.lock:
+            if self.scheduler.get(stream.key) is None:
+                self.sweeping = False
+
+    def add_request(self, tid, method, timeout: float = REPLY_TIMEOUT) -> Future:
+        future = Future()
+        with self.lock:
+            self.requests[tid] = PendingEntry(future, method, timeout)
+            self._ensure_sweeper()
+        return future
+
+    def add_flyto(self, fly_to_id, timeout: float = PROGRESS_TIMEOUT, on_progress=None) -> Future:
+        """on_progress(data) 在每条 wayline_progress 事件时于网络线程中调用"""
+        future = Future()
+        with self.lock:
+            self.flytos[fly_to_id] = PendingEntry(future, "fly_to_point", timeout, on_progress)
+            self._ensure_sweeper()
+        return future
+
+    def discard_flyto(self, fly_to_id):
+        with self.lock:
+            entry = self.flytos.pop(fly_to_id, None)
+        if entry is not None:
+            entry.future.cancel()
+
+    def resolve_reply(self, message) -> bool:
+        """services_reply 到达时调用, 返回是否匹配到等待中的请求"""
+        with self.lock:
+            entry = self.requests.pop(message.get("tid", None), None)
+        if entry is None:
+            self.unmatched += 1
+            return False
+        if _complete(entry.future, message.get("data", None)):
+            self.resolved += 1
+        return True
+
+    def resolve_progress(self, data) -> bool:
+        """fly_to_point_progress 事件到达时调用"""
+        fly_to_id = data.get("fly_to_id", None)
+        status = data.get("status", None)
+        with self.lock:
+            entry = self.flytos.get(fly_to_id)
+            if entry is None:
+                self.unmatched += 1
+                return False
+            if status in FLYTO_FINAL_STATUS:
+                del self.flytos[fly_to_id]
+            else:
+                entry.deadline = time.perf_counter() + entry.timeout
+        if status in FLYTO_FINAL_STATUS:
+            if _complete(entry.future, data):
+                self.resolved += 1
+        elif entry.on_progress is not None:
+            entry.on_progress(data)
+        return True
+
+    def _sweep(self, now):
+        expired = []
+        with self.lock:
+            for table in (self.requests, self.flytos):
+                for key in [key for key, entry in table.items() if entry.deadline <= now]:
+                    expired.append((key, table.pop(key)))
+            if not self.requests and not self.flytos:
+                self.sweeping = False
+                keep = False
+            else:
+                keep = True
+        for key, entry in expired:
+            # 同一轮中先到期的回调可能已取消后面的 Future (例如指点飞行的应答超时取消进度等待)
+            if _complete(entry.future, exception=TimeoutError(f"{entry.method} {key} 超时 ({entry.timeout:.0f} 秒)")):
+                self.timed_out += 1
+        return keep
+
+    def __len__(self):
+        return len(self.requests) + len(self.flytos)
+
+    def get_stats_str(self):
+        return f"等待中 {len(self)}, 已完成 {self.resolved}, 超时 {self.timed_out}, 未匹配 {self.unmatched}"
@@ -0,0 +1,257 @@
+"""按优先级排队的下行发布
+
+原先一架无人机 (机群模式下是所有无人机) 的心跳、50 Hz 杆量、云台/变焦、return_home、降落杆量
+都直接调用同一个 paho 客户端的 publish, 全部进入同一个先进先出的发送队列; 发送阻塞时安全指令
+要排在所有已堆积的杆量之后。PriorityPublisher 每个客户端 (连接) 一个:
+- 交给 paho 但尚未写出 (on_publish 未触发) 的消息最多 window 条, 其余按优先级留在本地队列中
+- 有空位时先发 SAFETY (返航、降落、上锁), 再发 CONTROL (服务请求、心跳), 最后发 BULK (杆量、云台)
+- 安全指令最多等待 window 条已交给 paho 的消息写出, 与本地堆积多少批量消息无关
+- 在途消息超过 INFLIGHT_TIMEOUT 未写出 (如断线重连后 paho 清空了 QoS 0 队列) 时收回其名额并补发本地队列;
+  有在途消息期间调度器上的检查流定期收回, 不依赖下一次 publish
+- 尚未交给 paho 的消息可以原位替换内容、提升优先级或撤回 (StickLane 合并杆量、安全指令抢占时使用)
+- 按优先级统计从提交到写出的等待时间 (分位数与最大值)
+- 客户端有 MQTTTransport 时经其发送, 高频 topic 使用 MQTT 5 别名
+PublishNotifier 接管客户端的 on_publish, 按 mid 通知等待方, 原有的 on_publish 照常调用。
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler, get_scheduler
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+from CluodAPI_Terminal_Client.mqtt_transport import get_transport
+
+SAFETY = 0
+CONTROL = 1
+BULK = 2
+PRIORITY_NAMES = ("安全", "控制", "批量")
+
+PUBLISH_WINDOW = 16         # 交给 paho 尚未写出的消息上限
+INFLIGHT_TIMEOUT = 2.0      # 在途消息等待写出的上限 (秒)
+FIRED_MEMORY = 1024         # 记住最近多少个无人等待的 mid (写出早于登记时使用)
+RECLAIM_FREQ = 2.0          # 有在途消息时检查超时的频率 (Hz)
+
+
+class PublishNotifier:
+    def __init__(self, client):
+        self.client = client
+        self.previous = client.on_publish
+        self.lock = threading.Lock()
+        self.waiters = {}       # mid -> callback()
+        self.fired = set()      # 已写出但写出时尚未登记的 mid
+        self.fired_order = deque()
+        client.on_publish = self.on_publish
+
+    def watch(self, mid, callback):
+        """mid 写出时调用 callback(); 若已经写出则立即调用"""
+        with self.lock:
+            if mid in self.fired:
+                self.fired.discard(mid)
+            else:
+                self.waiters[mid] = callback
+                return
+        callback()
+
+    def unwatch(self, mid):
+        with self.lock:
+            self.waiters.pop(mid, None)
+
+    def on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        if self.previous is not None:
+            self.previous(client, userdata, mid, reason_code, properties)
+        with self.lock:
+            callback = self.waiters.pop(mid, None)
+            if callback is None:
+                self.fired.add(mid)
+                self.fired_order.append(mid)
+                if len(self.fired_order) > FIRED_MEMORY:
+                    self.fired.discard(self.fired_order.popleft())
+                return
+        callback()
+
+
+class PublishItem:
+    __slots__ = ("topic", "payload", "qos", "properties", "priority", "on_sent", "queued_at", "sent_at")
+
+    def __init__(self, topic, payload, qos, properties, priority, on_sent):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.properties = properties
+        self.priority = priority
+        self.on_sent = on_sent
+        self.queued_at = time.perf_counter()
+        self.sent_at = None
+
+
+class PriorityPublisher:
+    def __init__(self, client, window: int = PUBLISH_WINDOW, notifier: PublishNotifier = None, scheduler: DRCScheduler = None):
+        self.client = client
+        # 有 MQTTTransport 时经其发送 (topic 别名), 需先于 PriorityPublisher 创建
+        self.sender = get_transport(client) or client
+        self.window = window
+        self.notifier = notifier or get_publish_notifier(client)
+        self.scheduler = scheduler or get_scheduler()
+        self.lock = threading.Lock()
+        self.queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self.inflight = {}      # mid -> PublishItem, 按交给 paho 的顺序
+        self.reserved = 0       # 已占名额但尚未拿到 mid 的消息
+        self.sweeping = False
+        # 统计
+        self.latency = tuple(RollingStats() for _ in PRIORITY_NAMES)
+        self.latency_max = [0.0 for _ in PRIORITY_NAMES]
+        self.sent = [0 for _ in PRIORITY_NAMES]
+        self.queued_max = 0
+        self.lost = 0
+        self.failed = 0
+
+    def publish(self, topic, payload, priority: int = CONTROL, qos: int = 0, properties=None, on_sent=None) -> PublishItem:
+        """提交一条消息; on_sent() 在消息写出 (QoS 1 为收到 PUBACK) 后调用; 返回的 PublishItem 可用于 requeue / withdraw"""
+        item = PublishItem(topic, payload, qos, properties, priority, on_sent)
+        with self.lock:
+            reclaimed = self._reclaim(item.queued_at)
+            send = len(self.inflight) + self.reserved < self.window and not any(self.queues[p] for p in range(priority + 1))
+            if send:
+                self.reserved += 1
+            else:
+                self.queues[priority].append(item)
+                queued = sum(len(queue) for queue in self.queues)
+                if queued > self.queued_max:
+                    self.queued_max = queued
+        if send:
+            self._send(item)
+        if reclaimed:
+            # 收回的名额补发本地队列, 否则排在非空队列之后的新消息永远发不出去
+            self._drain()
+        return item
+
+    def requeue(self, item: PublishItem, payload, priority: int) -> bool:
+        """item 仍在本地队列时原位替换内容, 优先级更高时移到对应队列末尾; 已交给 paho 时返回 False"""
+        with self.lock:
+            queue = self.queues[item.priority]
+            if item not in queue:
+                return False
+            item.payload = payload
+            if priority < item.priority:
+                # 不在这里补发: 调用方可能持有自己的锁, 而写出回调会在同一线程中进入 on_sent
+                queue.remove(item)
+                item.priority = priority
+                self.queues[priority].append(item)
+        return True
+
+    def withdraw(self, item: PublishItem) -> bool:
+        """item 仍在本地队列时撤回 (不再发送, 不调用 on_sent); 已交给 paho 时返回 False"""
+        with self.lock:
+            try:
+                self.queues[item.priority].remove(item)
+            except ValueError:
+                return False
+        return True
+
+    def _reclaim(self, now) -> int:
+        """调用方持有 self.lock; 收回超时未写出的在途名额, 返回收回条数"""
+        reclaimed = 0
+        while self.inflight:
+            mid, item = next(iter(self.inflight.items()))
+            if now - item.sent_at <= INFLIGHT_TIMEOUT:
+                break
+            del self.inflight[mid]
+            self.notifier.unwatch(mid)
+            self.lost += 1
+            reclaimed += 1
+        return reclaimed
+
+    def _sweep(self, now):
+        """调度线程中定期收回超时名额; 没有在途消息时结束"""
+        with self.lock:
+            reclaimed = self._reclaim(now)
+            keep = bool(self.inflight)
+            if not keep:
+                self.sweeping = False
+        if reclaimed:
+            self._drain()
+        return keep
+
+    def _sweeper_done(self, stream):
+        # 检查流因连续出错被调度器结束时, 允许下一次发送重新启动
+        with self.lock:
+            if self.scheduler.get(stream.key) is None:
+                self.sweeping = False
+
+    def _send(self, item):
+        """名额已在 self.reserved 中占好"""
+        item.sent_at = time.perf_counter()
+        info = self.sender.publish(item.topic, item.payload, qos=item.qos, properties=item.properties)
+        with self.lock:
+            self.reserved -= 1
+            if info.rc == 0:
+                self.inflight[info.mid] = item
+                if not self.sweeping:
+                    self.sweeping = True
+                    self.scheduler.add(("publish_lanes", id(self)), self._sweep, RECLAIM_FREQ, on_done=self._sweeper_done)
+        if info.rc != 0:
+            # 未连接等, paho 已丢弃该消息
+            self.failed += 1
+            self._drain()
+            return
+        mid = info.mid
+        self.notifier.watch(mid, lambda: self._on_written(mid))
+
+    def _on_written(self, mid):
+        with self.lock:
+            item = self.inflight.pop(mid, None)
+        if item is not None:
+            wait = time.perf_counter() - item.queued_at
+            self.latency[item.priority].add(wait)
+            if wait > self.latency_max[item.priority]:
+                self.latency_max[item.priority] = wait
+            self.sent[item.priority] += 1
+            if item.on_sent is not None:
+                item.on_sent()
+        self._drain()
+
+    def _drain(self):
+        """按优先级把本地队列中的消息补进空出的名额"""
+        items = []
+        with self.lock:
+            for queue in self.queues:
+                while queue and len(self.inflight) + self.reserved < self.window:
+                    items.append(queue.popleft())
+                    self.reserved += 1
+        for item in items:
+            self._send(item)
+
+    def pending(self):
+        return sum(len(queue) for queue in self.queues)
+
+    def get_stats_str(self):
+        lines = [f"发布队列: 在途 {len(self.inflight)}/{self.window}, 排队 {self.pending()} (最多 {self.queued_max}), 超时 {self.lost}, 失败 {self.failed}"]
+        for priority, name in enumerate(PRIORITY_NAMES):
+            lines.append(self.latency[priority].format_ms(f"{name} 等待") + f", 最大 {self.latency_max[priority] * 1000:.1f} ms")
+        return "\n".join(lines)
+
+
+_lock = threading.Lock()
+_notifiers = weakref.WeakKeyDictionary()
+_publishers = weakref.WeakKeyDictionary()
+
+
+def get_publish_notifier(client) -> PublishNotifier:
+    """每个客户端 (含机群共用的连接) 一个 PublishNotifier"""
+    with _lock:
+        notifier = _notifiers.get(client)
+        if notifier is None:
+            notifier = PublishNotifier(client)
+            _notifiers[client] = notifier
+        return notifier
+
+
+def get_priority_publisher(client) -> PriorityPublisher:
+    """每个客户端 (含机群共用的连接) 一个 PriorityPublisher, 同一连接上各机的消息统一排优先级"""
+    notifier = get_publish_notifier(client)
+    with _lock:
+        publisher = _publishers.get(client)
+        if publisher is None:
+            publisher = PriorityPublisher(client, notifier=notifier)
+            _publishers[client] = publisher
+        return publisher
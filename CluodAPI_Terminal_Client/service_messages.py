@@ -0,0 +1,123 @@
+"""服务请求消息预编码
+
+原先 services_publisher 为每种请求保留一个模块级 dict, bid/tid 只在导入时生成一次,
+每次发布再展开拷贝并 json.dumps。ServiceMessageBuilder 每架无人机 (gateway_sn) 一个:
+- 构造时把各请求中不变的部分 (method 与固定的 data) 编码成字节片段
+- 每次调用生成新的 bid/tid 和毫秒时间戳, 与片段拼接一次得到最终的 payload
+- 会变的字段 (fly_to_id、航点、video_id、直播质量、osd_frequency) 只编码这一部分,
+  video_id 按 device_sn、drc_mode_enter 按 osd_frequency 缓存编码结果
+- 不修改任何共享的可变对象, 多线程同时为同一架或多架无人机构造消息都是安全的
+
+每个方法返回 ServiceMessage(method, tid, payload), payload 为可直接发布的 UTF-8 bytes,
+tid 用于在 PendingRequests 中等待应答。
+"""
+import time
+from collections import namedtuple
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.fly_utils import generate_uuid
+
+ServiceMessage = namedtuple("ServiceMessage", ("method", "tid", "payload"))
+
+USER_CALLSIGN = "WUDIZHR"
+USER_ID = "123456"
+DEFAULT_OSD_FREQ = 50
+DEFAULT_MAX_SPEED = 12
+
+_BID = b'{"bid":"'
+_TID = b'","tid":"'
+_TIMESTAMP = b'","timestamp":'
+
+_join = b"".join
+
+
+def _number(value) -> bytes:
+    if type(value) is int:
+        return b"%d" % value
+    return b"%r" % float(value)
+
+
+def _method_head(method) -> bytes:
+    return b',"method":' + json_codec.dumps(method) + b',"data":'
+
+
+class ServiceMessageBuilder:
+    def __init__(self, gateway_sn, host_addr, rtmp_url=None, osd_frequency: int = DEFAULT_OSD_FREQ,
+                 user_callsign: str = USER_CALLSIGN, user_id: str = USER_ID):
+        """rtmp_url: live_start_push 的推流地址"""
+        self.gateway_sn = gateway_sn
+        self.host_addr = host_addr
+        self.osd_frequency = osd_frequency
+        dumps = json_codec.dumps
+        self._auth_tail = _method_head("cloud_control_auth_request") + dumps({
+            "control_keys": ["flight"],
+            "user_callsign": user_callsign,
+            "user_id": user_id,
+        }) + b"}"
+        self._return_home_tail = _method_head("return_home") + dumps("null") + b"}"
+        self._flyto_head = _method_head("fly_to_point") + b'{"fly_to_id":'
+        self._live_start_head = _method_head("live_start_push") + b'{"url":' + dumps(rtmp_url or "") + b',"url_type":1,"video_id":'
+        self._live_stop_head = _method_head("live_stop_push") + b'{"video_id":'
+        self._live_quality_head = _method_head("live_set_quality") + b'{"video_id":'
+        # 缓存: osd_frequency -> drc_mode_enter 尾部; device_sn -> 编码后的 video_id
+        self._drc_enter_tails = {}
+        self._video_ids = {}
+
+    def _envelope(self, method, tail) -> ServiceMessage:
+        tid = generate_uuid()
+        payload = _join((_BID, generate_uuid().encode(), _TID, tid.encode(), _TIMESTAMP,
+                         b"%d" % (time.time_ns() // 1000000), tail))
+        return ServiceMessage(method, tid, payload)
+
+    def _video_id(self, device_sn) -> bytes:
+        video_id = self._video_ids.get(device_sn)
+        if video_id is None:
+            # video_id 格式: {aircraft_sn}/{payload_index}/{video_index}
+            video_id = json_codec.dumps(f"{device_sn}/88-0-0/normal-0")
+            self._video_ids[device_sn] = video_id
+        return video_id
+
+    def _drc_enter_tail(self, osd_frequency) -> bytes:
+        tail = self._drc_enter_tails.get(osd_frequency)
+        if tail is None:
+            tail = _method_head("drc_mode_enter") + json_codec.dumps({
+                "hsi_frequency": 1,
+                "mqtt_broker": {
+                    "address": f"{self.host_addr}:1883",
+                    "client_id": f"sn_{self.gateway_sn}",
+                    "enable_tls": "false",
+                    "expire_time": 1672744922,
+                    "password": "jwt_token",
+                    "username": "sn_a_username"
+                },
+                "osd_frequency": osd_frequency,
+            }) + b"}"
+            self._drc_enter_tails[osd_frequency] = tail
+        return tail
+
+    def cloud_control_auth_request(self) -> ServiceMessage:
+        return self._envelope("cloud_control_auth_request", self._auth_tail)
+
+    def drc_mode_enter(self, osd_frequency: int = None) -> ServiceMessage:
+        return self._envelope("drc_mode_enter", self._drc_enter_tail(osd_frequency or self.osd_frequency))
+
+    def return_home(self) -> ServiceMessage:
+        return self._envelope("return_home", self._return_home_tail)
+
+    def fly_to_point(self, fly_to_id, points, max_speed=None) -> ServiceMessage:
+        """points: [(lat, lon, 绝对高度)]"""
+        # 航点列表长度不定, 交给 json_codec 编码 (浮点格式化是主要开销, orjson 快得多)
+        rendered = json_codec.dumps([{"height": float(height), "latitude": float(lat), "longitude": float(lon)} for lat, lon, height in points])
+        tail = _join((self._flyto_head, json_codec.dumps(fly_to_id), b',"max_speed":', _number(max_speed or DEFAULT_MAX_SPEED),
+                      b',"points":', rendered, b"}}"))
+        return self._envelope("fly_to_point", tail)
+
+    def live_start_push(self, device_sn, video_quality: int) -> ServiceMessage:
+        tail = _join((self._live_start_head, self._video_id(device_sn), b',"video_quality":', b"%d" % video_quality, b"}}"))
+        return self._envelope("live_start_push", tail)
+
+    def live_stop_push(self, device_sn) -> ServiceMessage:
+        return self._envelope("live_stop_push", _join((self._live_stop_head, self._video_id(device_sn), b"}}")))
+
+    def live_set_quality(self, device_sn, video_quality: int) -> ServiceMessage:
+        tail = _join((self._live_quality_head, self._video_id(device_sn), b',"video_quality":', b"%d" % video_quality, b"}}"))
+        return self._envelope("live_set_quality", tail)
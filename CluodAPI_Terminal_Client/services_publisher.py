@@ -1,8 +1,11 @@
-import time
-import json
-import time
-from CluodAPI_Terminal_Client.fly_utils import generate_uuid
 import threading
+import time
+from concurrent.futures import Future
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.service_messages import ServiceMessageBuilder, ServiceMessage
+from CluodAPI_Terminal_Client.pending_requests import PendingRequests, REPLY_TIMEOUT, PROGRESS_TIMEOUT
+from CluodAPI_Terminal_Client.flyto_mission import FlyToMission, FLYTO_MAX_POINTS, MISSION_LEAD_TIME
+from CluodAPI_Terminal_Client.publish_lanes import SAFETY, CONTROL, BULK, get_priority_publisher
 
 OSD_FREQ = 50
 
@@ -13,76 +16,19 @@ VIDEO_QUALITY = 1  # 0=自适应, 1=流畅, 2=标清, 3=高清, 4=超清
 video_id = "1581F7FVC257X00D6KZ2/88-0-0/normal-0"
 
 
-request_cloud_control_authorization_message = {
-    "bid": generate_uuid(),
-    "data": {
-        "control_keys": [
-            "flight"
-        ],
-        "user_callsign": "WUDIZHR",
-        "user_id": "123456"
-    },
-    "method": "cloud_control_auth_request",
-    "tid": generate_uuid(),
-    "timestamp": 1654070968655
-}
-
-enter_live_flight_controls_mode_message = {
-    "bid": generate_uuid(),
-    "data": {
-        "hsi_frequency": 1,
-        "mqtt_broker": {
-            "address": f"host_addr:1883", # 替换为实际的 MQTT 代理地址
-            "client_id": "sn_a",
-            "enable_tls": "false",
-            "expire_time": 1672744922,
-            "password": "jwt_token",
-            "username": "sn_a_username"
-        },
-
-        "osd_frequency": OSD_FREQ,
-    },
-    "tid": generate_uuid(),
-    "timestamp": 1654070968655,
-    "method": "drc_mode_enter"    
-}
-
-flyto_message = {
-    "bid": generate_uuid(),
-    "data": {
-        "fly_to_id": generate_uuid(),
-        "max_speed": 12,
-        "points": [
-            {
-                "height": 0,
-                "latitude": 0,
-                "longitude": 0
-            }
-        ]
-    },
-    "tid": generate_uuid(),
-    "timestamp": 1654070968655,
-    "method": "fly_to_point"    
-}
-
-return_home_message = {
-	"bid": "f9f07aad-d1f1-4dc1-8ad0-a3417fd365cc",
-	"data": "null",
-	"method": "return_home",
-	"tid": "b103b00a-3fcc-476e-9cb6-bc5e27d2defd",
-	"timestamp": 1734425015702
-}
-
-
 flyto_dict = {100:"暂未收到返回数据", 101:"取消飞向目标点", 102:"执行失败", 103:"执行成功，已飞向目标点", 104:"执行中"}
 
 class Ser_puberlisher:
-    def __init__(self, gateway_sn, client, host_addr, flight_state, time_counter, gateway_sn_code, writer=print, main_writer=print):
+    def __init__(self, gateway_sn, client, host_addr, flight_state, time_counter, gateway_sn_code, writer=print, main_writer=print,
+                 preempt_sticks=None):
+        """preempt_sticks: 安全指令 (返航) 发出前调用, 结束该机当前的杆量流"""
         self.gateway_sn = gateway_sn
         self.gateway_sn_code = gateway_sn_code
         self.topic = f"thing/product/{self.gateway_sn}/services"
         self.host_addr = host_addr
         self.client = client
+        self.publisher = get_priority_publisher(client)
+        self.preempt_sticks = preempt_sticks
         self.is_print = False
         self.flyto_num = 0
         self.flyto_id = f"flyto_{self.gateway_sn}_{self.flyto_num}"
@@ -92,142 +38,174 @@ class Ser_puberlisher:
         self.flyto_time_counter = time_counter
         self.writer = writer
         self.main_writer = main_writer
+        # 按 tid / fly_to_id 等待应答, 应答由 DJIMQTTClient 的消息处理函数送入
+        self.pending = PendingRequests(self.gateway_sn, writer=writer)
+        self.mission = None
+        # 按需调整 OSD 频率 (OSDRatePolicy), 由 DJIMQTTClient 设置
+        self.osd_policy = None
+        # 每架无人机的请求消息模板, 每次构造都带新的 bid/tid/timestamp
+        self.messages = ServiceMessageBuilder(self.gateway_sn, self.host_addr, osd_frequency=OSD_FREQ,
+                                              rtmp_url=f'rtmp://81.70.222.38:1935/live/Drone00{self.gateway_sn_code + 1}')
+
+    def publish_request(self, message: ServiceMessage, timeout: float = REPLY_TIMEOUT, priority: int = CONTROL) -> Future:
+        """发布一条服务请求, 返回在对应 services_reply 到达时完成的 Future (结果为应答的 data)"""
+        future = self.pending.add_request(message.tid, message.method, timeout)
+        self.publisher.publish(self.topic, message.payload, priority)
+        return future
 
     def publish_request_cloud_control_authorization(self):
-        request_cloud_control_authorization_message["timestamp"] = int(time.time() * 1000)
-        self.client.publish(self.topic, payload=json.dumps(request_cloud_control_authorization_message))
+        future = self.publish_request(self.messages.cloud_control_auth_request())
         if self.is_print:
             self.writer(f"✅ 请求云端控制指令已发布到 thing/product/{self.gateway_sn}/services")
-
-    def publish_enter_live_flight_controls_mode(self):
-        enter_live_flight_controls_mode_message["data"]["mqtt_broker"]["address"] = f"{self.host_addr}:1883"
-        enter_live_flight_controls_mode_message["data"]["mqtt_broker"]["client_id"] = f"sn_{self.gateway_sn}"
-        enter_live_flight_controls_mode_message["timestamp"] = int(time.time() * 1000)
-        self.client.publish(self.topic, payload=json.dumps(enter_live_flight_controls_mode_message))
+        return future
+
+    def publish_enter_live_flight_controls_mode(self, osd_frequency: int = None):
+        if osd_frequency is None and self.osd_policy is not None:
+            osd_frequency = self.osd_policy.target()
+        future = self.publish_request(self.messages.drc_mode_enter(osd_frequency))
+        if self.osd_policy is not None:
+            self.osd_policy.on_enter(osd_frequency or self.messages.osd_frequency, future)
         if self.is_print:
             self.writer(f"✅ 进入指令飞行控制模式指令已发布到 thing/product/{self.gateway_sn}/services")
+        return future
 
     def publish_return_home(self):
-        return_home_message["bid"] = generate_uuid()
-        return_home_message["tid"] = generate_uuid()
-        return_home_message["timestamp"] = int(time.time()  * 1000)
-        self.client.publish(self.topic, payload=json.dumps(return_home_message))
+        # 返航优先于排队中的杆量/云台消息, 并接替正在执行的杆量流和航线任务
+        if self.preempt_sticks is not None:
+            self.preempt_sticks()
+        if self.mission is not None:
+            self.mission.cancel()
+        future = self.publish_request(self.messages.return_home(), priority=SAFETY)
         if self.is_print:
             self.writer(f"✅ 一键返航指令已发布到 thing/product/{self.gateway_sn}/services")
+        return future
 
     def publish_start_live(self):
         # video_id 字符串，格式: {aircraft_sn}/{payload_index}/{video_index}
         self.writer(f"{self.flight_state.device_sn}/88-0-0/normal-0")
-        request_data = {
-            "url": f'rtmp://81.70.222.38:1935/live/Drone00{self.gateway_sn_code + 1}',
-            "url_type": 1,  # RTMP
-            "video_id": f"{self.flight_state.device_sn}/88-0-0/normal-0",
-            "video_quality": VIDEO_QUALITY
-        }
-        full_request = {
-            "bid": generate_uuid(),
-            "data": request_data,
-            "tid": generate_uuid(),
-            "timestamp": int(time.time() * 1000),
-            "method": "live_start_push"
-        }
-        self.client.publish(self.topic, payload=json.dumps(full_request))
+        future = self.publish_request(self.messages.live_start_push(self.flight_state.device_sn, VIDEO_QUALITY))
         self.writer(f"📤 无人机{self.gateway_sn}发送 MQTT 请求 (live_start_push)")
+        return future
 
     def publish_stop_live(self):
         # video_id 字符串，格式: {aircraft_sn}/{payload_index}/{video_index}
         self.writer(video_id)
-        request_data = {
-            "video_id":f"{self.flight_state.device_sn}/88-0-0/normal-0",
-        }
-        full_request = {
-            "bid": generate_uuid(),
-            "data": request_data,
-            "tid": generate_uuid(),
-            "timestamp": int(time.time() * 1000),
-            "method": "live_stop_push"
-        }
-        self.client.publish(self.topic, payload=json.dumps(full_request))
+        future = self.publish_request(self.messages.live_stop_push(self.flight_state.device_sn))
         self.writer(f"📤 无人机{self.gateway_sn}发送 MQTT 请求 (live_stop_push)")
+        return future
 
     def publish_live_set_quality(self, quality_level):
-        full_request = {
-            "bid": generate_uuid(),
-            "data": {
-                "video_id": f"{self.flight_state.device_sn}/88-0-0/normal-0",
-                "video_quality": quality_level
-            },
-            "tid": generate_uuid(),
-            "timestamp:": int(time.time() * 1000),
-            "method": "live_set_quality"
-        }
-        self.client.publish(self.topic, payload=json.dumps(full_request))
+        future = self.publish_request(self.messages.live_set_quality(self.flight_state.device_sn, quality_level))
         self.writer(f"📤 无人机{self.gateway_sn}发送 MQTT 请求 (live_set_quality)")
+        return future
 
-    def publish_flyto_command(self, lat, lon, height):
+    def build_flyto_message(self, fly_to_id, points, max_speed=None) -> ServiceMessage:
+        """points: [(lat, lon, 绝对高度)], 每次生成新的 bid/tid"""
+        return self.messages.fly_to_point(fly_to_id, points, max_speed)
+
+    def fly_to_point(self, lat, lon, height, reply_timeout: float = REPLY_TIMEOUT, progress_timeout: float = PROGRESS_TIMEOUT) -> Future:
+        """发布指点飞行 (height 为相对起飞点高度), 不阻塞;
+        返回的 Future 在飞行结束时完成: 结果为 True (wayline_ok) / False (拒绝、失败、取消或超时)"""
         height = self.flight_state.takeoff_height + height
-        flyto_message["data"]["points"][0]["latitude"] = lat
-        flyto_message["data"]["points"][0]["longitude"] = lon
-        flyto_message["data"]["points"][0]["height"] = height
-        flyto_message["data"]["fly_to_id"] = self.flyto_id
-        flyto_message["timestamp"] = int(time.time()  * 1000)
+        self.update_flyto_id()
+        fly_to_id = self.flyto_id
+        message = self.build_flyto_message(fly_to_id, [(lat, lon, height)])
+        done = Future()
+        # 先登记进度再发布, 避免事件先于登记到达
+        progress = self.pending.add_flyto(fly_to_id, progress_timeout)
         self.publish_flyto_reset()
-        self.client.publish(self.topic, payload=json.dumps(flyto_message))
+        reply = self.publish_request(message, reply_timeout)
 
         if self.is_print:
             self.writer(f"✅ 指点飞行指令已发布到 thing/product/{self.gateway_sn}/services")
         self.writer("="*50)
         self.writer("指点飞行指令详情:")
-        self.writer(f"指点飞行指令ID: {self.flyto_id}")
+        self.writer(f"指点飞行指令ID: {fly_to_id}")
         self.writer(f"目标点坐标: lat={lat}, lon={lon}, height={height}")
         self.writer("正在执行指点飞行指令...")
-        last_time = time.time()
-        while True:
-            now = time.time()
-            if self.flyto_reply_flag:
-                self.writer("✔ 收到指点飞行指令回复")
-                break
-            if now - last_time > 10:
-                self.writer("❌ 指点飞行指令发送超时，请检查连接是否正常")
-                return False
-            time.sleep(0.1)
-        # 同步
-        self.flyto_time_counter.update_now()
-        self.flyto_time_counter.update_last()
-        if self.flyto_reply_flag == 1:
-            self.writer("正在飞往目标点...")
-            while True:
-                self.writer(f'\r 当前状态: {flyto_dict[self.flyto_state_code]}', end='', flush=True)
-                if self.flyto_state_code in [102, 103]:
-                    self.writer()
-                    self.writer(f"指点飞行结束,执行结果: { flyto_dict[self.flyto_state_code]} ")
-                    if self.flyto_state_code == 103:
-                        return True
-                    else:
-                        return False
-                if self.flyto_time_counter.get_time_minus() > 10:     
-                    self.writer()
-                    self.writer("❌ 指点飞行状态更新超时，请检查连接是否正常")
+
+        # 应答与进度可能在网络线程和调度线程中先后完成 (例如两者同时超时, 或进度结束后迟到的应答), 只取第一个结果
+        finish_lock = threading.Lock()
+
+        def finish(ok) -> bool:
+            with finish_lock:
+                if done.done():
                     return False
-                time.sleep(0.1)
-
-    def publish_flyto_list_command(self, pos_list):
-        def publish_flyto_list_command_thread():
-            self.writer("="*50)
-            self.writer(f"无人机{self.gateway_sn}开始执行指点飞行列表...,共{len(pos_list)}个点")
-            for pos in pos_list:
-                latitude = pos[0]
-                longitude = pos[1]
-                height = pos[2]
-                result = self.publish_flyto_command(latitude, longitude, height)
-                self.update_flyto_id()
-                if not result:
-                    self.writer("指点飞行列表执行中断")
-                    return
-            self.writer(f"无人机{self.gateway_sn}指点飞行列表执行完毕,共{len(pos_list)}个点")
-        thread = threading.Thread(target=publish_flyto_list_command_thread)
-        thread.daemon = True
-        thread.start()
+                done.set_result(ok)
+                return True
+
+        def fail_from_reply():
+            # 应答已决定结果: 取消进度等待 (discard_flyto 取消其 Future), 之后的进度事件或超时不再生效
+            self.pending.discard_flyto(fly_to_id)
+            finish(False)
+
+        def on_reply(future: Future):
+            if done.done():
+                return
+            try:
+                result = future.result().get("result", -1)
+            except Exception as e:
+                self.writer(f"❌ 指点飞行指令发送超时，请检查连接是否正常 ({e})")
+                fail_from_reply()
+                return
+            self.writer("✔ 收到指点飞行指令回复")
+            if result != 0:
+                fail_from_reply()
+            else:
+                self.writer("正在飞往目标点...")
+
+        def on_progress(future: Future):
+            if future.cancelled() or done.done():
+                return
+            try:
+                status = future.result().get("status", None)
+            except Exception:
+                if finish(False):
+                    self.writer("❌ 指点飞行状态更新超时，请检查连接是否正常")
+                return
+            ok = status == "wayline_ok"
+            if finish(ok):
+                self.writer(f"指点飞行结束,执行结果: {flyto_dict[103 if ok else 102 if status == 'wayline_failed' else 101]} ")
+
+        reply.add_done_callback(on_reply)
+        progress.add_done_callback(on_progress)
+        return done
+
+    def publish_flyto_command(self, lat, lon, height):
+        """阻塞直到指点飞行结束, 返回是否成功; 不要在网络线程中调用"""
+        return self.fly_to_point(lat, lon, height).result()
+
+    def publish_flyto_list_command(self, pos_list) -> Future:
+        """依次飞往 pos_list 中的各点, 不占用线程: 每个点结束时在回调中发布下一个点;
+        返回的 Future 在全部完成 (True) 或中断 (False) 时完成"""
+        done = Future()
+        self.writer("="*50)
+        self.writer(f"无人机{self.gateway_sn}开始执行指点飞行列表...,共{len(pos_list)}个点")
+
+        def fly(index):
+            if index >= len(pos_list):
+                self.writer(f"无人机{self.gateway_sn}指点飞行列表执行完毕,共{len(pos_list)}个点")
+                done.set_result(True)
+                return
+            latitude, longitude, height = pos_list[index][0], pos_list[index][1], pos_list[index][2]
+            self.fly_to_point(latitude, longitude, height).add_done_callback(lambda future: next_point(future, index))
+
+        def next_point(future: Future, index):
+            if future.result():
+                fly(index + 1)
+            else:
+                self.writer("指点飞行列表执行中断")
+                done.set_result(False)
+
+        fly(0)
+        return done
+
+    def publish_flyto_mission(self, pos_list, chunk_size: int = FLYTO_MAX_POINTS, lead_time: float = MISSION_LEAD_TIME) -> Future:
+        """航线任务模式: 把 pos_list 打包成尽量少的 fly_to_point 请求, 当前段快结束时提前发送下一段;
+        返回的 Future 在全部完成 (True) 或中断 (False) 时完成"""
+        mission = FlyToMission(self, pos_list, chunk_size=chunk_size, lead_time=lead_time, writer=self.writer)
+        self.mission = mission
+        return mission.start()
 
     def publish_flyto_reset(self):
         self.flyto_reply_flag = 0
@@ -246,8 +224,8 @@ class Ser_puberlisher:
             "timestamp": int(time.time()*100),
             "method": "live_lens_change"
         }
-        payload = json.dumps(message)
-        self.client.publish(self.topic, payload)
+        payload = json_codec.dumps(message)
+        self.publisher.publish(self.topic, payload, BULK)
 
     def connect_to_remoter(self):
         self.publish_request_cloud_control_authorization()
@@ -1,15 +1,20 @@
 import os
-import json
 import time
 import threading
 import sys
-import paho
 import paho.mqtt.client as mqtt
 from CluodAPI_Terminal_Client.DRC_controler import DRC_controler
 from CluodAPI_Terminal_Client.fly_utils import FlightState, Time_counter
 from CluodAPI_Terminal_Client.services_publisher import Ser_puberlisher
 from CluodAPI_Terminal_Client.menu_control import MenuControl
+from CluodAPI_Terminal_Client.msg_dispatcher import MessageDispatcher
+from CluodAPI_Terminal_Client.fleet_connection import FleetConnection
+from CluodAPI_Terminal_Client.mqtt_transport import MQTTTransport, create_client, make_client_id
+from CluodAPI_Terminal_Client.osd_rate_policy import OSDRatePolicy, OSD_RATE_CONTROL
+from CluodAPI_Terminal_Client.osd_recorder import OSDRecorder, JsonLinesSink
+from CluodAPI_Terminal_Client.telemetry_log import TelemetryLogWriter
 from stream_predict import StreamPredictor
+from model_registry import MODEL_PREWARM
 from textual.widgets import RichLog
 
 host_addr = os.environ["HOST_ADDR"]
@@ -18,31 +23,55 @@ password = os.environ["PASSWORD"]
 
 gateway_sn = ["9N9CN2J0012CXY","9N9CN8400164WH","9N9CN180011TJN"]
 
+# 只需完成等待中请求的服务应答 (fly_to_point / return_home 另有处理函数)
+SERVICE_REPLY_METHODS = ("cloud_control_auth_request", "drc_mode_enter", "live_start_push", "live_stop_push", "live_set_quality")
+
+# OSD 记录格式: json (JSON 行) 或 osdc (列式二进制, 见 telemetry_log.py)
+OSD_SAVE_FORMAT = os.environ.get("OSD_SAVE_FORMAT", "json")
+
+# OSD_RATE_POLICY=0 时所有无人机固定 50 Hz OSD, 否则按需调整 (见 osd_rate_policy.py)
+OSD_RATE_POLICY = os.environ.get("OSD_RATE_POLICY", "1") == "1"
+
 class DJIMQTTClient:
-    def __init__(self, gateway_sn_code: int, is_deamon: bool = True, main_log: RichLog = None, per_log: RichLog = None):
+    def __init__(self, gateway_sn_code: int, is_deamon: bool = True, main_log: RichLog = None, per_log: RichLog = None,
+                 fleet: FleetConnection = None, sn: str = None):
         self.is_deamon = is_deamon
         self.gateway_sn_code = gateway_sn_code
-        self.gateway_sn = gateway_sn[gateway_sn_code]
+        self.gateway_sn = sn if sn is not None else gateway_sn[gateway_sn_code]
+        # 机群模式下共用 FleetConnection 的连接, 不再单独建立连接和网络线程
+        self.fleet = fleet
         self.DEBUG_FLAG = False
         self.flight_state = FlightState()
         self.last_time = 0
         self.now_time = 0
         self.SAVE_FLAG = False
-        self.save_name = f"out/osd_data_{self.gateway_sn_code}.json" # 保存文件名
-        # 用于文件写入的锁，确保并发回调时写文件安全
-        self.save_lock = threading.Lock()
-        self.setup_client()
+        self.save_name = f"out/osd_data_{self.gateway_sn_code}.{OSD_SAVE_FORMAT}" # 保存文件名
+        if self.fleet is None:
+            self.setup_client()
+        else:
+            self.client = self.fleet.client
         self.flyto_time_counter = Time_counter()
         self.main_log = main_log
         self.per_log = per_log
+        # 无 TUI (压测/回放) 时输出到 print
+        self.writer = self.per_log.write if self.per_log else print
+        self.main_writer = self.main_log.write if self.main_log else print
         self.per_log.write(f"UAV{self.gateway_sn_code + 1} 日志已连接") if self.per_log else None
+        self.recorder = OSDRecorder(self.save_name, sink_factory=TelemetryLogWriter if OSD_SAVE_FORMAT == "osdc" else JsonLinesSink,
+                                    writer=self.writer)
         self.rtmp_url = f"rtmp://81.70.222.38:1935/live/Drone00{self.gateway_sn_code + 1}"
-        self.drc_controler = DRC_controler(self.gateway_sn, self.client, self.flight_state, writer=self.per_log.write if self.per_log else print,
-                                           main_writer=self.main_log.write if self.main_log else print)
+        self.drc_controler = DRC_controler(self.gateway_sn, self.client, self.flight_state, writer=self.writer,
+                                           main_writer=self.main_writer)
         self.ser_puberlisher = Ser_puberlisher(self.gateway_sn, self.client, host_addr, 
-                                               self.flight_state, self.flyto_time_counter, self.gateway_sn_code, writer=self.per_log.write if self.per_log else print,
-                                               main_writer=self.main_log.write if self.main_log else print)
-        self.menu = MenuControl(writer=self.main_log.write if self.main_log else print)
+                                               self.flight_state, self.flyto_time_counter, self.gateway_sn_code, writer=self.writer,
+                                               main_writer=self.main_writer, preempt_sticks=self.drc_controler.preempt_sticks)
+        self.osd_policy = OSDRatePolicy(self.drc_controler, self.ser_puberlisher, writer=self.writer) if OSD_RATE_POLICY else None
+        self.drc_controler.osd_policy = self.osd_policy
+        self.ser_puberlisher.osd_policy = self.osd_policy
+        self.setup_dispatcher()
+        if self.fleet is not None:
+            self.fleet.add_route(self.gateway_sn, self.dispatcher.dispatch)
+        self.menu = MenuControl(writer=self.main_writer)
         # Register menu controls (pass callables, do not call them here)
         self.menu.add_control("x", self.ser_puberlisher.command_request_cloud_control_authorization, "请求授权云端控制消息")
         self.menu.add_control("j", self.ser_puberlisher.command_enter_live_flight_controls_mode, "进入指令飞行控制模式")
@@ -60,20 +89,30 @@ class DJIMQTTClient:
         self.menu.add_control("o", self.command_change_save_flag, "开始/结束信息保存")
         self.menu.add_control("m", self.drc_controler.command_change_beat_flag, "开启/关闭DRC心跳")
         self.menu.add_control("n", self.drc_controler.command_change_drc_print, "开启/关闭DRC消息打印")
+        self.menu.add_control("p", self.drc_controler.command_print_streams, "查看周期指令流频率、抖动与杆量通道统计")
+        self.menu.add_control("i", self.drc_controler.command_print_link_stats, "查看链路延迟与时钟偏差")
 
-        self.stream_predictor = StreamPredictor(self.rtmp_url, show_window=False, flight_state=self.flight_state, writer=self.per_log.write if self.per_log else print)
+        # 构造不加载模型, 打开直播检测后第一次推理时才加载 (MODEL_PREWARM=1 时后台预热)
+        self.stream_predictor = StreamPredictor(self.rtmp_url, show_window=False, flight_state=self.flight_state, writer=self.writer)
+        if MODEL_PREWARM:
+            self.stream_predictor.prewarm()
         # q - 退出程序: map to a callable that exits
 
     def setup_client(self):
         """设置MQTT客户端"""
-        self.client = mqtt.Client(paho.mqtt.enums.CallbackAPIVersion.VERSION2, transport="tcp")
+        self.client = create_client(make_client_id(self.gateway_sn))
         self.client.on_publish = self.on_publish
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.username_pw_set(f"{username}", password)
+        # MQTT_PROTOCOL=5 时启用 topic 别名与持久会话, 两种协议都按退避间隔自动重连
+        self.transport = MQTTTransport(self.client)
     
     def on_connect(self, client, userdata, flags, rc, properties=None):
-        self.main_log.write(f"UAV {self.gateway_sn_code + 1} connected with result code " + str(rc))
+        self.main_writer(f"UAV {self.gateway_sn_code + 1} connected with result code " + str(rc))
+        if self.transport.session_present:
+            # broker 保留了上次的订阅
+            return
         client.subscribe(f"thing/product/{self.gateway_sn}/drc/up")
         client.subscribe(f"thing/product/{self.gateway_sn}/events")
         client.subscribe(f"thing/product/{self.gateway_sn}/services_reply")
@@ -83,13 +122,24 @@ class DJIMQTTClient:
     def on_publish(self, client, userdata, mid, reason_code, properties):
         """v2.x 版本的发布成功回调 - 5个参数"""
 
+    def set_osd_demand(self, source, hz=None):
+        """登记/撤销 OSD 频率需求, 未启用 OSDRatePolicy 时忽略"""
+        if self.osd_policy is not None:
+            self.osd_policy.set_demand(source, hz)
+
     def command_change_debug_flag(self):
         self.DEBUG_FLAG = not self.DEBUG_FLAG
-        self.per_log.write("打印调试信息:", self.DEBUG_FLAG)   
+        self.writer("打印调试信息:", self.DEBUG_FLAG)   
     
     def command_change_save_flag(self):
+        if not self.SAVE_FLAG:
+            self.recorder.start()
         self.SAVE_FLAG = not self.SAVE_FLAG
-        self.per_log.write("保存信息:", self.SAVE_FLAG, f"保存位置: {self.save_name}") 
+        self.set_osd_demand("record", OSD_RATE_CONTROL if self.SAVE_FLAG else None)
+        self.writer("保存信息:", self.SAVE_FLAG, f"保存位置: {self.save_name}") 
+        if not self.SAVE_FLAG:
+            self.recorder.stop()
+            self.writer(f"OSD 记录统计: {self.recorder.get_stats_str()}")
 
     def command_view_live_stream(self):
         """打开/关闭直播画面检测线程 (切换逻辑)。
@@ -106,115 +156,126 @@ class DJIMQTTClient:
                 try:
                     self.stream_predictor.stop()
                     self.stream_predictor.join(timeout=2)
-                    self.per_log.write("🛑 已关闭直播检测线程")
+                    self.writer(self.stream_predictor.get_stats_str())
+                    self.set_osd_demand("geolocation", None)
+                    self.writer("🛑 已关闭直播检测线程")
                 except Exception as e:
-                    self.per_log.write(f"❌ 关闭直播检测线程失败: {e}")
+                    self.writer(f"❌ 关闭直播检测线程失败: {e}")
             else:
-                # 启动逻辑: 重新创建实例，避免 stop_event 已经被置位无法再次运行
+                # 启动逻辑: 重新创建实例，避免 stop_event 已经被置位无法再次运行; 模型保存在 ModelRegistry 中, 不会重新加载
                 try:
                     self.stream_predictor = StreamPredictor(
                         self.rtmp_url,
                         show_window=False,
                         flight_state=self.flight_state,
-                        writer=self.per_log.write if self.per_log else print
+                        writer=self.writer
                     )
                     self.stream_predictor.start_in_thread()
-                    self.per_log.write("✅ 启动直播检测线程成功")
+                    # 目标定位按视频帧时刻插值位姿, 需要完整频率的 OSD
+                    self.set_osd_demand("geolocation", OSD_RATE_CONTROL)
+                    self.writer("✅ 启动直播检测线程成功")
                 except Exception as e:
-                    self.per_log.write(f"❌ 启动直播检测线程失败: {e}")
+                    self.writer(f"❌ 启动直播检测线程失败: {e}")
         except Exception as e:
             # 最外层兜底
-            self.per_log.write(f"❌ 切换直播检测线程出现未处理异常: {e}")
+            self.writer(f"❌ 切换直播检测线程出现未处理异常: {e}")
+
+    def setup_dispatcher(self):
+        """构建 (topic, method) -> 处理函数 分发表, 只在初始化时构建一次"""
+        self.dispatcher = MessageDispatcher()
+        status_topic = f"sys/product/{self.gateway_sn}/status"
+        drc_up_topic = f"thing/product/{self.gateway_sn}/drc/up"
+        services_reply_topic = f"thing/product/{self.gateway_sn}/services_reply"
+        events_topic = f"thing/product/{self.gateway_sn}/events"
+        self.dispatcher.register(status_topic, "update_topo", self.handle_update_topo)
+        self.dispatcher.register(drc_up_topic, "osd_info_push", self.handle_osd_info_push)
+        self.dispatcher.register(drc_up_topic, "drc_drone_state_push", self.handle_drone_state_push)
+        self.dispatcher.register(drc_up_topic, "drc_batteries_info_push", self.handle_batteries_info_push)
+        self.dispatcher.register(drc_up_topic, "heart_beat", self.handle_heartbeat_reply)
+        self.dispatcher.register(services_reply_topic, "fly_to_point", self.handle_flyto_reply)
+        self.dispatcher.register(services_reply_topic, "return_home", self.handle_return_home_reply)
+        for method in SERVICE_REPLY_METHODS:
+            self.dispatcher.register(services_reply_topic, method, self.handle_service_reply)
+        self.dispatcher.register(events_topic, "fly_to_point_progress", self.handle_flyto_progress)
 
     def on_message(self, client: mqtt.Client, userdata, msg: mqtt.MQTTMessage):
-        message = json.loads(msg.payload.decode("utf-8"))
-        method = message.get("method", None)
-        if msg.topic == f"sys/product/{self.gateway_sn}/status":
-            if self.flight_state.device_sn is None:
-                if method == "update_topo":
-                    data = message.get("data", None)
-                    sub_devices = data.get("sub_devices", [])
-                    for device in sub_devices:
-                        device_sn = device.get("sn", "")
-                        self.flight_state.device_sn = device_sn
-                        line = f"📡 设备状态更新 - gateway_sn: {self.gateway_sn}, 设备SN: {device_sn}"
-                        if self.DEBUG_FLAG:
-                            self.per_log.write(line)
-        if msg.topic == f"thing/product/{self.gateway_sn}/drc/up":
-            if method == "osd_info_push":
-                self.now_time = time.time()
-                data = message.get("data", None)
-                self.flight_state.lon = data.get("longitude", None)
-                self.flight_state.lat = data.get("latitude", None)
-                self.flight_state.height = data.get("height", None)
-                self.flight_state.attitude_head = data.get("attitude_head", None)
-                self.flight_state.elevation = data.get("elevation", None)
-                line = f"🌍 OSD Info - gateway_sn: {self.gateway_sn}, Lat: {self.flight_state.lat}, Lon: {self.flight_state.lon} , height: {self.flight_state.height}, attitude_head: {self.flight_state.attitude_head}, elevation: {self.flight_state.elevation}"
+        self.dispatcher.dispatch(msg.topic, msg.payload)
+
+    def handle_update_topo(self, message):
+        if self.flight_state.device_sn is None:
+            data = message.get("data", None)
+            sub_devices = data.get("sub_devices", [])
+            for device in sub_devices:
+                device_sn = device.get("sn", "")
+                self.flight_state.device_sn = device_sn
                 if self.DEBUG_FLAG:
-                    self.per_log.write(line)
-                if self.SAVE_FLAG:
-                    message_with_timestamp = {
-                        "timestamp": time.time(),
-                        "data": data
-                    }
-                    # 将包含时间戳的消息以 JSON 行追加到文件
-                    try:
-                        with self.save_lock:
-                            with open(self.save_name, 'a', encoding='utf-8') as sf:
-                                sf.write(json.dumps(message_with_timestamp, ensure_ascii=False) + "\n")
-                    except Exception as e:
-                        # 不要抛出异常以免影响主线程，记录错误到 stderr
-                        self.per_log.write(f"❌ 保存 OSD 数据失败: {e}", file=sys.stderr)
-
-            elif method == "drc_drone_state_push":
-                data = message.get("data", None)
-                self.flight_state.mode_code = data.get("mode_code", None)
-
-            elif method == "drc_batteries_info_push":
-                data = message.get("data", None)
-                self.flight_state.battery_percentage = data.get("capacity_percent", None)
-                           
-        elif msg.topic == f"thing/product/{self.gateway_sn}/services_reply":
-            # pprint.pprint(message)
-            if method == "fly_to_point":
-                result = message.get("data", {}).get("result", -1)
-                if result == 0:
-                    self.ser_puberlisher.flyto_reply_flag = 1
-                    self.per_log.write("✅ 指点飞指令发送成功")
-                else:
-                    self.ser_puberlisher.flyto_reply_flag = 2
-                    self.per_log.write(f"❌ 指点飞行指令发送失败，错误码: {result}")
-            elif method == "return_home":
-                result = message.get("data", {}).get("result", -1)
-                if result == 0:
-                    self.per_log.write("✅ 一键返航指令发送成功")
-                else:
-                    self.per_log.write(f"❌ 一键返航指令发送失败，错误码: {result}") 
-
-        elif msg.topic == f"thing/product/{self.gateway_sn}/events":
-            if method == "fly_to_point_progress":
-                self.flyto_time_counter.update_last()
-                self.flyto_time_counter.update_now()
-                # print(self.flyto_time_counter.get_time_minus())
-                data = message.get("data", None)
-                status = data.get("status", None)
-                fly_to_id = data.get("fly_to_id", None)
-                if fly_to_id == self.ser_puberlisher.flyto_id:
-                    if status == "wayline_cancel":
-                        self.ser_puberlisher.flyto_state_code = 101
-                    if status == "wayline_failed":
-                        self.ser_puberlisher.flyto_state_code = 102
-                    if status == "wayline_ok":
-                        self.ser_puberlisher.flyto_state_code = 103
-                    if status == "wayline_progress":
-                        self.ser_puberlisher.flyto_state_code = 104
+                    self.writer(f"📡 设备状态更新 - gateway_sn: {self.gateway_sn}, 设备SN: {device_sn}")
+
+    def handle_osd_info_push(self, message):
+        self.now_time = time.time()
+        data = message.get("data", None)
+        self.flight_state.update_osd(data, self.now_time)
+        if self.DEBUG_FLAG:
+            snap = self.flight_state.snapshot()
+            self.writer(f"🌍 OSD Info - gateway_sn: {self.gateway_sn}, Lat: {snap.lat}, Lon: {snap.lon} , height: {snap.height}, attitude_head: {snap.attitude_head}, elevation: {snap.elevation}")
+        if self.SAVE_FLAG:
+            # 只入队, 文件写入由记录线程完成, 不阻塞网络线程
+            self.recorder.record(self.now_time, data)
+
+    def handle_heartbeat_reply(self, message):
+        self.drc_controler.link.on_heartbeat_reply(message, time.time())
+
+    def handle_drone_state_push(self, message):
+        data = message.get("data", None)
+        self.flight_state.update_mode(data.get("mode_code", None))
+
+    def handle_batteries_info_push(self, message):
+        data = message.get("data", None)
+        self.flight_state.update_battery(data.get("capacity_percent", None))
+
+    def handle_service_reply(self, message):
+        self.ser_puberlisher.pending.resolve_reply(message)
+
+    def handle_flyto_reply(self, message):
+        self.ser_puberlisher.pending.resolve_reply(message)
+        result = message.get("data", {}).get("result", -1)
+        if result == 0:
+            self.ser_puberlisher.flyto_reply_flag = 1
+            self.writer("✅ 指点飞指令发送成功")
+        else:
+            self.ser_puberlisher.flyto_reply_flag = 2
+            self.writer(f"❌ 指点飞行指令发送失败，错误码: {result}")
+
+    def handle_return_home_reply(self, message):
+        self.ser_puberlisher.pending.resolve_reply(message)
+        result = message.get("data", {}).get("result", -1)
+        if result == 0:
+            self.writer("✅ 一键返航指令发送成功")
+        else:
+            self.writer(f"❌ 一键返航指令发送失败，错误码: {result}")
+
+    def handle_flyto_progress(self, message):
+        self.flyto_time_counter.update_last()
+        self.flyto_time_counter.update_now()
+        data = message.get("data", None)
+        self.ser_puberlisher.pending.resolve_progress(data)
+        status = data.get("status", None)
+        fly_to_id = data.get("fly_to_id", None)
+        if fly_to_id == self.ser_puberlisher.flyto_id:
+            if status == "wayline_cancel":
+                self.ser_puberlisher.flyto_state_code = 101
+            if status == "wayline_failed":
+                self.ser_puberlisher.flyto_state_code = 102
+            if status == "wayline_ok":
+                self.ser_puberlisher.flyto_state_code = 103
+            if status == "wayline_progress":
+                self.ser_puberlisher.flyto_state_code = 104
      
     def run(self):
-        """运行客户端"""
-        def client_start():
-            self.client.connect(host_addr, 1883, 60)
-            self.client.loop_forever()
-        thread = threading.Thread(target=client_start)
+        """运行客户端, 机群模式下由 FleetConnection 统一运行"""
+        if self.fleet is not None:
+            return
+        thread = threading.Thread(target=self.transport.loop_forever, args=(host_addr, 1883, 60))
         thread.daemon = self.is_deamon
         thread.start()
 
@@ -0,0 +1,45 @@
+"""stick_control 消息预编码
+
+杆量消息结构固定, 只有 seq 和四个杆量会变。模板预先切成固定的字节片段,
+数字字段定宽、左侧用空格补齐 (JSON 允许数字前有空白), 编码时只把片段和数字拼接一次:
+- 杆量 0~2047 使用预先渲染好的 4 字节表 (整数和整数值的浮点都能直接查表)
+- 不构造 dict、不调用 json.dumps, 每条消息只分配最终的 bytes 和 seq 数字
+- 编码不依赖共享的可变缓冲区, 多线程同时为同一架或多架无人机编码都是安全的;
+  seq 的分配由 DRC_controler.next_seq 加锁完成
+"""
+
+SEQ_WIDTH = 10
+STICK_WIDTH = 4
+
+_STICK_DIGITS = {value: b"%4d" % value for value in range(2048)}
+
+_HEAD = b'{"seq":'
+_ROLL = b',"method":"stick_control","data":{"roll":'
+_PITCH = b',"pitch":'
+_THROTTLE = b',"throttle":'
+_YAW = b',"yaw":'
+_TAIL = b'}}'
+
+_join = b"".join
+
+
+def _stick_bytes(value):
+    value = int(value)
+    if 0 <= value < 2048:
+        return _STICK_DIGITS[value]
+    digits = b"%4d" % value
+    if value < 0 or len(digits) != STICK_WIDTH:
+        raise ValueError(f"杆量超出范围: {value}")
+    return digits
+
+
+def encode_stick_control(seq: int, roll, pitch, throttle, yaw) -> bytes:
+    """编码一条 stick_control, 与 json.dumps({"seq", "method", "data": {roll, pitch, throttle, yaw}}) 等价"""
+    table = _STICK_DIGITS
+    try:
+        return _join((_HEAD, b"%10d" % seq, _ROLL, table[roll], _PITCH, table[pitch],
+                      _THROTTLE, table[throttle], _YAW, table[yaw], _TAIL))
+    except (KeyError, TypeError):
+        # 非整数杆量或超出查表范围
+        return _join((_HEAD, b"%10d" % seq, _ROLL, _stick_bytes(roll), _PITCH, _stick_bytes(pitch),
+                      _THROTTLE, _stick_bytes(throttle), _YAW, _stick_bytes(yaw), _TAIL))
@@ -0,0 +1,106 @@
+"""杆量指令合并发送通道
+
+paho 的 publish 只是把报文放进发送队列, broker 或网络阻塞时 stick_control 会一直堆积,
+恢复后无人机会把几秒前的旧杆量依次执行一遍。StickLane 每架无人机一个:
+- 同一时刻最多一条杆量在途 (已交给 PriorityPublisher, 尚未写出), 在途期间到来的新杆量
+  只保留最新一条 (待发), 旧的待发杆量直接丢弃并计入"合并"; 在途杆量仍在发布队列的本地队列中时
+  直接原位替换为新杆量 (优先级更高时一并提升), 也计入"合并"
+- 在途消息写出时立即发出待发杆量; 待发杆量等待超过 expiry 秒时丢弃并计入"过期"
+- 在途消息超过 INFLIGHT_TIMEOUT 仍未写出时放弃等待
+- 普通杆量按 BULK 优先级发送, 降落/上锁杆量按 SAFETY 优先级发送; clear() 丢弃待发杆量, 并撤回仍在
+  发布队列中排队的在途杆量 (安全指令抢占时调用), 之后的 SAFETY 杆量不必排在 BULK 积压之后
+- 每条杆量带 MQTT5 MessageExpiryInterval, broker 不会把过期的杆量转发给无人机
+  (MQTT 3.1.1 连接下 paho 不发送属性, 该设置不生效)
+内存占用和控制延迟都有上界: 每架最多一条在途、一条待发。
+"""
+import threading
+import time
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from CluodAPI_Terminal_Client.publish_lanes import BULK, INFLIGHT_TIMEOUT, PriorityPublisher, get_priority_publisher
+
+STICK_EXPIRY = 1            # 杆量消息有效期 (秒, MQTT5 MessageExpiryInterval 为整数秒)
+
+
+def expiry_properties(seconds: int) -> Properties:
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.MessageExpiryInterval = seconds
+    return properties
+
+
+class StickLane:
+    def __init__(self, client, topic, expiry: int = STICK_EXPIRY, publisher: PriorityPublisher = None):
+        self.topic = topic
+        self.expiry = expiry
+        self.properties = expiry_properties(expiry)
+        self.publisher = publisher or get_priority_publisher(client)
+        self.lock = threading.Lock()
+        self.inflight = None        # 在途消息交给发布队列的时间
+        self.item = None            # 在途消息的 PublishItem
+        self.pending = None         # (payload, 提交时间, 优先级)
+        # 统计
+        self.submitted = 0
+        self.published = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.preempted = 0
+
+    def submit(self, payload: bytes, priority: int = BULK):
+        """提交一条杆量, 能立即发送则发送, 否则替换待发杆量"""
+        now = time.perf_counter()
+        with self.lock:
+            self.submitted += 1
+            if self.inflight is not None and now - self.inflight > INFLIGHT_TIMEOUT:
+                self.inflight = None
+                self.item = None
+                self.expired += 1
+            if self.inflight is not None:
+                if self.item is not None and self.publisher.requeue(self.item, payload, priority):
+                    # 在途杆量还没交给 paho, 直接换成最新杆量
+                    self.coalesced += 1
+                    return
+                if self.pending is not None:
+                    self.coalesced += 1
+                self.pending = (payload, now, priority)
+                return
+            self.inflight = now
+            self.published += 1
+        self._publish(payload, priority, now)
+
+    def _publish(self, payload, priority, inflight):
+        item = self.publisher.publish(self.topic, payload, priority, properties=self.properties, on_sent=self._on_sent)
+        with self.lock:
+            # 写出可能先于这里返回, 此时在途的已是下一条
+            if self.inflight == inflight:
+                self.item = item
+
+    def clear(self):
+        """丢弃待发杆量, 撤回仍在发布队列中排队的在途杆量"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending = None
+                self.preempted += 1
+            if self.item is not None and self.publisher.withdraw(self.item):
+                self.inflight = None
+                self.item = None
+                self.preempted += 1
+
+    def _on_sent(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.inflight = None
+            self.item = None
+            if self.pending is None:
+                return
+            payload, submitted, priority = self.pending
+            self.pending = None
+            if now - submitted > self.expiry:
+                self.expired += 1
+                return
+            self.inflight = now
+            self.published += 1
+        self._publish(payload, priority, now)
+
+    def get_stats_str(self):
+        return (f"杆量通道: 提交 {self.submitted}, 发出 {self.published}, 合并 {self.coalesced}, 过期 {self.expired}, "
+                f"被抢占 {self.preempted}, 在途 {int(self.inflight is not None)}, 待发 {int(self.pending is not None)}")
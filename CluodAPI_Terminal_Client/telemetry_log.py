@@ -0,0 +1,287 @@
+"""列式二进制 OSD 遥测日志 (.osdc)
+
+JSON 行格式每行都重复全部键名, 一次短途飞行单机就有 1MB 以上。
+这里使用固定 schema, 每个 OSD 字段一个定长类型列:
+
+文件格式 (小端):
+    文件头: magic "DJIOSDC1" | u32 版本 | u32 列数 | 每列 24 字节列名 + 4 字节 dtype (如 "<f8")
+    数据块: magic "BLK1" | u32 行数 | 按列依次存放该块所有行的数据 (按元素宽度从大到小排列, 保证对齐) | 补齐到 8 字节
+写入端只依赖标准库 array, 可直接作为 OSDRecorder 的 sink; 读取端用 mmap + numpy.frombuffer 直接暴露列数组, 不做任何解析。
+
+命令行:
+    python -m CluodAPI_Terminal_Client.telemetry_log convert out/osd_data_*.json
+    python -m CluodAPI_Terminal_Client.telemetry_log info out/osd_data_0.osdc
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+import numpy as np
+
+MAGIC = b"DJIOSDC1"
+VERSION = 1
+BLOCK_MAGIC = b"BLK1"
+SUFFIX = ".osdc"
+
+# (列名, dtype), 列名与 osd_info_push 的 data 字段一致, timestamp 为本地接收时间
+OSD_SCHEMA = [
+    ("timestamp", "<f8"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("height", "<f4"),
+    ("elevation", "<f4"),
+    ("attitude_head", "<f4"),
+    ("home_distance", "<f4"),
+    ("horizontal_speed", "<f4"),
+    ("vertical_speed", "<f4"),
+    ("speed_x", "<f4"),
+    ("speed_y", "<f4"),
+    ("speed_z", "<f4"),
+    ("ultrasonic_height", "<f4"),
+    ("wind_speed", "<f4"),
+    ("wind_direction", "<i2"),
+]
+
+_TYPECODES = {"<f8": "d", "<f4": "f", "<i2": "h"}
+_MISSING = {"d": float("nan"), "f": float("nan"), "h": -1}
+_FILE_HEADER = struct.Struct("<8sII")
+_COLUMN_DESC = struct.Struct("<24s4s")
+_BLOCK_HEADER = struct.Struct("<4sI")
+
+
+def _itemsize(dtype):
+    return int(dtype[2:])
+
+
+def _block_layout(schema):
+    """块内列的存放顺序: 元素宽度大的在前, 每列起始位置都按自身宽度对齐"""
+    return sorted(schema, key=lambda col: -_itemsize(col[1]))
+
+
+def _pad8(n):
+    return (8 - n % 8) % 8
+
+
+def _encode_header(schema):
+    header = _FILE_HEADER.pack(MAGIC, VERSION, len(schema))
+    for name, dtype in schema:
+        if len(name) > 24:
+            raise ValueError(f"列名过长: {name}")
+        header += _COLUMN_DESC.pack(name.encode("ascii"), dtype.encode("ascii"))
+    return header + b"\0" * _pad8(len(header))
+
+
+def _decode_header(buf):
+    magic, version, ncols = _FILE_HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("不是 OSD 列式日志文件")
+    if version != VERSION:
+        raise ValueError(f"不支持的日志版本: {version}")
+    schema = []
+    offset = _FILE_HEADER.size
+    for _ in range(ncols):
+        name, dtype = _COLUMN_DESC.unpack_from(buf, offset)
+        schema.append((name.rstrip(b"\0").decode("ascii"), dtype.rstrip(b"\0").decode("ascii")))
+        offset += _COLUMN_DESC.size
+    return schema, offset + _pad8(offset)
+
+
+class TelemetryLogWriter:
+    """按块追加写入, 接口与 osd_recorder.JsonLinesSink 相同, 可直接作为 OSDRecorder 的 sink_factory"""
+    def __init__(self, path, schema=OSD_SCHEMA, block_rows: int = 4096):
+        self.path = path
+        self.schema = list(schema)
+        self.layout = _block_layout(self.schema)
+        self.block_rows = block_rows
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+        header = _encode_header(self.schema)
+        if self.size == 0:
+            self.file.write(header)
+            self.size = len(header)
+        else:
+            with open(path, "rb") as f:
+                if f.read(len(header)) != header:
+                    self.file.close()
+                    raise ValueError(f"{path} 的 schema 与当前写入器不一致, 无法追加")
+        self.columns = {name: array(_TYPECODES[dtype]) for name, dtype in self.schema}
+        self.rows = 0
+
+    def append(self, timestamp, data):
+        """追加一行, data 为 osd_info_push 的 data 字典, 缺失字段记为 NaN / -1"""
+        for name, column in self.columns.items():
+            value = timestamp if name == "timestamp" else data.get(name, None)
+            if value is None:
+                value = _MISSING[column.typecode]
+            elif column.typecode == "h":
+                value = int(value)
+            column.append(value)
+        self.rows += 1
+        if self.rows >= self.block_rows:
+            self._write_block()
+
+    def write_batch(self, records):
+        for timestamp, data in records:
+            self.append(timestamp, data)
+
+    def _write_block(self):
+        if self.rows == 0:
+            return
+        parts = [_BLOCK_HEADER.pack(BLOCK_MAGIC, self.rows)]
+        length = _BLOCK_HEADER.size
+        for name, _ in self.layout:
+            column = self.columns[name]
+            if sys.byteorder == "big":
+                column.byteswap()
+            chunk = column.tobytes()
+            parts.append(chunk)
+            length += len(chunk)
+        parts.append(b"\0" * _pad8(length))
+        block = b"".join(parts)
+        self.file.write(block)
+        self.size += len(block)
+        for column in self.columns.values():
+            del column[:]
+        self.rows = 0
+
+    def flush(self):
+        """把未满的块也写出, 保证与 JSON 行格式相同的落盘粒度"""
+        self._write_block()
+        self.file.flush()
+
+    def close(self):
+        self._write_block()
+        self.file.close()
+
+
+class TelemetryLogReader:
+    """mmap 方式读取 .osdc 文件, 列数据直接以 numpy 数组返回。
+
+    单块文件(例如 convert 生成的文件) 返回的是 mmap 上的零拷贝只读视图;
+    多块文件(记录器按 flush 间隔写入) 在首次访问时按列拼接一次并缓存。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.schema, offset = _decode_header(self.mm)
+        self.layout = _block_layout(self.schema)
+        self.dtypes = dict(self.schema)
+        self.blocks = []    # [(行数, {列名: 偏移})]
+        self._cache = {}
+        size = len(self.mm)
+        while offset + _BLOCK_HEADER.size <= size:
+            magic, rows = _BLOCK_HEADER.unpack_from(self.mm, offset)
+            if magic != BLOCK_MAGIC:
+                break
+            column_offset = offset + _BLOCK_HEADER.size
+            offsets = {}
+            for name, dtype in self.layout:
+                offsets[name] = column_offset
+                column_offset += rows * _itemsize(dtype)
+            if column_offset > size:
+                # 记录中断导致的残缺块
+                break
+            self.blocks.append((rows, offsets))
+            offset = column_offset + _pad8(column_offset - offset)
+        self.rows = sum(rows for rows, _ in self.blocks)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def names(self):
+        return [name for name, _ in self.schema]
+
+    def block_column(self, index, name):
+        """第 index 个块中某列的零拷贝视图"""
+        rows, offsets = self.blocks[index]
+        return np.frombuffer(self.mm, dtype=self.dtypes[name], count=rows, offset=offsets[name])
+
+    def column(self, name):
+        if name in self._cache:
+            return self._cache[name]
+        if len(self.blocks) == 1:
+            result = self.block_column(0, name)
+        elif not self.blocks:
+            result = np.empty(0, dtype=self.dtypes[name])
+        else:
+            result = np.concatenate([self.block_column(i, name) for i in range(len(self.blocks))])
+        self._cache[name] = result
+        return result
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def close(self):
+        self._cache.clear()
+        try:
+            self.mm.close()
+        except BufferError:
+            # 仍有外部持有的视图, 交给 GC 释放
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def convert_jsonl(src, dst=None):
+    """把 out/osd_data_N.json 转换为同名 .osdc 文件 (单块), 返回输出路径与行数"""
+    if dst is None:
+        dst = os.path.splitext(src)[0] + SUFFIX
+    if os.path.exists(dst):
+        os.remove(dst)
+    rows = 0
+    writer = TelemetryLogWriter(dst, block_rows=1 << 31)
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                writer.append(record.get("timestamp", None), record.get("data", {}))
+                rows += 1
+    finally:
+        writer.close()
+    return dst, rows
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="OSD 列式二进制日志工具")
+    sub = p.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="将 JSON 行 OSD 记录转换为 .osdc")
+    p_convert.add_argument("files", nargs="+", help="输入文件 (支持 glob)")
+    p_info = sub.add_parser("info", help="查看 .osdc 文件信息")
+    p_info.add_argument("files", nargs="+", help="输入文件 (支持 glob)")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = []
+    for pattern in args.files:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    for path in paths:
+        if args.command == "convert":
+            dst, rows = convert_jsonl(path)
+            src_size = os.path.getsize(path)
+            dst_size = os.path.getsize(dst)
+            print(f"{path} -> {dst}: {rows} 行, {src_size} -> {dst_size} 字节 ({dst_size / max(1, src_size):.1%})")
+        else:
+            with TelemetryLogReader(path) as reader:
+                ts = reader["timestamp"]
+                duration = float(ts[-1] - ts[0]) if len(reader) else 0.0
+                print(f"{path}: {len(reader)} 行, {len(reader.blocks)} 块, 时长 {duration:.1f} 秒, 列: {', '.join(reader.names)}")
+
+
+if __name__ == "__main__":
+    main()
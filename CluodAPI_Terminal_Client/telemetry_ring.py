@@ -0,0 +1,86 @@
+"""单机近期 OSD 环形缓冲区
+
+固定容量的 numpy 数组, 每条 OSD 同时写入下标 i 和 i + capacity (镜像双倍长度),
+因此最近任意不超过 capacity - 1 条的样本在内存中总是连续的:
+- window(seconds) 直接返回数组切片 (视图), 不拷贝
+- at(timestamp) 按时间线性插值出位置/高度/航向, 航向按 ±180° 回绕插值
+写入只做标量赋值, 不为每条样本分配对象。单写多读: 网络线程写, 推理/界面线程读。
+读取方最多看到 capacity - 1 条: 下一条写入的槽位不在任何视图内, 读取期间写入一条不会打乱视图的时间顺序。
+视图指向活动缓冲区, 需要长期保留时请自行 copy()。
+"""
+from collections import namedtuple
+import numpy as np
+
+RING_FIELDS = ("lat", "lon", "elevation", "attitude_head")
+
+PoseSample = namedtuple("PoseSample", ("ts",) + RING_FIELDS)
+
+
+class TelemetryRing:
+    def __init__(self, capacity: int = 1024):
+        """capacity: 缓冲区槽位数, 可读的最近样本为 capacity - 1 条, 50Hz 下 1024 条约 20 秒"""
+        self.capacity = capacity
+        self.ts = np.zeros(2 * capacity, dtype=np.float64)
+        self.data = np.zeros((len(RING_FIELDS), 2 * capacity), dtype=np.float64)
+        self.count = 0  # 累计写入条数, 写完数据后再递增, 读取方据此确定有效范围
+
+    def push(self, ts, lat, lon, elevation, attitude_head):
+        i = self.count % self.capacity
+        j = i + self.capacity
+        ts_arr = self.ts
+        data = self.data
+        ts_arr[i] = ts_arr[j] = ts
+        data[0, i] = data[0, j] = lat
+        data[1, i] = data[1, j] = lon
+        data[2, i] = data[2, j] = elevation
+        data[3, i] = data[3, j] = attitude_head
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity - 1)
+
+    def _span(self, n=None):
+        """最近 n 条样本在镜像数组中的 [start, end); 不含下一条写入的槽位"""
+        count = self.count
+        size = min(count, self.capacity - 1)
+        if n is not None:
+            size = min(size, n)
+        end = (count - 1) % self.capacity + 1 + self.capacity if count else 0
+        return end - size, end
+
+    def latest(self, n=None):
+        """最近 n 条 (默认全部) 样本: (ts 视图, data 视图), data 形状为 (字段数, n)"""
+        start, end = self._span(n)
+        return self.ts[start:end], self.data[:, start:end]
+
+    def window(self, seconds: float):
+        """最近 seconds 秒内的样本: (ts 视图, data 视图)"""
+        ts, data = self.latest()
+        if len(ts) == 0:
+            return ts, data
+        first = int(np.searchsorted(ts, ts[-1] - seconds, side="left"))
+        return ts[first:], data[:, first:]
+
+    def column(self, name: str, seconds: float = None):
+        ts, data = self.latest() if seconds is None else self.window(seconds)
+        return data[RING_FIELDS.index(name)]
+
+    def at(self, timestamp: float):
+        """timestamp 时刻的插值位姿, 超出范围时取最早/最新样本, 没有样本时返回 None"""
+        ts, data = self.latest()
+        n = len(ts)
+        if n == 0:
+            return None
+        k = int(np.searchsorted(ts, timestamp, side="right"))
+        if k == 0:
+            return PoseSample(float(ts[0]), *data[:, 0].tolist())
+        if k >= n:
+            return PoseSample(float(ts[-1]), *data[:, -1].tolist())
+        t0 = float(ts[k - 1])
+        t1 = float(ts[k])
+        r = (timestamp - t0) / (t1 - t0) if t1 > t0 else 0.0
+        lat0, lon0, ele0, head0 = data[:, k - 1].tolist()
+        lat1, lon1, ele1, head1 = data[:, k].tolist()
+        d_head = (head1 - head0 + 180.0) % 360.0 - 180.0
+        head = (head0 + d_head * r + 180.0) % 360.0 - 180.0
+        return PoseSample(timestamp, lat0 + (lat1 - lat0) * r, lon0 + (lon1 - lon0) * r, ele0 + (ele1 - ele0) * r, head)
@@ -4,6 +4,12 @@ from textual.containers import HorizontalGroup, VerticalGroup
 from textual.reactive import reactive
 from multi_client_mqtt import MAIN_CONTROL_Client
 from textual import events
+import argparse
+import glob
+from CluodAPI_Terminal_Client.single_client_mqtt import gateway_sn
+from CluodAPI_Terminal_Client.loopback_broker import LoopbackBroker, LoopbackClient
+from CluodAPI_Terminal_Client.osd_replay import OSDReplayer, assign_sources
+from CluodAPI_Terminal_Client.osd_rate_policy import OSD_RATE_VIEW
 
 def get_control_menu_str() -> str:
     menu_str = (
@@ -55,13 +61,22 @@ class UAV_tabs(VerticalGroup):
         """Update UAV info periodically."""
         for i in range(3):
             uav_shower = self.query_one(f"#UAV{i + 1}", UAV_shower)
-            uav_info = self.app.multi_client.clients[i].flight_state.get_uav_info_str()
+            client = self.app.multi_client.clients[i]
+            uav_info = client.flight_state.get_uav_info_str() + "\n" + client.drc_controler.link.get_summary_str()
             uav_shower.UAV_info = uav_info
 
     def on_mount(self) -> None:
         """Event handler called when widget is added to the app."""
         self.update_timer = self.set_interval(1 / 10, self.update_info)
 
+    def on_tabbed_content_tab_activated(self, event: TabbedContent.TabActivated) -> None:
+        """只有可见标签页的无人机按界面刷新频率接收 OSD"""
+        multi_client = getattr(self.app, "multi_client", None)
+        if multi_client is None:
+            return
+        for i, client in enumerate(multi_client.clients[:3]):
+            client.set_osd_demand("view", OSD_RATE_VIEW if event.pane.id == f"uav{i + 1}" else None)
+
 class Control_Log(RichLog):
     """A control log widget."""
     is_control : bool = False
@@ -169,6 +184,9 @@ class UAV_TUI_App(App):
     BINDINGS = [("t", "toggle_dark", "Toggle dark mode")]
 
     multi_client : MAIN_CONTROL_Client
+    # 非空时不连接真实 broker, 而是回放这些 OSD 记录驱动界面
+    replay_files : list = None
+    replay_speed : float = 1.0
 
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
@@ -182,8 +200,21 @@ class UAV_TUI_App(App):
         command_log = self.query_one("#command_log ", RichLog)
         for i in range(3):
             sub_log_list.append(self.query_one(f"#UAV{i + 1}  #uav_log", RichLog))
-        self.multi_client = MAIN_CONTROL_Client(3, is_deamon=True, main_log=command_log, sub_log_list=sub_log_list)
-        self.multi_client.run()
+        if self.replay_files:
+            broker = LoopbackBroker()
+            self.multi_client = MAIN_CONTROL_Client(3, is_deamon=True, main_log=command_log, sub_log_list=sub_log_list,
+                                                    fleet_mode=True, fleet_client=LoopbackClient(broker, "fleet"))
+            self.multi_client.run()
+            sources = {sn: path for code, sn, path in assign_sources(self.replay_files, gateway_sn) if code < 3}
+            self.replayer = OSDReplayer(sources, speed=self.replay_speed, writer=command_log.write)
+            self.replayer.start_in_thread(LoopbackClient(broker, "replay").publish)
+            command_log.write(f"回放 {len(sources)} 个 OSD 记录, {self.replay_speed} 倍速")
+        else:
+            self.multi_client = MAIN_CONTROL_Client(3, is_deamon=True, main_log=command_log, sub_log_list=sub_log_list)
+            self.multi_client.run()
+        active = self.query_one(TabbedContent).active
+        for i, client in enumerate(self.multi_client.clients[:3]):
+            client.set_osd_demand("view", OSD_RATE_VIEW if active == f"uav{i + 1}" else None)
         self.query_one(Menu_widget).active_menu = self.multi_client.menu_now.get_menu_str()
         self.query_one(Input).focus()
 
@@ -194,6 +225,13 @@ class UAV_TUI_App(App):
         )
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="无人机控制终端")
+    parser.add_argument("--replay", nargs="+", default=None, help="回放 OSD 记录文件驱动界面 (支持 glob), 不连接真实 broker")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速, 0 表示尽可能快")
+    args = parser.parse_args()
     app = UAV_TUI_App()
+    if args.replay:
+        app.replay_files = [path for pattern in args.replay for path in sorted(glob.glob(pattern))]
+        app.replay_speed = args.speed
     app.run()
     # print("程序已退出")
\ No newline at end of file
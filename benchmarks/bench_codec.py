@@ -0,0 +1,85 @@
+"""JSON 编解码后端性能测试
+
+对每个可用后端测量:
+- 解码: 回放 out/osd_data_*.json 还原出的 osd_info_push payload (bytes)
+- 编码: stick_control / heart_beat / fly_to_point 下行消息
+并按机群遥测速率 (无人机数 x OSD 频率) 估算单核 CPU 占用。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_codec
+    python -m benchmarks.bench_codec --uav 100 --osd-freq 50
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.fly_utils import generate_uuid
+
+OUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "CluodAPI_Terminal_Client", "out")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="JSON 编解码后端性能测试")
+    p.add_argument("--files", default=os.path.join(OUT_DIR, "osd_data_*.json"), help="回放的 OSD 记录文件 (glob)")
+    p.add_argument("--repeat", type=int, default=5, help="重复次数")
+    p.add_argument("--uav", type=int, default=30, help="估算用的无人机数量")
+    p.add_argument("--osd-freq", type=int, default=50, help="估算用的 OSD 频率 (Hz)")
+    return p.parse_args(argv)
+
+
+def load_payloads(pattern):
+    payloads = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            for seq, line in enumerate(f):
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    message = {"data": record["data"], "method": "osd_info_push", "seq": seq, "timestamp": int(record["timestamp"] * 1000)}
+                    payloads.append(json.dumps(message).encode("utf-8"))
+    return payloads
+
+
+def outbound_messages():
+    stick = {"seq": 123456, "method": "stick_control", "data": {"roll": 1024, "pitch": 1324, "throttle": 1024, "yaw": 1024}}
+    heartbeat = {"data": {"timestamp": int(time.time() * 100)}, "method": "heart_beat", "seq": 123457}
+    flyto = {
+        "bid": generate_uuid(),
+        "data": {"fly_to_id": generate_uuid(), "max_speed": 12, "points": [{"height": 80, "latitude": 39.0427514, "longitude": 117.7238255}]},
+        "tid": generate_uuid(),
+        "timestamp": int(time.time() * 1000),
+        "method": "fly_to_point",
+    }
+    return [("stick_control", stick), ("heart_beat", heartbeat), ("fly_to_point", flyto)]
+
+
+def per_call_us(func, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) * 1e6 / (len(items) * repeat)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    payloads = load_payloads(args.files)
+    if not payloads:
+        print(f"未找到 OSD 记录: {args.files}")
+        return
+    rate = args.uav * args.osd_freq
+    print(f"OSD payload {len(payloads)} 条, 平均 {sum(len(p) for p in payloads) / len(payloads):.0f} 字节; 机群速率 {args.uav} x {args.osd_freq}Hz = {rate} msg/s")
+    for name in json_codec.available_backends():
+        json_codec.use_backend(name)
+        decode_us = per_call_us(json_codec.loads, payloads, args.repeat)
+        print(f"[{name}] decode osd_info_push  {decode_us:6.2f} us/msg  -> {decode_us * rate / 1e4:5.1f}% 单核")
+        for method, message in outbound_messages():
+            encode_us = per_call_us(json_codec.dumps, [message] * 1000, args.repeat)
+            print(f"[{name}] encode {method:<16}{encode_us:6.2f} us/msg")
+    json_codec.use_backend(json_codec.available_backends()[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""视频解码后端测试: OpenCV VideoCapture vs ffmpeg 管道 + 预分配帧缓冲
+
+在本地视频文件上尽快解码 --frames 帧 (不按原帧率), 消费者始终持有最近 --hold 帧 (模拟 LatestFrameSlot 与推理批次),
+比较:
+- opencv: cv2.VideoCapture, 每次 read() 新分配数组
+- ffmpeg: FFmpegCapture 原尺寸, readinto 读入 FramePool
+- ffmpeg 缩放: 指定 --scale 时在解码端缩放到该尺寸
+统计解码帧率、每帧 read() 耗时、本进程与 ffmpeg 子进程的 CPU 时间, ffmpeg 后端另给出帧缓冲池复用情况
+(opencv 每帧新分配一个数组)。需要 cv2 与 ffmpeg/ffprobe。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_decode --video out/output.mp4
+    python -m benchmarks.bench_decode --video out/output.mp4 --frames 1000 --scale 1280x720
+"""
+import argparse
+import resource
+import time
+from collections import deque
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+from video_capture import FFmpegCapture, parse_size
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="视频解码后端测试")
+    p.add_argument("--video", type=str, required=True, help="本地视频文件")
+    p.add_argument("--frames", type=int, default=500, help="每种后端解码的帧数")
+    p.add_argument("--scale", type=str, default=None, help="ffmpeg 解码端缩放, 如 1280x720")
+    p.add_argument("--hold", type=int, default=2, help="消费者持有的最近帧数")
+    return p.parse_args(argv)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(name, args, open_capture):
+    cpu0 = time.process_time(); child0 = children_cpu()
+    cap = open_capture()
+    if not cap.isOpened():
+        print(f"{name}: 无法打开 {args.video}")
+        return
+    read_time = RollingStats(args.frames)
+    held = deque(maxlen=args.hold)
+    frames = 0
+    shape = None
+    t0 = time.perf_counter()
+    while frames < args.frames:
+        t = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        read_time.add(time.perf_counter() - t)
+        held.append(frame)
+        shape = frame.shape
+        frames += 1
+    elapsed = time.perf_counter() - t0
+    held.clear()
+    extra = cap.get_stats_str() if hasattr(cap, "get_stats_str") else None
+    cap.release()
+    cpu = time.process_time() - cpu0
+    child = children_cpu() - child0
+    if not frames:
+        print(f"{name}: 没有读到帧")
+        return
+    print(f"{name}: {frames} 帧 {shape[1]}x{shape[0]}, {frames / elapsed:.1f} 帧/秒, {read_time.format_ms('read()')}")
+    print(f"  CPU: 本进程 {cpu / frames * 1000:.2f} ms/帧, 子进程 {child / frames * 1000:.2f} ms/帧")
+    if extra:
+        print(f"  {extra}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"{args.video}: 每种后端 {args.frames} 帧, 消费者持有最近 {args.hold} 帧")
+
+    def opencv():
+        import cv2
+        return cv2.VideoCapture(args.video)
+
+    measure("opencv", args, opencv)
+    measure("ffmpeg", args, lambda: FFmpegCapture(args.video))
+    size = parse_size(args.scale)
+    if size is not None:
+        measure(f"ffmpeg 缩放 {size[0]}x{size[1]}", args, lambda: FFmpegCapture(args.video, size=size))
+
+
+if __name__ == "__main__":
+    main()
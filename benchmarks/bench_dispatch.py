@@ -0,0 +1,132 @@
+"""on_message 分发性能测试
+
+回放 CluodAPI_Terminal_Client/out/osd_data_*.json 中记录的 OSD 数据,
+分别用原有的 if/elif 链式比较与 MessageDispatcher 分发表处理, 输出 messages/sec。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_dispatch
+    python -m benchmarks.bench_dispatch --repeat 20 --unhandled-ratio 0.5
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from CluodAPI_Terminal_Client.fly_utils import FlightState
+from CluodAPI_Terminal_Client.msg_dispatcher import MessageDispatcher
+
+OUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "CluodAPI_Terminal_Client", "out")
+GATEWAY_SN = "9N9CN2J0012CXY"
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="on_message 分发性能测试")
+    p.add_argument("--files", default=os.path.join(OUT_DIR, "osd_data_*.json"), help="回放的 OSD 记录文件 (glob)")
+    p.add_argument("--repeat", type=int, default=10, help="重复回放次数")
+    p.add_argument("--unhandled-ratio", type=float, default=0.0, help="每条 OSD 混入无人处理消息(drc_camera_osd_info_push)的比例, 0~1")
+    return p.parse_args(argv)
+
+
+def load_messages(pattern, unhandled_ratio):
+    """将记录的 OSD 行还原成 drc/up 上的原始 payload"""
+    topic = f"thing/product/{GATEWAY_SN}/drc/up"
+    messages = []
+    seq = 0
+    acc = 0.0
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                payload = {"data": record["data"], "method": "osd_info_push", "seq": seq, "timestamp": int(record["timestamp"] * 1000)}
+                messages.append((topic, json.dumps(payload).encode("utf-8")))
+                seq += 1
+                acc += unhandled_ratio
+                if acc >= 1.0:
+                    acc -= 1.0
+                    other = {"data": {"gimbal_pitch": -90.0, "zoom_factor": 2.0}, "method": "drc_camera_osd_info_push", "seq": seq}
+                    messages.append((topic, json.dumps(other).encode("utf-8")))
+    return messages
+
+
+def legacy_on_message(state, topic, payload):
+    """原 DJIMQTTClient.on_message 的分支结构(保留每条 OSD 都会构造的日志字符串, 去除保存)"""
+    message = json.loads(payload.decode("utf-8"))
+    method = message.get("method", None)
+    if topic == f"sys/product/{GATEWAY_SN}/status":
+        pass
+    if topic == f"thing/product/{GATEWAY_SN}/drc/up":
+        if method == "osd_info_push":
+            data = message.get("data", None)
+            state.lon = data.get("longitude", None)
+            state.lat = data.get("latitude", None)
+            state.height = data.get("height", None)
+            state.attitude_head = data.get("attitude_head", None)
+            state.elevation = data.get("elevation", None)
+            line = f"🌍 OSD Info - gateway_sn: {GATEWAY_SN}, Lat: {state.lat}, Lon: {state.lon} , height: {state.height}, attitude_head: {state.attitude_head}, elevation: {state.elevation}"
+        elif method == "drc_drone_state_push":
+            state.mode_code = message.get("data", None).get("mode_code", None)
+        elif method == "drc_batteries_info_push":
+            state.battery_percentage = message.get("data", None).get("capacity_percent", None)
+    elif topic == f"thing/product/{GATEWAY_SN}/services_reply":
+        pass
+    elif topic == f"thing/product/{GATEWAY_SN}/events":
+        pass
+
+
+def build_dispatcher(state):
+    """与 DJIMQTTClient.setup_dispatcher 相同的注册方式"""
+    def handle_osd_info_push(message):
+        data = message.get("data", None)
+        state.lon = data.get("longitude", None)
+        state.lat = data.get("latitude", None)
+        state.height = data.get("height", None)
+        state.attitude_head = data.get("attitude_head", None)
+        state.elevation = data.get("elevation", None)
+
+    def handle_drone_state_push(message):
+        state.mode_code = message.get("data", None).get("mode_code", None)
+
+    def handle_batteries_info_push(message):
+        state.battery_percentage = message.get("data", None).get("capacity_percent", None)
+
+    dispatcher = MessageDispatcher()
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/drc/up", "osd_info_push", handle_osd_info_push)
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/drc/up", "drc_drone_state_push", handle_drone_state_push)
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/drc/up", "drc_batteries_info_push", handle_batteries_info_push)
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/services_reply", "fly_to_point", lambda message: None)
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/services_reply", "return_home", lambda message: None)
+    dispatcher.register(f"thing/product/{GATEWAY_SN}/events", "fly_to_point_progress", lambda message: None)
+    dispatcher.register(f"sys/product/{GATEWAY_SN}/status", "update_topo", lambda message: None)
+    return dispatcher
+
+
+def measure(name, func, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for topic, payload in messages:
+            func(topic, payload)
+    elapsed = time.perf_counter() - start
+    rate = len(messages) * repeat / elapsed
+    print(f"{name:<12} {rate:>12.0f} msg/s  ({elapsed * 1e6 / (len(messages) * repeat):.2f} us/msg)")
+    return rate
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    messages = load_messages(args.files, args.unhandled_ratio)
+    if not messages:
+        print(f"未找到 OSD 记录: {args.files}")
+        return
+    print(f"回放 {len(messages)} 条消息 x {args.repeat} 次")
+    legacy_state = FlightState()
+    before = measure("before", lambda topic, payload: legacy_on_message(legacy_state, topic, payload), messages, args.repeat)
+    dispatcher = build_dispatcher(FlightState())
+    after = measure("after", dispatcher.dispatch, messages, args.repeat)
+    print(f"speedup      {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""机群负载测试
+
+用 GatewaySimulator 模拟 N 架无人机, 驱动 MAIN_CONTROL_Client / DRC_controler / Ser_puberlisher 完成
+请求控制 -> 起飞 (闭环 / 固定油门) -> 指点飞行 -> 多航点 (逐点 / 航线任务) -> 降落, 统计各阶段耗时、OSD 接收速率、进程 CPU 占用与线程数,
+最后汇总各机的链路统计 (心跳 RTT、杆量 -> OSD 响应延迟、OSD 抖动、时钟偏差) 与 OSD 频率策略 (--osd-policy fixed 时固定频率)。
+默认经进程内 LoopbackBroker (机群模式), --broker 时连接 HOST_ADDR 上的真实 broker。
+Loopback 下消息同步投递, 模拟器的仿真滞后即包含客户端处理耗时。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_fleet --uav 50
+    python -m benchmarks.bench_fleet --uav 100 --osd-freq 10
+    python -m benchmarks.bench_fleet --uav 20 --takeoff legacy --waypoints 0
+    python -m benchmarks.bench_fleet --uav 50 --osd-policy fixed
+    HOST_ADDR=127.0.0.1 FLEET_MODE=1 python -m benchmarks.bench_fleet --broker --uav 30
+"""
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+for _name, _value in (("HOST_ADDR", "127.0.0.1"), ("USERNAME", "bench"), ("PASSWORD", "bench")):
+    os.environ.setdefault(_name, _value)
+
+import paho
+import paho.mqtt.client as mqtt
+from CluodAPI_Terminal_Client.gateway_sim import GatewaySimulator, METERS_PER_DEG_LAT
+from CluodAPI_Terminal_Client.link_metrics import RollingStats, METRICS_WINDOW
+from CluodAPI_Terminal_Client.loopback_broker import LoopbackBroker, LoopbackClient
+from CluodAPI_Terminal_Client import single_client_mqtt
+from multi_client_mqtt import MAIN_CONTROL_Client, FLEET_MODE, host_addr, username, password
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="机群负载测试")
+    p.add_argument("--uav", type=int, default=30, help="模拟的无人机数量")
+    p.add_argument("--osd-freq", type=int, default=50, help="模拟器 OSD 频率 (Hz)")
+    p.add_argument("--height", type=float, default=20.0, help="起飞高度 (米)")
+    p.add_argument("--takeoff", choices=("pid", "legacy"), default="pid", help="起飞方式: pid 闭环高度控制 / legacy 固定油门轮询")
+    p.add_argument("--distance", type=float, default=50.0, help="指点飞行向北距离 (米)")
+    p.add_argument("--waypoints", type=int, default=8, help="多航点阶段的航点数, 0 跳过 (逐点飞行与航线任务各飞一遍)")
+    p.add_argument("--hold", type=float, default=5.0, help="悬停稳态测量时长 (秒)")
+    p.add_argument("--timeout", type=float, default=120.0, help="每个阶段的超时 (秒)")
+    p.add_argument("--osd-policy", choices=("adaptive", "fixed"), default="adaptive",
+                   help="adaptive 按需调整各机 OSD 频率 / fixed 固定为 --osd-freq")
+    p.add_argument("--broker", action="store_true", help="连接真实 broker, 客户端是否共用连接由 FLEET_MODE 决定")
+    p.add_argument("--verbose", action="store_true", help="显示客户端日志输出")
+    return p.parse_args(argv)
+
+
+def report(text):
+    """结果输出到原始 stdout, 不受客户端日志屏蔽影响"""
+    print(text, file=sys.__stdout__, flush=True)
+
+
+class PhaseMeter:
+    """记录一个阶段的耗时、OSD 接收数与 CPU 时间"""
+    def __init__(self, main_client):
+        self.main_client = main_client
+
+    def osd_count(self):
+        return sum(client.dispatcher.dispatched for client in self.main_client.clients)
+
+    def run(self, name, start, done, timeout):
+        osd0 = self.osd_count()
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        start()
+        while not done() and time.perf_counter() - t0 < timeout:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - t0
+        ok = done()
+        osd_rate = (self.osd_count() - osd0) / elapsed
+        cpu = (time.process_time() - cpu0) / elapsed * 100
+        report(f"{name:<8}{'完成' if ok else '超时'} {elapsed:7.2f} s  分发 {osd_rate:8.0f} msg/s  CPU {cpu:6.1f}%  线程 {threading.active_count()}")
+        return ok
+
+
+def link_report(clients):
+    """合并各机的链路统计样本"""
+    window = METRICS_WINDOW * len(clients)
+    rtt, response, jitter = RollingStats(window), RollingStats(window), RollingStats(window)
+    offsets = []
+    for client in clients:
+        link = client.drc_controler.link
+        for value in link.rtt.samples:
+            rtt.add(value)
+        for value in link.response.samples:
+            response.add(value)
+        median, p95, _ = link.osd_jitter()
+        if p95 is not None:
+            jitter.add(p95)
+        if link.clock_offset is not None:
+            offsets.append(link.clock_offset)
+    report(f"链路: {rtt.format_ms('心跳 RTT')}")
+    report(f"链路: {response.format_ms('杆量 -> OSD 响应')}, 无响应 {sum(c.drc_controler.link.response_timeouts for c in clients)}")
+    report(f"链路: {jitter.format_ms('各机 OSD 抖动 p95')}")
+    if offsets:
+        report(f"链路: 时钟偏差 {min(offsets) * 1000:+.1f} ~ {max(offsets) * 1000:+.1f} ms")
+
+
+def osd_policy_report(clients):
+    policies = [client.osd_policy for client in clients if client.osd_policy is not None]
+    if not policies:
+        return
+    rates = []
+    for policy in policies:
+        total = sum(policy.rate_time.values())
+        if total:
+            rates.append(sum(hz * seconds for hz, seconds in policy.rate_time.items()) / total)
+    requests = sum(policy.requests for policy in policies)
+    text = f"OSD 频率策略: drc_mode_enter {requests} 次 ({requests / len(policies):.1f} 次/架)"
+    if rates:
+        text += f", 各机平均 OSD 频率 {sum(rates) / len(rates):.1f} Hz (最低 {min(rates):.1f} / 最高 {max(rates):.1f})"
+    report(text)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.verbose:
+        run(args)
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run(args)
+
+
+def run(args):
+    sn_list = GatewaySimulator.make_sn_list(args.uav)
+    if args.broker:
+        sim_client = mqtt.Client(paho.mqtt.enums.CallbackAPIVersion.VERSION2, client_id="bench_sim", transport="tcp")
+        sim_client.username_pw_set(username, password)
+        fleet_mode, fleet_client = FLEET_MODE, None
+    else:
+        broker = LoopbackBroker()
+        sim_client = LoopbackClient(broker, "sim")
+        fleet_mode, fleet_client = True, LoopbackClient(broker, "fleet")
+    sim = GatewaySimulator(sn_list, sim_client, osd_frequency=args.osd_freq, writer=print)
+    sim.start(host_addr)
+
+    single_client_mqtt.OSD_RATE_POLICY = args.osd_policy == "adaptive"
+    main_client = MAIN_CONTROL_Client(args.uav, fleet_mode=fleet_mode, sn_list=sn_list, fleet_client=fleet_client)
+    main_client.run()
+    clients = main_client.clients
+    meter = PhaseMeter(main_client)
+    report(f"{args.uav} 架, OSD {args.osd_freq} Hz, {'broker ' + host_addr if args.broker else 'loopback'}, {'机群连接' if fleet_mode else '每机一个连接'}, OSD 频率 {args.osd_policy}")
+
+    futures = []
+
+    def request_control():
+        futures.clear()
+        for client in clients:
+            futures.append(client.ser_puberlisher.publish_request_cloud_control_authorization())
+            futures.append(client.ser_puberlisher.publish_enter_live_flight_controls_mode())
+
+    max_elevation = {}
+    stick_count = {}
+
+    def track_elevation(client):
+        def listener(snap):
+            if snap.elevation is not None and snap.elevation > max_elevation.get(client.gateway_sn, 0.0):
+                max_elevation[client.gateway_sn] = snap.elevation
+        client.flight_state.add_listener(listener)
+        return listener
+
+    def takeoff():
+        futures.clear()
+        for client in clients:
+            stick_count[client.gateway_sn] = client.drc_controler.stick_count
+            futures.append(client.drc_controler.send_stick_to_height(args.height, 400, closed_loop=args.takeoff == "pid"))
+
+    def flyto():
+        futures.clear()
+        for client in clients:
+            lat = client.flight_state.lat + args.distance / METERS_PER_DEG_LAT
+            futures.append(client.ser_puberlisher.publish_flyto_list_command([[lat, client.flight_state.lon, args.height]]))
+
+    def route(client):
+        """以当前位置为起点向北的折线航线"""
+        step = args.distance / METERS_PER_DEG_LAT
+        lat, lon = client.flight_state.lat, client.flight_state.lon
+        return [[lat + step * (i + 1), lon + step * 0.5 * (i % 2), args.height] for i in range(args.waypoints)]
+
+    def fly_route_by_points():
+        futures.clear()
+        for client in clients:
+            futures.append(client.ser_puberlisher.publish_flyto_list_command(route(client)))
+
+    def fly_route_as_mission():
+        futures.clear()
+        for client in clients:
+            futures.append(client.ser_puberlisher.publish_flyto_mission(route(client)))
+
+    def land():
+        for client in clients:
+            client.drc_controler.send_land_command()
+
+    meter.run("请求控制", request_control, lambda: all(f.done() for f in futures), args.timeout)
+    listeners = [(client, track_elevation(client)) for client in clients]
+    meter.run("起飞", takeoff, lambda: all(f.done() for f in futures), args.timeout)
+    commands = sum(c.drc_controler.stick_count - stick_count[c.gateway_sn] for c in clients)
+    meter.run("悬停", lambda: None, lambda: False, args.hold)
+    for client, listener in listeners:
+        client.flight_state.remove_listener(listener)
+    overshoot = [max_elevation.get(c.gateway_sn, 0.0) - args.height for c in clients]
+    errors = [abs((c.flight_state.elevation or 0.0) - args.height) for c in clients]
+    report(f"起飞({args.takeoff})成功 {sum(1 for f in futures if f.done() and f.result())}/{len(futures)}, 杆量 {commands / len(clients):.0f} 条/架, "
+           f"超调 平均 {sum(overshoot) / len(overshoot):.2f} m / 最大 {max(overshoot):.2f} m, 悬停后高度误差 最大 {max(errors):.2f} m")
+    meter.run("指点飞行", flyto, lambda: all(f.done() for f in futures), args.timeout)
+    report(f"指点飞行成功 {sum(1 for f in futures if f.done() and f.result())}/{len(futures)}")
+    if args.waypoints > 0:
+        meter.run("逐点飞行", fly_route_by_points, lambda: all(f.done() for f in futures), args.timeout * 2)
+        report(f"逐点飞行成功 {sum(1 for f in futures if f.done() and f.result())}/{len(futures)}, 请求 {args.waypoints * len(clients)} 条")
+        meter.run("航线任务", fly_route_as_mission, lambda: all(f.done() for f in futures), args.timeout * 2)
+        report(f"航线任务成功 {sum(1 for f in futures if f.done() and f.result())}/{len(futures)}, "
+               f"请求 {sum(c.ser_puberlisher.mission.requests for c in clients)} 条")
+    meter.run("降落", land, lambda: all(c.flight_state.mode_code == 0 for c in clients), args.timeout)
+    link_report(clients)
+    osd_policy_report(clients)
+    report(f"模拟器: {sim.get_stats_str()}")
+    sim.stop()
+    main_client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
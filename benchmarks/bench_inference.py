@@ -0,0 +1,129 @@
+"""多路视频流检测吞吐测试: 每路独立模型逐帧推理 vs 进程内共享批量推理
+
+N 路合成视频流各以 --fps 送帧 (--width x --height 随机画面, 或循环读取 --video 的帧), 比较:
+- 独立: 每路一个 InferenceServer (max_batch=1) 和各自的 ModelRegistry, 即每路各加载一份模型、各一个推理线程逐帧推理 (修改前的行为)
+- 共享: 所有流注册到同一个 InferenceServer, 最新帧合批推理
+- 共享 + 推理进程: --processes N 时再测一次, 前向在 N 个工作进程中执行, 帧经共享内存传递
+统计各路推理帧率、送帧到结果的延迟、被覆盖 (未推理) 的帧数与每批大小, 以及同时运行的一条 50 Hz 调度器流
+(模拟杆量) 的抖动, 反映推理对控制链路的影响。需要 ultralytics 与 model/ 下的权重。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_inference
+    python -m benchmarks.bench_inference --streams 3 --fps 30 --seconds 20 --batch-latency 0.02
+    python -m benchmarks.bench_inference --processes 2
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler
+from inference_server import InferenceServer, MAX_BATCH, MAX_BATCH_LATENCY
+from model_registry import ModelRegistry
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="多路视频流检测吞吐测试")
+    p.add_argument("--streams", type=int, default=3, help="视频流数量")
+    p.add_argument("--fps", type=float, default=30.0, help="每路送帧频率")
+    p.add_argument("--seconds", type=float, default=10.0, help="每种模式的测试时长 (秒)")
+    p.add_argument("--width", type=int, default=1280, help="合成画面宽度")
+    p.add_argument("--height", type=int, default=720, help="合成画面高度")
+    p.add_argument("--video", type=str, default=None, help="使用该视频的帧代替随机画面 (需要 cv2)")
+    p.add_argument("--model-normal", type=str, default="model/yolo11s")
+    p.add_argument("--model-drone", type=str, default="model/air2air_det_db-yolo11s_i512_c2.pt")
+    p.add_argument("--batch-latency", type=float, default=MAX_BATCH_LATENCY, help="共享模式凑批最长等待 (秒)")
+    p.add_argument("--processes", type=int, default=0, help="另测推理进程模式的工作进程数, 0 为不测")
+    return p.parse_args(argv)
+
+
+def load_frames(args, count=30):
+    if args.video is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(count)]
+    import cv2
+    cap = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def feed(slot, frames, fps, stop_event):
+    period = 1.0 / fps
+    next_ts = time.perf_counter()
+    index = 0
+    while not stop_event.is_set():
+        slot.submit(frames[index % len(frames)], time.time())
+        index += 1
+        next_ts += period
+        delay = next_ts - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def measure(name, args, servers, frames):
+    """servers: 每路流使用的 InferenceServer"""
+    slots = [server.register(f"stream{i}", lambda detections, frame_ts: None) for i, server in enumerate(servers)]
+    # 预热: 第一次推理包含初始化开销, 不计入
+    for slot in slots:
+        slot.submit(frames[0], time.time())
+    deadline = time.perf_counter() + 30
+    while any(slot.processed == 0 for slot in slots) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    for slot in slots:
+        slot.submitted = slot.processed = slot.overwritten = 0
+        slot.latency.samples.clear()
+    # 控制链路探针: 50 Hz 空回调, 只统计调度抖动
+    scheduler = DRCScheduler()
+    scheduler.add(("probe", "stick"), lambda now: True, 50)
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=feed, args=(slot, frames, args.fps, stop_event), daemon=True) for slot in slots]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop_event.set()
+    elapsed = time.perf_counter() - t0
+    for thread in threads:
+        thread.join()
+    probe = scheduler.get_stats_str("probe")
+    scheduler.stop()
+    print(f"{name}: 模型 {len(set(map(id, servers))) * 2} 份")
+    for slot in slots:
+        print(f"  {slot.name}: 推理 {slot.processed / elapsed:.1f} 帧/秒, 覆盖 {slot.overwritten}, {slot.latency.format_ms('送帧到结果')}")
+    total = sum(slot.processed for slot in slots)
+    print(f"  合计 {total / elapsed:.1f} 帧/秒")
+    for server in dict.fromkeys(servers):
+        mean = server.batch_sizes.mean()
+        if mean is not None:
+            print(f"  平均批大小 {mean:.2f}, {server.forward_time.format_ms('每批推理')}")
+    print(f"  控制链路 {probe}")
+    for slot in slots:
+        slot.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    frames = load_frames(args)
+    print(f"{args.streams} 路 x {args.fps:g} fps, 画面 {frames[0].shape[1]}x{frames[0].shape[0]}, 每种模式 {args.seconds:g} 秒")
+    separate = [InferenceServer(args.model_normal, args.model_drone, max_batch=1, registry=ModelRegistry()) for _ in range(args.streams)]
+    measure("独立 (每路一份模型, 逐帧)", args, separate, frames)
+    del separate
+    shared = InferenceServer(args.model_normal, args.model_drone, max_batch=MAX_BATCH, max_batch_latency=args.batch_latency,
+                             registry=ModelRegistry())
+    measure("共享 (合批推理)", args, [shared] * args.streams, frames)
+    if args.processes > 0:
+        pooled = InferenceServer(args.model_normal, args.model_drone, max_batch=MAX_BATCH, max_batch_latency=args.batch_latency,
+                                 processes=args.processes)
+        measure(f"共享 + {args.processes} 个推理进程", args, [pooled] * args.streams, frames)
+        for worker in pooled.workers:
+            print(f"  {worker.get_stats_str()}")
+        pooled.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""安全指令在杆量饱和负载下的发布延迟测试
+
+模拟发送带宽受限的连接 (每秒只能写出 --link-rate 条, 写出时调用 on_publish, 同 paho 网络线程),
+N 架无人机以 F Hz 发送杆量、1 Hz 心跳, 使总负载超过链路能力, 同时每隔 --rth-interval 秒轮流为一架发送 return_home。
+统计 return_home 与杆量从提交到写出的等待时间:
+- 直接发布: 所有消息直接调用 client.publish, 进入同一个先进先出队列 (修改前的行为)
+- 优先级发布: 经 DRC_controler / Ser_puberlisher, 杆量走 StickLane 合并, 返航按 SAFETY 优先级插队
+优先级模式下不启用返航对杆量流的抢占, 保持杆量负载持续饱和。
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_priority
+    python -m benchmarks.bench_priority --uav 100 --freq 50 --link-rate 2000 --seconds 5
+"""
+import argparse
+import itertools
+import threading
+import time
+from collections import deque
+from CluodAPI_Terminal_Client.DRC_controler import DRC_controler
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler
+from CluodAPI_Terminal_Client.fly_utils import FlightState
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+from CluodAPI_Terminal_Client.service_messages import ServiceMessageBuilder
+from CluodAPI_Terminal_Client.services_publisher import Ser_puberlisher
+from CluodAPI_Terminal_Client.stick_encoder import encode_stick_control
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="安全指令在杆量饱和负载下的发布延迟测试")
+    p.add_argument("--uav", type=int, default=100, help="无人机数量")
+    p.add_argument("--freq", type=float, default=50.0, help="每架杆量频率 (Hz)")
+    p.add_argument("--link-rate", type=float, default=2000.0, help="链路每秒可写出的消息数")
+    p.add_argument("--rth-interval", type=float, default=0.2, help="发送 return_home 的间隔 (秒)")
+    p.add_argument("--seconds", type=float, default=5.0, help="每种模式的测试时长 (秒)")
+    return p.parse_args(argv)
+
+
+class SlowPublishInfo:
+    __slots__ = ("mid", "rc", "published")
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+        self.published = False
+
+    def is_published(self):
+        return self.published
+
+
+class SlowClient:
+    """publish 只入队, 发送线程按 rate 条/秒依次写出并调用 on_publish"""
+    def __init__(self, rate):
+        self.rate = rate
+        self.on_publish = None
+        self.mids = itertools.count(1)
+        self.queue = deque()
+        self.stop_event = threading.Event()
+        self.latency = {"return_home": RollingStats(100000), "stick_control": RollingStats(100000)}
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        info = SlowPublishInfo(next(self.mids))
+        self.queue.append((info, time.perf_counter(), payload))
+        return info
+
+    def _run(self):
+        start = time.perf_counter()
+        while not self.stop_event.is_set():
+            time.sleep(0.0005)
+            budget = int((time.perf_counter() - start) * self.rate) - self.written
+            while budget > 0 and self.queue:
+                info, queued_at, payload = self.queue.popleft()
+                self.written += 1
+                budget -= 1
+                now = time.perf_counter()
+                for kind, stats in self.latency.items():
+                    if kind.encode() in payload:
+                        stats.add(now - queued_at)
+                info.published = True
+                if self.on_publish:
+                    self.on_publish(self, None, info.mid, 0, None)
+            if budget > 0:
+                # 链路空闲时不累积发送额度
+                start = time.perf_counter() - self.written / self.rate
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def run_direct(args, client, scheduler, sn_list):
+    seqs = itertools.count()
+
+    def stick(now, topic):
+        client.publish(topic, encode_stick_control(next(seqs), 1024, 1324, 1024, 1024))
+
+    builders = []
+    for sn in sn_list:
+        topic = f"thing/product/{sn}/drc/down"
+        scheduler.add((sn, "stick"), lambda now, topic=topic: stick(now, topic), args.freq)
+        builders.append((f"thing/product/{sn}/services", ServiceMessageBuilder(sn, "127.0.0.1")))
+    return lambda index: client.publish(builders[index][0], builders[index][1].return_home().payload)
+
+
+def run_lanes(args, client, scheduler, sn_list):
+    publishers = []
+    for sn in sn_list:
+        flight_state = FlightState()
+        controller = DRC_controler(sn, client, flight_state, writer=lambda *a: None, scheduler=scheduler)
+        controller.scheduler.add(controller.stick_key, lambda now, c=controller: c.send_stick_control_command(1024, 1324, 1024, 1024), args.freq)
+        publishers.append(Ser_puberlisher(sn, client, "127.0.0.1", flight_state, None, 0, writer=lambda *a: None))
+    return lambda index: publishers[index].publish_return_home()
+
+
+def measure(name, args, setup):
+    scheduler = DRCScheduler()
+    client = SlowClient(args.link_rate)
+    sn_list = [f"PRIO{i:010d}" for i in range(args.uav)]
+    return_home = setup(args, client, scheduler, sn_list)
+    t0 = time.perf_counter()
+    for index in itertools.count():
+        if time.perf_counter() - t0 >= args.seconds:
+            break
+        return_home(index % args.uav)
+        time.sleep(args.rth_interval)
+    backlog = len(client.queue)
+    scheduler.stop()
+    client.stop()
+    rth = client.latency["return_home"]
+    sticks = client.latency["stick_control"]
+    print(f"{name}: 结束时链路队列 {backlog} 条")
+    print(f"  {rth.format_ms('return_home 等待')}, 最大 {max(rth.samples, default=0.0) * 1000:.1f} ms")
+    print(f"  {sticks.format_ms('杆量等待')}, 最大 {max(sticks.samples, default=0.0) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"{args.uav} 架 x {args.freq:g} Hz 杆量 = {args.uav * args.freq:.0f} msg/s, 链路 {args.link_rate:.0f} msg/s, "
+          f"每 {args.rth_interval:g} 秒一次 return_home, 每种模式 {args.seconds:g} 秒")
+    measure("直接发布", args, run_direct)
+    measure("优先级发布", args, run_lanes)
+
+
+if __name__ == "__main__":
+    main()
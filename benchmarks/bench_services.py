@@ -0,0 +1,159 @@
+"""服务请求消息构造性能测试
+
+覆盖七种服务请求 (cloud_control_auth_request、drc_mode_enter、fly_to_point、return_home、
+live_start_push、live_stop_push、live_set_quality):
+1. 单条构造耗时: 旧实现 (uuid.uuid4 + 展开模块级模板 dict + json.dumps) 与 ServiceMessageBuilder 预编码模板对比
+2. 多线程: T 个线程同时为 N 架无人机构造消息, 统计总吞吐并检查每条消息可解析、bid/tid 互不重复
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_services
+    python -m benchmarks.bench_services --uav 200 --threads 8 --count 20000
+"""
+import argparse
+import threading
+import time
+import uuid
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.service_messages import ServiceMessageBuilder
+
+DEVICE_SN = "1581F7FVC257X00D6KZ2"
+POINTS = [(39.0427514, 117.7238255, 180.0), (39.0437973, 117.7235937, 180.0), (39.0450147, 117.7237587, 185.5)]
+
+legacy_templates = {
+    "cloud_control_auth_request": {"bid": "", "data": {"control_keys": ["flight"], "user_callsign": "WUDIZHR", "user_id": "123456"},
+                                   "method": "cloud_control_auth_request", "tid": "", "timestamp": 0},
+    "drc_mode_enter": {"bid": "", "data": {"hsi_frequency": 1, "mqtt_broker": {"address": "host_addr:1883", "client_id": "sn_a", "enable_tls": "false",
+                                                                              "expire_time": 1672744922, "password": "jwt_token", "username": "sn_a_username"},
+                                           "osd_frequency": 50},
+                       "tid": "", "timestamp": 0, "method": "drc_mode_enter"},
+    "fly_to_point": {"bid": "", "data": {"fly_to_id": "", "max_speed": 12, "points": []}, "tid": "", "timestamp": 0, "method": "fly_to_point"},
+    "return_home": {"bid": "", "data": "null", "method": "return_home", "tid": "", "timestamp": 0},
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="服务请求消息构造性能测试")
+    p.add_argument("--uav", type=int, default=100, help="无人机数量 (多线程测试)")
+    p.add_argument("--threads", type=int, default=4, help="并发构造线程数")
+    p.add_argument("--count", type=int, default=20000, help="每种消息的单条测试次数 / 每线程构造次数")
+    return p.parse_args(argv)
+
+
+def legacy_uuid():
+    return str(uuid.uuid4())
+
+
+def envelope(method, data):
+    return {"bid": legacy_uuid(), "tid": legacy_uuid(), "timestamp": int(time.time() * 1000), "method": method, "data": data}
+
+
+def legacy_cases(sn):
+    """与修改前 Ser_puberlisher 的构造方式相同"""
+    def drc_mode_enter():
+        template = legacy_templates["drc_mode_enter"]
+        data = template["data"]
+        mqtt_broker = {**data["mqtt_broker"], "address": "127.0.0.1:1883", "client_id": f"sn_{sn}"}
+        return json_codec.dumps({**template, "bid": legacy_uuid(), "tid": legacy_uuid(), "timestamp": int(time.time() * 1000),
+                                 "data": {**data, "mqtt_broker": mqtt_broker}})
+
+    def fly_to_point():
+        template = legacy_templates["fly_to_point"]
+        data = template["data"]
+        return json_codec.dumps({**template, "bid": legacy_uuid(), "tid": legacy_uuid(), "timestamp": int(time.time() * 1000),
+                                 "data": {**data, "fly_to_id": f"flyto_{sn}_1", "max_speed": data["max_speed"],
+                                          "points": [{"height": h, "latitude": lat, "longitude": lon} for lat, lon, h in POINTS]}})
+
+    video_id = f"{DEVICE_SN}/88-0-0/normal-0"
+    return {
+        "cloud_control_auth_request": lambda: json_codec.dumps({**legacy_templates["cloud_control_auth_request"], "bid": legacy_uuid(),
+                                                                "tid": legacy_uuid(), "timestamp": int(time.time() * 1000)}),
+        "drc_mode_enter": drc_mode_enter,
+        "fly_to_point": fly_to_point,
+        "return_home": lambda: json_codec.dumps({**legacy_templates["return_home"], "bid": legacy_uuid(), "tid": legacy_uuid(),
+                                                 "timestamp": int(time.time() * 1000)}),
+        "live_start_push": lambda: json_codec.dumps(envelope("live_start_push", {"url": "rtmp://81.70.222.38:1935/live/Drone001", "url_type": 1,
+                                                                                 "video_id": video_id, "video_quality": 1})),
+        "live_stop_push": lambda: json_codec.dumps(envelope("live_stop_push", {"video_id": video_id})),
+        "live_set_quality": lambda: json_codec.dumps(envelope("live_set_quality", {"video_id": video_id, "video_quality": 3})),
+    }
+
+
+def builder_cases(builder: ServiceMessageBuilder, sn):
+    return {
+        "cloud_control_auth_request": builder.cloud_control_auth_request,
+        "drc_mode_enter": builder.drc_mode_enter,
+        "fly_to_point": lambda: builder.fly_to_point(f"flyto_{sn}_1", POINTS),
+        "return_home": builder.return_home,
+        "live_start_push": lambda: builder.live_start_push(DEVICE_SN, 1),
+        "live_stop_push": lambda: builder.live_stop_push(DEVICE_SN),
+        "live_set_quality": lambda: builder.live_set_quality(DEVICE_SN, 3),
+    }
+
+
+def make_builder(sn):
+    return ServiceMessageBuilder(sn, "127.0.0.1", rtmp_url="rtmp://81.70.222.38:1935/live/Drone001")
+
+
+def per_call_us(build, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        build()
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+def check_equivalent(legacy, built):
+    """除 bid/tid/timestamp 外两种实现的消息内容一致"""
+    for method, build in built.items():
+        new = json_codec.loads(build().payload)
+        old = json_codec.loads(legacy[method]())
+        for key in ("bid", "tid", "timestamp"):
+            assert isinstance(new.pop(key), type(old.pop(key))), (method, key)
+        assert new == old, (method, new, old)
+
+
+def concurrent_run(args):
+    builders = [make_builder(f"BENCH{i:09d}") for i in range(args.uav)]
+    cases = [list(builder_cases(builder, builder.gateway_sn).values()) for builder in builders]
+    results = [None] * args.threads
+
+    def worker(index):
+        payloads = []
+        for n in range(args.count):
+            # 各线程交错访问同一批 builder
+            payloads.append(cases[(n + index) % len(cases)][n % 7]().payload)
+        results[index] = payloads
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.threads)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+    total = args.threads * args.count
+    ids = set()
+    for payloads in results:
+        for payload in payloads:
+            message = json_codec.loads(payload)
+            ids.add(message["bid"])
+            ids.add(message["tid"])
+    assert len(ids) == 2 * total, "bid/tid 出现重复"
+    print(f"{args.threads} 线程 x {args.count} 条, {args.uav} 架无人机: {total / elapsed:.0f} msg/s, {total} 条消息全部可解析, bid/tid 无重复")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sn = "BENCH000000000"
+    legacy = legacy_cases(sn)
+    built = builder_cases(make_builder(sn), sn)
+    check_equivalent(legacy, built)
+    print(f"[{json_codec.backend}] {'消息':<28}{'旧实现 us':>10}{'预编码 us':>10}")
+    for method in legacy:
+        legacy_us = per_call_us(legacy[method], args.count)
+        builder_us = per_call_us(built[method], args.count)
+        print(f"{method:<30}{legacy_us:10.2f}{builder_us:10.2f}")
+    concurrent_run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""stick_control 编码与持续发送性能测试
+
+1. 单条编码耗时: 旧实现 (浅拷贝模板 dict + json.dumps) 与 encode_stick_control 预编码模板对比
+2. 持续发送: N 个 DRC_controler 在同一个 DRCScheduler 上以 F Hz 发送杆量 (发布到空客户端),
+   统计实际总速率、跳拍数、最大抖动和进程 CPU 占用
+3. 发送阻塞: 客户端停止发出 --stall 秒后恢复, 对比直接 publish 会堆积的杆量条数与 StickLane 合并后的堆积
+   (合并后的堆积包括客户端发送队列、共用 PriorityPublisher 的本地队列与各机待发杆量)
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_stick
+    python -m benchmarks.bench_stick --uav 200 --freq 50 --seconds 10
+    python -m benchmarks.bench_stick --uav 50 --stall 3
+"""
+import argparse
+import itertools
+import threading
+import time
+from CluodAPI_Terminal_Client import json_codec
+from CluodAPI_Terminal_Client.DRC_controler import DRC_controler
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler
+from CluodAPI_Terminal_Client.fly_utils import FlightState
+from CluodAPI_Terminal_Client.loopback_broker import LoopbackPublishInfo
+from CluodAPI_Terminal_Client.stick_encoder import encode_stick_control
+
+legacy_control_message = {
+    "seq": 0,
+    "method": "stick_control",
+    "data": {"roll": 1024, "pitch": 1024, "throttle": 1024, "yaw": 1024},
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="stick_control 编码与持续发送性能测试")
+    p.add_argument("--uav", type=int, default=100, help="无人机数量")
+    p.add_argument("--freq", type=float, default=50.0, help="每架杆量频率 (Hz)")
+    p.add_argument("--seconds", type=float, default=5.0, help="持续发送测试时长 (秒)")
+    p.add_argument("--count", type=int, default=200000, help="单条编码测试次数")
+    p.add_argument("--stall", type=float, default=2.0, help="发送阻塞测试的阻塞时长 (秒), 0 跳过")
+    return p.parse_args(argv)
+
+
+class NullClient:
+    """只计数的发布端, 每条消息立即视为已发出"""
+    def __init__(self):
+        self.published = 0
+        self.on_publish = None
+        self.mids = itertools.count(1)
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.published += 1
+        return LoopbackPublishInfo(next(self.mids))
+
+
+class StalledPublishInfo(LoopbackPublishInfo):
+    __slots__ = ("published", "payload")
+
+    def is_published(self):
+        return self.published
+
+
+class StalledClient(NullClient):
+    """阻塞期间消息留在发送队列中 (同 paho 套接字不可写时), release() 后依次发出并调用 on_publish"""
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.queue = []
+        self.stalled = True
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.published += 1
+        info = StalledPublishInfo(next(self.mids))
+        info.payload = payload
+        info.published = not self.stalled
+        if self.stalled:
+            with self.lock:
+                self.queue.append(info)
+        elif self.on_publish:
+            self.on_publish(self, None, info.mid, 0, None)
+        return info
+
+    def release(self):
+        with self.lock:
+            queue, self.queue = self.queue, []
+            self.stalled = False
+        for info in queue:
+            info.published = True
+            if self.on_publish:
+                self.on_publish(self, None, info.mid, 0, None)
+        return queue
+
+
+def legacy_encode(seq, roll, pitch, throttle, yaw):
+    message = legacy_control_message.copy()
+    message["seq"] = seq
+    message["data"]["roll"] = roll
+    message["data"]["pitch"] = pitch
+    message["data"]["throttle"] = throttle
+    message["data"]["yaw"] = yaw
+    return json_codec.dumps(message)
+
+
+def per_call_us(encode, count):
+    start = time.perf_counter()
+    for seq in range(count):
+        encode(seq, 1024, 1324, 1024, 1024)
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+def sustained(args):
+    scheduler = DRCScheduler()
+    client = NullClient()
+    controllers = [DRC_controler(f"BENCH{i:09d}", client, FlightState(), scheduler=scheduler) for i in range(args.uav)]
+    for controller in controllers:
+        controller.is_beat = False
+        controller.scheduler.add(controller.stick_key, lambda now, c=controller: c.send_stick_control_command(1024, 1324, 1024, 1024), args.freq)
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    time.sleep(args.seconds)
+    streams = [scheduler.get(controller.stick_key) for controller in controllers]
+    elapsed = time.perf_counter() - t0
+    cpu = (time.process_time() - cpu0) / elapsed * 100
+    scheduler.stop()
+    sent = sum(stream.count for stream in streams)
+    missed = sum(stream.missed for stream in streams)
+    jitter_mean = sum(stream.jitter_mean for stream in streams) / len(streams)
+    jitter_max = max(stream.jitter_max for stream in streams)
+    print(f"持续发送 {args.uav} x {args.freq:g} Hz, {elapsed:.1f} 秒: 实际 {sent / elapsed:.0f} msg/s (目标 {args.uav * args.freq:.0f}), "
+          f"跳拍 {missed}, 抖动 平均 {jitter_mean * 1000:.2f} ms / 最大 {jitter_max * 1000:.2f} ms, CPU {cpu:.1f}%")
+
+
+def backpressure(args):
+    scheduler = DRCScheduler()
+    client = StalledClient()
+    controllers = [DRC_controler(f"STALL{i:09d}", client, FlightState(), scheduler=scheduler) for i in range(args.uav)]
+    for controller in controllers:
+        controller.is_beat = False
+        controller.scheduler.add(controller.stick_key, lambda now, c=controller: c.send_stick_control_command(1024, 1324, 1024, 1024), args.freq)
+    time.sleep(args.stall)
+    submitted = sum(controller.stick_lane.submitted for controller in controllers)
+    # 杆量可能堆积在三处: 已交给客户端 (paho 发送队列)、PriorityPublisher 的本地队列 (窗口已被心跳等占满)、合并通道的待发
+    publisher = controllers[0].publisher
+    with publisher.lock:
+        in_publisher = sum(1 for queue in publisher.queues for item in queue if b"stick_control" in item.payload)
+    with client.lock:
+        in_client = sum(1 for info in client.queue if b"stick_control" in info.payload)
+    pending = sum(1 for controller in controllers if controller.stick_lane.pending is not None)
+    queued = in_client + in_publisher + pending
+    # 恢复发送: 在途杆量发出后, 各机紧接着发出的是阻塞期间最新的一条待发杆量
+    client.release()
+    scheduler.stop()
+    coalesced = sum(controller.stick_lane.coalesced for controller in controllers)
+    expired = sum(controller.stick_lane.expired for controller in controllers)
+    print(f"发送阻塞 {args.stall:g} 秒, {args.uav} x {args.freq:g} Hz: 直接 publish 将堆积 {submitted} 条 (恢复后先执行 {args.stall:g} 秒前的杆量), "
+          f"合并通道堆积 {queued} 条 (客户端 {in_client}, 发布队列 {in_publisher}, 待发 {pending}; 每架最多 1 条在途 + 1 条待发), "
+          f"合并 {coalesced}, 过期 {expired}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rate = args.uav * args.freq
+    assert json_codec.loads(encode_stick_control(7, 1024, 1324, 365, 1684.0)) == json_codec.loads(legacy_encode(7, 1024, 1324, 365, 1684))
+    legacy_us = per_call_us(legacy_encode, args.count)
+    encoder_us = per_call_us(encode_stick_control, args.count)
+    print(f"[{json_codec.backend}] 旧实现    {legacy_us:6.2f} us/msg  -> {legacy_us * rate / 1e4:5.1f}% 单核 @ {rate:.0f} msg/s")
+    print(f"预编码模板        {encoder_us:6.2f} us/msg  -> {encoder_us * rate / 1e4:5.1f}% 单核 @ {rate:.0f} msg/s")
+    sustained(args)
+    if args.stall > 0:
+        backpressure(args)
+
+
+if __name__ == "__main__":
+    main()
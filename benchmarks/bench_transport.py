@@ -0,0 +1,332 @@
+"""MQTT 3.1.1 与 MQTT 5 (topic 别名 + 持久会话) 的对比测试
+
+本地起一个只实现压测所需子集的 broker (CONNECT / SUBSCRIBE / PUBLISH / PINGREQ / DISCONNECT,
+支持持久会话和双向 topic 别名), 以 --osd-freq 向已订阅的连接推送各机 drc/up OSD,
+CONNACK / SUBACK 延迟 --rtt 秒发送以模拟握手往返。真实 paho 客户端经 FleetConnection + MQTTTransport 连接:
+1. N 架无人机以 F Hz 经 StickLane 发送杆量, 按 broker 收到的字节统计每条杆量消息的大小
+2. broker 主动断开连接 --kills 次, 统计断线到重连成功、断线到收到第一条 OSD 的时间
+   (3.1.1 重连后需要重新订阅; MQTT 5 会话恢复后 broker 直接推送)
+
+使用示例(在仓库根目录执行):
+    python -m benchmarks.bench_transport
+    python -m benchmarks.bench_transport --uav 50 --freq 50 --rtt 0.05 --kills 5
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from CluodAPI_Terminal_Client.drc_scheduler import DRCScheduler
+from CluodAPI_Terminal_Client.fleet_connection import FleetConnection
+from CluodAPI_Terminal_Client.loopback_broker import topic_matches
+from CluodAPI_Terminal_Client.mqtt_transport import create_client, make_client_id
+from CluodAPI_Terminal_Client.publish_lanes import get_priority_publisher
+from CluodAPI_Terminal_Client.stick_encoder import encode_stick_control
+from CluodAPI_Terminal_Client.stick_lane import StickLane
+from CluodAPI_Terminal_Client import json_codec
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="MQTT 3.1.1 与 MQTT 5 (topic 别名 + 持久会话) 的对比测试")
+    p.add_argument("--uav", type=int, default=20, help="无人机数量")
+    p.add_argument("--freq", type=float, default=50.0, help="每架杆量频率 (Hz)")
+    p.add_argument("--osd-freq", type=float, default=10.0, help="每架 OSD 推送频率 (Hz)")
+    p.add_argument("--seconds", type=float, default=2.0, help="杆量发送时长 (秒)")
+    p.add_argument("--rtt", type=float, default=0.05, help="模拟的握手往返时延 (秒)")
+    p.add_argument("--kills", type=int, default=5, help="broker 主动断开连接的次数")
+    return p.parse_args(argv)
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_string(text):
+    data = text.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+class BenchConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.send_lock = threading.Lock()
+        self.v5 = False
+        self.client_id = ""
+        self.connected = False
+        self.subscriptions = set()
+        self.alias_maximum = 0      # 客户端允许的下行别名数
+        self.aliases = {}           # topic -> 下行别名
+
+    def send(self, packet):
+        with self.send_lock:
+            try:
+                self.sock.sendall(packet)
+            except OSError:
+                self.connected = False
+
+
+class BenchBroker:
+    """压测用 MQTT broker, 只实现本测试需要的报文"""
+    def __init__(self, sn_list, osd_freq, rtt):
+        self.sn_list = sn_list
+        self.osd_freq = osd_freq
+        self.rtt = rtt
+        self.lock = threading.Lock()
+        self.connections = []
+        self.sessions = {}          # client_id -> 订阅集合 (持久会话)
+        self.publish_count = 0
+        self.publish_bytes = 0
+        self.aliased_out = 0
+        self.stop_event = threading.Event()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._push_osd, daemon=True).start()
+
+    def _accept(self):
+        while not self.stop_event.is_set():
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = BenchConnection(sock)
+            with self.lock:
+                self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _read_exact(self, sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _read_packet(self, sock):
+        header = self._read_exact(sock, 1)[0]
+        length, multiplier, size = 0, 1, 1
+        while True:
+            byte = self._read_exact(sock, 1)[0]
+            size += 1
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header, self._read_exact(sock, length), size + length
+
+    def _serve(self, conn):
+        try:
+            while True:
+                header, body, size = self._read_packet(conn.sock)
+                kind = header >> 4
+                if kind == 1:
+                    self._on_connect(conn, body)
+                elif kind == 3:
+                    self.publish_count += 1
+                    self.publish_bytes += size
+                    if (header >> 1) & 0x03:
+                        topic_length = struct.unpack("!H", body[:2])[0]
+                        conn.send(b"\x40\x02" + body[2 + topic_length:4 + topic_length])
+                elif kind == 8:
+                    self._on_subscribe(conn, body)
+                elif kind == 12:
+                    conn.send(b"\xd0\x00")
+                elif kind == 14:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        self._close(conn)
+
+    def _on_connect(self, conn, body):
+        name_length = struct.unpack("!H", body[:2])[0]
+        pos = 2 + name_length
+        level, flags = body[pos], body[pos + 1]
+        pos += 4
+        conn.v5 = level == 5
+        session_expiry = 0
+        if conn.v5:
+            properties = Properties(PacketTypes.CONNECT)
+            _, properties_length = properties.unpack(body[pos:])
+            pos += properties_length
+            session_expiry = getattr(properties, "SessionExpiryInterval", 0)
+            conn.alias_maximum = getattr(properties, "TopicAliasMaximum", 0)
+        id_length = struct.unpack("!H", body[pos:pos + 2])[0]
+        conn.client_id = body[pos + 2:pos + 2 + id_length].decode()
+        session_present = 0
+        with self.lock:
+            if flags & 0x02 or not session_expiry:
+                self.sessions.pop(conn.client_id, None)
+            elif conn.client_id in self.sessions:
+                conn.subscriptions = self.sessions[conn.client_id]
+                session_present = 1
+            if session_expiry:
+                self.sessions[conn.client_id] = conn.subscriptions
+        time.sleep(self.rtt)
+        if conn.v5:
+            properties = Properties(PacketTypes.CONNACK)
+            properties.TopicAliasMaximum = 65535
+            variable = bytes((session_present, 0)) + properties.pack()
+        else:
+            variable = bytes((session_present, 0))
+        conn.send(b"\x20" + encode_length(len(variable)) + variable)
+        conn.connected = True
+
+    def _on_subscribe(self, conn, body):
+        packet_id = body[:2]
+        pos = 2
+        if conn.v5:
+            _, properties_length = Properties(PacketTypes.SUBSCRIBE).unpack(body[pos:])
+            pos += properties_length
+        codes = bytearray()
+        while pos < len(body):
+            topic_length = struct.unpack("!H", body[pos:pos + 2])[0]
+            conn.subscriptions.add(body[pos + 2:pos + 2 + topic_length].decode())
+            pos += 3 + topic_length
+            codes.append(0)
+        time.sleep(self.rtt)
+        variable = packet_id + (b"\x00" if conn.v5 else b"") + bytes(codes)
+        conn.send(b"\x90" + encode_length(len(variable)) + variable)
+
+    def _publish_to(self, conn, topic, payload):
+        if conn.v5:
+            properties = Properties(PacketTypes.PUBLISH)
+            alias = conn.aliases.get(topic)
+            if alias is not None:
+                properties.TopicAlias = alias
+                topic_field = encode_string("")
+                self.aliased_out += 1
+            elif len(conn.aliases) < conn.alias_maximum:
+                alias = conn.aliases[topic] = len(conn.aliases) + 1
+                properties.TopicAlias = alias
+                topic_field = encode_string(topic)
+            else:
+                topic_field = encode_string(topic)
+            variable = topic_field + properties.pack()
+        else:
+            variable = encode_string(topic)
+        conn.send(b"\x30" + encode_length(len(variable) + len(payload)) + variable + payload)
+
+    def _push_osd(self):
+        seq = 0
+        while not self.stop_event.wait(1.0 / self.osd_freq):
+            seq += 1
+            with self.lock:
+                connections = [conn for conn in self.connections if conn.connected and conn.subscriptions]
+            for conn in connections:
+                for sn in self.sn_list:
+                    topic = f"thing/product/{sn}/drc/up"
+                    if any(topic_matches(pattern, topic) for pattern in conn.subscriptions):
+                        payload = json_codec.dumps({"method": "osd_info_push", "seq": seq, "data": {
+                            "height": 10.0, "elevation": 10.0, "attitude_head": 0.0, "horizontal_speed": 0.0,
+                            "vertical_speed": 0.0}})
+                        self._publish_to(conn, topic, payload)
+
+    def _close(self, conn):
+        conn.connected = False
+        with self.lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+    def kill(self):
+        """模拟网络中断: 断开所有连接"""
+        with self.lock:
+            connections = list(self.connections)
+        for conn in connections:
+            conn.connected = False
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.stop_event.set()
+        self.kill()
+        self.server.close()
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def measure(protocol, args):
+    sn_list = [f"9N9CN{i:09d}" for i in range(args.uav)]
+    broker = BenchBroker(sn_list, args.osd_freq, args.rtt)
+    routed = [0]
+
+    def dispatch(topic, payload):
+        routed[0] += 1
+
+    fleet = FleetConnection("127.0.0.1", "bench", "bench", port=broker.port, writer=lambda *a: None,
+                            client=create_client(make_client_id(f"bench{protocol}"), protocol))
+    for sn in sn_list:
+        fleet.add_route(sn, dispatch)
+    transport = fleet.transport
+    fleet.run()
+    if not wait_until(lambda: transport.connect_to_osd.total > 0):
+        print(f"MQTT {protocol}: 未能连接")
+        broker.stop()
+        return
+
+    # 1. 杆量消息大小
+    publisher = get_priority_publisher(fleet.client)
+    lanes = [StickLane(fleet.client, f"thing/product/{sn}/drc/down", publisher=publisher) for sn in sn_list]
+    scheduler = DRCScheduler()
+    seqs = iter(range(1 << 62))
+    for sn, lane in zip(sn_list, lanes):
+        scheduler.add((sn, "stick"), lambda now, lane=lane: lane.submit(encode_stick_control(next(seqs), 1024, 1324, 1024, 1024)),
+                      args.freq)
+    count0, bytes0 = broker.publish_count, broker.publish_bytes
+    time.sleep(args.seconds)
+    scheduler.stop()
+    wait_until(lambda: publisher.pending() == 0 and not publisher.inflight, 2.0)
+    time.sleep(0.1)
+    count = broker.publish_count - count0
+    size = broker.publish_bytes - bytes0
+    print(f"MQTT {protocol}: 杆量 {count} 条, 平均 {size / max(count, 1):.1f} 字节/条 (含 MQTT 报头), "
+          f"{size * 8 / args.seconds / 1000:.0f} kbit/s")
+
+    # 2. 断线重连
+    for _ in range(args.kills):
+        total = transport.outage_to_osd.total
+        broker.kill()
+        if not wait_until(lambda: transport.outage_to_osd.total > total):
+            print("  重连超时")
+            break
+        time.sleep(0.2)
+    print("  " + transport.get_stats_str().replace("\n", "\n  "))
+    print(f"  broker 下行别名 {broker.aliased_out} 条, 路由 OSD {routed[0]} 条, 未路由 {fleet.unrouted} 条")
+    fleet.client.disconnect()
+    broker.stop()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"{args.uav} 架 x {args.freq:g} Hz 杆量, OSD {args.osd_freq:g} Hz, 握手往返 {args.rtt * 1000:.0f} ms, 断线 {args.kills} 次")
+    measure("3.1.1", args)
+    measure("5", args)
+
+
+if __name__ == "__main__":
+    main()
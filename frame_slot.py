@@ -0,0 +1,77 @@
+"""单槽最新帧缓冲: 采集线程只发布最新一帧, 各消费者按序号读取
+
+原先 StreamPredictor.run 在一个线程里依次解码、复制显示帧、绘制、再复制一份送推理、写视频,
+显示或编码慢了就直接拖慢采集, RTMP 缓冲越积越多、画面延迟越来越大。LatestFrameSlot:
+- 生产者 (采集线程) publish 时覆盖旧帧、序号加一, 从不阻塞
+- 每个消费者 (叠加显示、视频写入等) 通过 reader(name) 得到 FrameReader, read() 等待比上次更新的帧,
+  跳过的序号计入该消费者的"丢帧", 各阶段落后多少一目了然
+- 发布的帧按只读约定共享, 不复制; 需要修改 (绘制叠加) 的消费者自己复制
+- close() 唤醒所有等待的消费者, 表示流已结束
+"""
+import threading
+
+
+class LatestFrameSlot:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.seq = 0                # 最新帧序号, 0 表示还没有帧
+        self.frame = None
+        self.frame_ts = None
+        self.closed = False
+
+    def publish(self, frame, frame_ts) -> int:
+        """发布最新一帧 (调用后不得再修改 frame), 返回序号"""
+        with self.condition:
+            self.seq += 1
+            self.frame = frame
+            self.frame_ts = frame_ts
+            self.condition.notify_all()
+            return self.seq
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def latest(self):
+        """不等待, 返回 (seq, frame, frame_ts)"""
+        with self.condition:
+            return self.seq, self.frame, self.frame_ts
+
+    def wait_newer(self, after_seq: int, timeout: float = None):
+        """等待序号大于 after_seq 的帧, 返回 (seq, frame, frame_ts); 超时或已关闭时返回 None"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.seq > after_seq or self.closed, timeout):
+                return None
+            if self.seq <= after_seq:
+                return None
+            return self.seq, self.frame, self.frame_ts
+
+    def reader(self, name: str) -> "FrameReader":
+        return FrameReader(self, name)
+
+
+class FrameReader:
+    """一个消费者的读取位置与统计"""
+    def __init__(self, slot: LatestFrameSlot, name: str):
+        self.slot = slot
+        self.name = name
+        self.last_seq = slot.seq    # 只读取创建之后发布的帧
+        self.frames = 0
+        self.dropped = 0
+
+    def read(self, timeout: float = None):
+        """返回 (frame, frame_ts); 超时或流已结束时返回 None"""
+        item = self.slot.wait_newer(self.last_seq, timeout)
+        if item is None:
+            return None
+        seq, frame, frame_ts = item
+        self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frames += 1
+        return frame, frame_ts
+
+    def get_stats_str(self):
+        total = self.frames + self.dropped
+        ratio = f" ({self.dropped / total * 100:.1f}%)" if total else ""
+        return f"{self.name}: 处理 {self.frames} 帧, 丢帧 {self.dropped}{ratio}"
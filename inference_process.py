@@ -0,0 +1,189 @@
+"""在独立进程中运行 YOLO 推理, 帧经共享内存传递
+
+推理线程模式下, YOLO 前后处理和逐框的 Python 循环与 paho 网络线程、Textual 界面在同一进程中争抢 GIL,
+检测占满 CPU 时杆量、心跳和界面都会卡顿。INFERENCE_PROCESSES=N (N > 0) 时 InferenceServer
+为每个推理线程配一个 ProcessWorker:
+- 工作进程以 spawn 方式启动, 有自己的 ModelRegistry, 第一次推理时加载模型, 之后常驻
+- 每个工作进程一块 multiprocessing.shared_memory, 分为 max_batch 个帧槽; 主进程把一批帧各复制一次进帧槽,
+  只通过 Pipe 发送 (偏移, 形状, dtype) 描述, 不 pickle 4K 帧; 工作进程直接在共享内存上构造 ndarray 推理
+- 检测结果 (每帧若干个小 dict) 经同一 Pipe 返回; 工作进程的日志也经 Pipe 转给主进程的 writer
+- 帧大于帧槽时新建更大的共享内存并通知工作进程重新映射; 工作进程退出或超过 WORKER_TIMEOUT 无应答时
+  结束该进程, 下一批推理时重新启动 (计入"重启")
+主进程只做一次内存复制和少量反序列化, 统计复制耗时与往返耗时。
+"""
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+
+WORKER_TIMEOUT = 120.0          # 等待一批结果的最长时间(秒), 包含首次加载模型
+
+
+def _worker_main(conn, model_paths):
+    """工作进程入口"""
+    from inference_server import infer_batch
+    from model_registry import ModelRegistry
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    registry = ModelRegistry(writer=lambda *args: send(("log", " ".join(str(a) for a in args))))
+    shm = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        kind = message[0]
+        if kind == "stop":
+            break
+        if kind == "ring":
+            if shm is not None:
+                shm.close()
+            # spawn 子进程与主进程共用 resource_tracker, 共享内存由主进程 unlink
+            shm = shared_memory.SharedMemory(name=message[1])
+        elif kind == "prewarm":
+            registry.prewarm(*message[1])
+        elif kind == "infer":
+            _, batch_id, layout, class_sets = message
+            frames = [np.ndarray(shape, dtype, buffer=shm.buf, offset=offset) for offset, shape, dtype in layout]
+            try:
+                send(("result", batch_id, infer_batch(registry.get, model_paths, frames, class_sets)))
+            except Exception as e:
+                send(("error", batch_id, f"{type(e).__name__}: {e}"))
+            finally:
+                # 释放对共享内存的引用, 否则无法 close
+                del frames
+    if shm is not None:
+        shm.close()
+
+
+class ProcessWorker:
+    def __init__(self, model_paths, slots: int, name: str = "inference", writer=print):
+        """model_paths: (air2air 模型, 通用模型); 构造时不启动进程"""
+        self.model_paths = tuple(model_paths)
+        self.slots = slots
+        self.name = name
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.shm = None
+        self.slot_bytes = 0
+        self.batch_id = 0
+        # 统计
+        self.starts = 0
+        self.copy_time = RollingStats()
+        self.round_trip = RollingStats()
+
+    def _start(self):
+        """调用方持有 self.lock"""
+        ctx = mp.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, self.model_paths), name=self.name, daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.starts += 1
+        if self.shm is not None:
+            self.conn.send(("ring", self.shm.name))
+
+    def _ensure_started(self):
+        if self.process is None or not self.process.is_alive():
+            self._kill()
+            self._start()
+
+    def _kill(self):
+        """调用方持有 self.lock"""
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(timeout=2)
+            self.process = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _ensure_ring(self, nbytes):
+        """调用方持有 self.lock; 帧槽放不下时换一块更大的共享内存"""
+        if self.shm is not None and nbytes <= self.slot_bytes:
+            return
+        old = self.shm
+        self.slot_bytes = nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * nbytes)
+        self.conn.send(("ring", self.shm.name))
+        if old is not None:
+            # 工作进程已映射的旧内存在其 close 之前仍然有效
+            old.close()
+            old.unlink()
+
+    def prewarm(self, paths):
+        with self.lock:
+            self._ensure_started()
+            self.conn.send(("prewarm", list(paths)))
+
+    def infer(self, frames, class_sets):
+        """与 infer_batch 相同, 在工作进程中执行"""
+        with self.lock:
+            self._ensure_started()
+            t0 = time.perf_counter()
+            self._ensure_ring(max(frame.nbytes for frame in frames))
+            layout = []
+            for index, frame in enumerate(frames):
+                offset = index * self.slot_bytes
+                target = np.ndarray(frame.shape, frame.dtype, buffer=self.shm.buf, offset=offset)
+                np.copyto(target, frame)
+                layout.append((offset, frame.shape, frame.dtype.str))
+            del target
+            self.copy_time.add(time.perf_counter() - t0)
+            self.batch_id += 1
+            batch_id = self.batch_id
+            deadline = t0 + WORKER_TIMEOUT
+            try:
+                self.conn.send(("infer", batch_id, layout, [(set(d), set(n)) for d, n in class_sets]))
+            except OSError:
+                self._kill()
+                raise RuntimeError(f"{self.name} 推理进程已退出")
+            while True:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining <= 0 or not self.conn.poll(remaining):
+                        self._kill()
+                        raise RuntimeError(f"{self.name} 推理进程 {WORKER_TIMEOUT:g} 秒无应答, 已结束")
+                    message = self.conn.recv()
+                except (EOFError, OSError):
+                    self._kill()
+                    raise RuntimeError(f"{self.name} 推理进程已退出")
+                if message[0] == "log":
+                    self.writer(message[1])
+                    continue
+                if message[1] != batch_id:
+                    continue
+                self.round_trip.add(time.perf_counter() - t0)
+                if message[0] == "error":
+                    raise RuntimeError(message[2])
+                return message[2]
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None and self.process is not None and self.process.is_alive():
+                try:
+                    self.conn.send(("stop",))
+                    self.process.join(timeout=2)
+                except Exception:
+                    pass
+            self._kill()
+            if self.shm is not None:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = None
+
+    def get_stats_str(self):
+        state = "运行" if self.process is not None and self.process.is_alive() else "未运行"
+        return (f"{self.name} ({state}, pid {self.process.pid if self.process else '-'}): 启动 {self.starts} 次, "
+                f"帧槽 {self.slots} x {self.slot_bytes / 1e6:.1f} MB, "
+                + self.copy_time.format_ms("复制到共享内存") + ", " + self.round_trip.format_ms("往返"))
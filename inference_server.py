@@ -0,0 +1,275 @@
+"""进程内共享的批量 YOLO 推理服务
+
+原先每个 StreamPredictor 各自加载 yolo11s 与 air2air 两个模型, 在自己的工作线程里逐帧 (batch=1) 推理,
+三架无人机就是六份模型、三个推理线程争抢同一批 CPU 核。InferenceServer 每个进程、每组模型路径一个:
+- 每个模型只有一份, 由 ModelRegistry 在第一次推理时加载, 由一个推理线程使用; 视频流注册期间持有所需模型, 不会被空闲释放
+- 每路视频流注册一个 InferenceSlot, 只保留最新一帧; 推理跟不上时旧帧被覆盖 (计入"覆盖"), 不排队
+- 推理线程取到第一帧后最多再等 max_batch_latency 秒, 等其他活跃流送帧 (所有活跃流都有帧时立即开始),
+  把各流的最新帧合成一批做一次前向, 每批最多 max_batch 帧
+- 公平: 每批每路流最多一帧, 超过 max_batch 时按轮转顺序取, 下一批从上次之后的流开始
+- 各流的类别过滤不同: 每个模型只推理需要它的流的帧, 使用这些流类别的并集, 结果再按各流自己的类别过滤
+- 结果经 on_result(detections, frame_ts) 回调送回各流 (StreamPredictor 写入 shared['detections'])
+- INFERENCE_PROCESSES=N (N > 0) 时前向在 N 个工作进程中执行 (见 inference_process.py), 每个进程配一个推理线程,
+  帧经共享内存传递, 本进程不再为推理持有 GIL; 默认 0, 在本进程的推理线程中执行
+统计每批大小、从送帧到出结果的延迟、推理耗时与各流的处理帧数。
+"""
+import atexit
+import os
+import threading
+import time
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+from model_registry import ModelRegistry, get_model_registry
+
+# 凑批最长等待时间(秒), 可用环境变量覆盖
+MAX_BATCH_LATENCY = float(os.environ.get("INFERENCE_BATCH_LATENCY", "0.02"))
+# 推理工作进程数, 0 表示在本进程的推理线程中推理
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+MAX_BATCH = 8                   # 每批最多帧数
+IMGSZ = 512                     # 推理输入尺寸
+DRONE_CONF = 0.7                # air2air 模型置信度阈值
+NORMAL_CONF = 0.5               # 通用模型置信度阈值
+
+
+def _forward(model, frames, classes, conf):
+    results = model(frames, imgsz=IMGSZ, verbose=False, conf=conf, classes=sorted(classes))
+    names = model.names
+    per_frame = []
+    for result in results:
+        detections = []
+        for box in result.boxes:
+            cls_id = int(box.cls[0]); score = float(box.conf[0])
+            x1, y1, x2, y2 = [int(v) for v in box.xyxy[0]]
+            detections.append((cls_id, {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "label": names.get(cls_id, str(cls_id)), "conf": score}))
+        per_frame.append(detections)
+    return per_frame
+
+
+def infer_batch(get_model, model_paths, frames, class_sets):
+    """对一批帧推理, 推理线程与推理进程共用
+
+    get_model(path) 返回模型; model_paths: (air2air 模型, 通用模型);
+    class_sets: 每帧的 (drone_classes, normal_classes); 返回每帧的检测结果列表。
+    """
+    outputs = [[] for _ in frames]
+    # 先 air2air 模型, 再通用模型, 与原逐帧推理的结果顺序一致; 每个模型只推理需要它的流
+    for index, (path, conf) in enumerate(zip(model_paths, (DRONE_CONF, NORMAL_CONF))):
+        indices = [i for i, classes in enumerate(class_sets) if classes[index]]
+        if not indices:
+            continue
+        model = get_model(path)
+        union = set().union(*(class_sets[i][index] for i in indices))
+        for i, detections in zip(indices, _forward(model, [frames[i] for i in indices], union, conf)):
+            wanted = class_sets[i][index]
+            outputs[i].extend(det for cls_id, det in detections if cls_id in wanted)
+    return outputs
+
+
+class InferenceSlot:
+    """一路视频流在推理服务中的位置, 只保存最新一帧"""
+    def __init__(self, server, name, on_result, drone_classes, normal_classes, writer=print):
+        self.server = server
+        self.name = name
+        self.on_result = on_result
+        self.drone_classes = set(drone_classes)
+        self.normal_classes = set(normal_classes)
+        self.writer = writer
+        self.paths = []             # 持有的模型路径
+        self.frame = None
+        self.frame_ts = None
+        self.submitted_at = None
+        # 统计
+        self.submitted = 0
+        self.processed = 0
+        self.overwritten = 0
+        self.latency = RollingStats()
+
+    def submit(self, frame, frame_ts):
+        """送入最新一帧, 覆盖尚未推理的旧帧"""
+        self.server.submit(self, frame, frame_ts)
+
+    def close(self):
+        self.server.unregister(self)
+
+    def get_stats_str(self):
+        return (f"{self.name}: 送帧 {self.submitted}, 推理 {self.processed}, 覆盖 {self.overwritten}, "
+                + self.latency.format_ms("送帧到结果"))
+
+
+class InferenceServer:
+    def __init__(self, model_normal_path: str, model_drone_path: str, max_batch: int = MAX_BATCH,
+                 max_batch_latency: float = MAX_BATCH_LATENCY, registry: ModelRegistry = None,
+                 processes: int = INFERENCE_PROCESSES, writer=print):
+        """构造时不加载模型, 也不启动推理进程"""
+        self.model_normal_path = model_normal_path
+        self.model_drone_path = model_drone_path
+        self.registry = registry or get_model_registry()
+        if processes > 0:
+            from inference_process import ProcessWorker
+            self.workers = [ProcessWorker((model_drone_path, model_normal_path), max_batch, f"inference-{i}", writer)
+                            for i in range(processes)]
+            # 正常退出时结束推理进程并 unlink 共享内存
+            atexit.register(self.close)
+        else:
+            self.workers = [None]   # 本进程推理
+        self.threads = [None] * len(self.workers)     # 推理线程, 在条件变量下决定退出时置 None
+        self.max_batch = max_batch
+        self.max_batch_latency = max_batch_latency
+        self.writer = writer
+        self.condition = threading.Condition()
+        self.slots = []             # 注册顺序, 用于轮转
+        self.next_index = 0
+        # 统计
+        self.batches = 0
+        self.batch_sizes = RollingStats()
+        self.forward_time = RollingStats()
+
+    @property
+    def in_process(self) -> bool:
+        return self.workers[0] is None
+
+    def _model_paths(self, drone_classes, normal_classes):
+        """按类别过滤需要用到的模型路径"""
+        return ([self.model_drone_path] if drone_classes else []) + ([self.model_normal_path] if normal_classes else [])
+
+    def prewarm(self, drone_classes=(0,), normal_classes=(0, 2)):
+        """后台加载这些类别需要的模型 (推理进程模式下启动进程并在其中加载)"""
+        paths = self._model_paths(drone_classes, normal_classes)
+        if self.in_process:
+            self.registry.prewarm(*paths)
+            return
+        for worker in self.workers:
+            worker.prewarm(paths)
+
+    # --- 视频流注册 ---
+    def register(self, name, on_result, drone_classes=(0,), normal_classes=(0, 2), writer=print) -> InferenceSlot:
+        """on_result(detections, frame_ts) 在推理线程中调用"""
+        slot = InferenceSlot(self, name, on_result, drone_classes, normal_classes, writer)
+        if self.in_process:
+            slot.paths = self._model_paths(drone_classes, normal_classes)
+        for path in slot.paths:
+            self.registry.acquire(path)
+        with self.condition:
+            self.slots.append(slot)
+            # 每个工作进程 (或本进程) 一个推理线程; 已决定退出的线程在同一条件变量下清空了 self.threads[index]
+            for index in range(len(self.workers)):
+                if self.threads[index] is None:
+                    self.threads[index] = threading.Thread(target=self._run, args=(index,), daemon=True)
+                    self.threads[index].start()
+        return slot
+
+    def unregister(self, slot):
+        with self.condition:
+            if slot not in self.slots:
+                return
+            self.slots.remove(slot)
+            self.condition.notify_all()
+        for path in slot.paths:
+            self.registry.release(path)
+
+    def submit(self, slot, frame, frame_ts):
+        with self.condition:
+            if slot.frame is not None:
+                slot.overwritten += 1
+            else:
+                slot.submitted_at = time.perf_counter()
+            slot.frame = frame
+            slot.frame_ts = frame_ts
+            slot.submitted += 1
+            self.condition.notify_all()
+
+    def close(self):
+        """结束推理进程并释放共享内存"""
+        for worker in self.workers:
+            if worker is not None:
+                worker.close()
+
+    # --- 推理线程 ---
+    def _collect(self, index):
+        """等待并取出一批 (slot, frame, frame_ts, submitted_at); 没有注册的流时返回 None, 推理线程随即退出"""
+        with self.condition:
+            while True:
+                if not self.slots:
+                    # 在条件变量下登记退出, 之后的 register 会启动新线程
+                    self.threads[index] = None
+                    return None
+                ready = [slot for slot in self.slots if slot.frame is not None]
+                if ready:
+                    first = min(slot.submitted_at for slot in ready)
+                    remaining = first + self.max_batch_latency - time.perf_counter()
+                    if len(ready) >= min(len(self.slots), self.max_batch) or remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                else:
+                    self.condition.wait(1.0)
+            # 从上次之后的流开始轮转, 每路最多一帧
+            count = len(self.slots)
+            start = self.next_index % count
+            batch = []
+            for offset in range(count):
+                slot = self.slots[(start + offset) % count]
+                if slot.frame is None:
+                    continue
+                batch.append((slot, slot.frame, slot.frame_ts, slot.submitted_at))
+                slot.frame = None
+                self.next_index = (start + offset + 1) % count
+                if len(batch) >= self.max_batch:
+                    break
+            return batch
+
+    def _run(self, index):
+        worker = self.workers[index]
+        model_paths = (self.model_drone_path, self.model_normal_path)
+        while True:
+            batch = self._collect(index)
+            if batch is None:
+                return
+            frames = [frame for _, frame, _, _ in batch]
+            class_sets = [(slot.drone_classes, slot.normal_classes) for slot, _, _, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                if worker is None:
+                    outputs = infer_batch(self.registry.get, model_paths, frames, class_sets)
+                else:
+                    outputs = worker.infer(frames, class_sets)
+            except Exception as e:
+                self.writer(f"Inference error: {e}")
+                outputs = [[] for _ in batch]
+            done = time.perf_counter()
+            self.batches += 1
+            self.batch_sizes.add(len(batch))
+            self.forward_time.add(done - t0)
+            for (slot, _, frame_ts, submitted_at), detections in zip(batch, outputs):
+                slot.processed += 1
+                slot.latency.add(done - submitted_at)
+                try:
+                    slot.on_result(detections, frame_ts)
+                except Exception as e:
+                    slot.writer(f"Inference callback error: {e}")
+
+    def get_stats_str(self):
+        mean = self.batch_sizes.mean()
+        lines = [f"推理服务: 活跃流 {len(self.slots)}, 批次 {self.batches}, 平均批大小 {mean:.2f}" if mean is not None
+                 else f"推理服务: 活跃流 {len(self.slots)}, 批次 0",
+                 self.forward_time.format_ms("每批推理")]
+        lines.extend(slot.get_stats_str() for slot in list(self.slots))
+        if self.in_process:
+            lines.append(self.registry.get_stats_str())
+        else:
+            lines.extend(worker.get_stats_str() for worker in self.workers)
+        return "\n".join(lines)
+
+
+_lock = threading.Lock()
+_servers = {}
+
+
+def get_inference_server(model_normal_path: str, model_drone_path: str, max_batch_latency: float = MAX_BATCH_LATENCY,
+                         writer=print) -> InferenceServer:
+    """每组模型路径一个推理服务, 模型在首次推理时加载; max_batch_latency 以首次创建时为准"""
+    key = (model_normal_path, model_drone_path)
+    with _lock:
+        server = _servers.get(key)
+        if server is None:
+            server = InferenceServer(model_normal_path, model_drone_path, max_batch_latency=max_batch_latency, writer=writer)
+            _servers[key] = server
+        return server
@@ -0,0 +1,189 @@
+"""进程内 YOLO 模型注册表: 首次推理时加载、跨 StreamPredictor 重启保持、空闲后释放
+
+原先 DJIMQTTClient 启动时就构造 StreamPredictor 并立即加载两个模型, 每次打开直播检测 (菜单 s)
+又重新构造、重新加载一遍; 终端启动时间和内存都花在了没人打开的检测上。ModelRegistry 每个进程一个:
+- get(path): 第一次真正推理时才加载, 同一路径只加载一次 (并发调用等待同一次加载)
+- acquire(path) / release(path): 使用方 (InferenceServer 中的视频流) 登记持有, 持有期间不会被释放
+- prewarm(path): 后台线程提前加载, 例如打开直播检测时与 RTMP 连接并行;
+  MODEL_PREWARM=1 时 DJIMQTTClient 启动后即在后台预热
+- 无人持有且超过 MODEL_IDLE_TIMEOUT 秒未推理的模型被释放, 下次使用时重新加载; 0 表示不释放
+统计每个模型的加载次数、加载耗时、使用次数与释放次数。
+"""
+import gc
+import os
+import threading
+import time
+from CluodAPI_Terminal_Client.link_metrics import RollingStats
+
+# 无人持有的模型空闲多久后释放(秒), 0 表示不释放
+MODEL_IDLE_TIMEOUT = float(os.environ.get("MODEL_IDLE_TIMEOUT", "300"))
+# MODEL_PREWARM=1 时客户端启动后在后台预热检测模型
+MODEL_PREWARM = os.environ.get("MODEL_PREWARM", "0") == "1"
+MODEL_CHECK_INTERVAL = 10.0     # 空闲检查间隔(秒)
+
+
+def _load_yolo(path):
+    # 在这里才导入 ultralytics (连带 torch), 终端启动时不为没人打开的检测付出导入开销
+    from ultralytics import YOLO
+    return YOLO(path)
+
+
+class ModelEntry:
+    def __init__(self, path):
+        self.path = path
+        self.model = None
+        self.loading = None         # 加载中时为 threading.Event
+        self.error = None
+        self.holders = 0
+        self.last_used = time.perf_counter()
+        # 统计
+        self.loads = 0
+        self.uses = 0
+        self.evictions = 0
+        self.load_time = RollingStats()
+
+
+class ModelRegistry:
+    def __init__(self, idle_timeout: float = MODEL_IDLE_TIMEOUT, loader=None, writer=print):
+        """loader(path) 加载模型, 默认 ultralytics.YOLO (首次加载时才导入)"""
+        self.idle_timeout = idle_timeout
+        self.loader = loader or _load_yolo
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.entries = {}           # path -> ModelEntry
+        self.janitor = None
+        self.stop_event = threading.Event()
+
+    def _entry(self, path) -> ModelEntry:
+        """调用方持有 self.lock"""
+        entry = self.entries.get(path)
+        if entry is None:
+            entry = self.entries[path] = ModelEntry(path)
+        return entry
+
+    def get(self, path):
+        """返回已加载的模型, 未加载时在当前线程加载 (其他线程正在加载时等待其结果)"""
+        with self.lock:
+            entry = self._entry(path)
+            entry.last_used = time.perf_counter()
+            entry.uses += 1
+            if entry.model is not None:
+                return entry.model
+            loading = entry.loading
+            if loading is None:
+                loading = entry.loading = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            self._load(entry, loading)
+        else:
+            loading.wait()
+        with self.lock:
+            if entry.model is None:
+                raise RuntimeError(f"模型加载失败 {path}: {entry.error}")
+            return entry.model
+
+    def _load(self, entry, loading):
+        t0 = time.perf_counter()
+        model = error = None
+        try:
+            model = self.loader(entry.path)
+        except Exception as e:
+            error = e
+        with self.lock:
+            entry.model = model
+            entry.error = error
+            entry.loading = None
+            if model is not None:
+                entry.loads += 1
+                entry.load_time.add(time.perf_counter() - t0)
+                entry.last_used = time.perf_counter()
+        loading.set()
+        if error is not None:
+            self.writer(f"模型加载失败 {entry.path}: {error}")
+        else:
+            self._start_janitor()
+
+    def prewarm(self, *paths):
+        """后台加载尚未加载的模型, 立即返回"""
+        def run():
+            for path in paths:
+                try:
+                    self.get(path)
+                except Exception:
+                    pass    # 已在 _load 中打印
+        with self.lock:
+            if all(self._entry(path).model is not None for path in paths):
+                return
+        threading.Thread(target=run, daemon=True).start()
+
+    def acquire(self, path):
+        with self.lock:
+            self._entry(path).holders += 1
+
+    def release(self, path):
+        with self.lock:
+            entry = self._entry(path)
+            entry.holders = max(0, entry.holders - 1)
+            entry.last_used = time.perf_counter()
+
+    def is_loaded(self, path) -> bool:
+        with self.lock:
+            entry = self.entries.get(path)
+            return entry is not None and entry.model is not None
+
+    # --- 空闲释放 ---
+    def _start_janitor(self):
+        if self.idle_timeout <= 0:
+            return
+        with self.lock:
+            if self.janitor is not None:
+                return
+            self.janitor = threading.Thread(target=self._janitor, daemon=True)
+            self.janitor.start()
+
+    def _janitor(self):
+        while not self.stop_event.wait(min(MODEL_CHECK_INTERVAL, self.idle_timeout)):
+            self.evict_idle()
+            with self.lock:
+                # 没有已加载的模型时退出, 下次加载后重新启动
+                if not any(entry.model is not None for entry in self.entries.values()):
+                    self.janitor = None
+                    return
+
+    def evict_idle(self, now: float = None):
+        """释放无人持有且空闲超过 idle_timeout 的模型"""
+        now = now if now is not None else time.perf_counter()
+        evicted = []
+        with self.lock:
+            for entry in self.entries.values():
+                if entry.model is not None and entry.holders == 0 and now - entry.last_used >= self.idle_timeout:
+                    entry.model = None
+                    entry.evictions += 1
+                    evicted.append(entry.path)
+        if evicted:
+            gc.collect()
+            self.writer(f"释放空闲模型: {', '.join(evicted)}")
+
+    def get_stats_str(self):
+        with self.lock:
+            entries = list(self.entries.values())
+        lines = []
+        for entry in entries:
+            state = "已加载" if entry.model is not None else ("加载中" if entry.loading is not None else "未加载")
+            lines.append(f"{entry.path}: {state}, 持有 {entry.holders}, 加载 {entry.loads} 次, 释放 {entry.evictions} 次, "
+                         f"使用 {entry.uses} 次, " + entry.load_time.format_ms("加载耗时"))
+        return "\n".join(lines) if lines else "模型: 未使用"
+
+
+_lock = threading.Lock()
+_registry = None
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    with _lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -1,4 +1,6 @@
-from CluodAPI_Terminal_Client.single_client_mqtt import DJIMQTTClient
+from CluodAPI_Terminal_Client.single_client_mqtt import DJIMQTTClient, host_addr, username, password
+from CluodAPI_Terminal_Client.fleet_connection import FleetConnection
+import os
 import threading
 import time
 import sys
@@ -7,6 +9,9 @@ from CluodAPI_Terminal_Client.menu_control import MenuControl
 from textual.widgets import RichLog
 
 
+# FLEET_MODE=1 时所有无人机共用一条 MQTT 连接
+FLEET_MODE = os.environ.get("FLEET_MODE", "0") == "1"
+
 points_list = [None, None, None]
 
 points_list[0] = get_points_from_txt("uav1.txt", 80)
@@ -14,12 +19,18 @@ points_list[1] = get_points_from_txt("uav2.txt", 90)
 points_list[2] = get_points_from_txt("uav3.txt", 100)
 
 class MAIN_CONTROL_Client:
-    def __init__(self, client_num: int, is_deamon: bool = True, main_log: RichLog = None, sub_log_list: list = None):
+    def __init__(self, client_num: int, is_deamon: bool = True, main_log: RichLog = None, sub_log_list: list = None,
+                 fleet_mode: bool = FLEET_MODE, sn_list: list = None, fleet_client=None):
         self.uav_select_num = 99
         self.client_num = client_num
         self.clients = []
+        self.fleet = None
+        if fleet_mode:
+            self.fleet = FleetConnection(host_addr, username, password, is_deamon=is_deamon,
+                                         writer=main_log.write if main_log else print, client=fleet_client)
         for i in range(self.client_num):
-            client = DJIMQTTClient(i, is_deamon=is_deamon, main_log=main_log, per_log=sub_log_list[i] if sub_log_list else None)
+            client = DJIMQTTClient(i, is_deamon=is_deamon, main_log=main_log, per_log=sub_log_list[i] if sub_log_list else None,
+                                   fleet=self.fleet, sn=sn_list[i] if sn_list else None)
             self.clients.append(client)  
         self.main_log : RichLog = main_log
         self.main_menu = MenuControl(writer=self.main_log.write if self.main_log else print) 
@@ -76,12 +87,17 @@ class MAIN_CONTROL_Client:
         self.menu_now.menu_reset()
         
     def run(self):
+        if self.fleet is not None:
+            self.fleet.run()
         for client in self.clients:
             client.run()
         time.sleep(0.5)
         # self.start_keyboard_listener()
 
     def disconnect(self):
+        if self.fleet is not None:
+            self.fleet.disconnect()
+            return
         for client in self.clients:
             client.client.disconnect()
     
@@ -236,7 +252,7 @@ class MAIN_CONTROL_Client:
             elif state_count == 1:
                 self.user_input = user_input
                 id = int(self.user_input)
-                self.clients[id-1].ser_puberlisher.publish_flyto_list_command(points_list[0])
+                self.clients[id-1].ser_puberlisher.publish_flyto_mission(points_list[0])
                 return 0
         except ValueError:
             self.main_log.write("输入错误,请重新输入!")
@@ -250,7 +266,7 @@ class MAIN_CONTROL_Client:
             elif state_count == 1:
                 self.user_input = user_input
                 id = int(self.user_input)
-                self.clients[id-1].ser_puberlisher.publish_flyto_list_command(points_list[1])
+                self.clients[id-1].ser_puberlisher.publish_flyto_mission(points_list[1])
                 return 0
         except ValueError:
             self.main_log.write("输入错误,请重新输入!")
@@ -264,7 +280,7 @@ class MAIN_CONTROL_Client:
             elif state_count == 1:
                 self.user_input = user_input
                 id = int(self.user_input)
-                self.clients[id-1].ser_puberlisher.publish_flyto_list_command(points_list[2])
+                self.clients[id-1].ser_puberlisher.publish_flyto_mission(points_list[2])
                 return 0
         except ValueError:
             self.main_log.write("输入错误,请重新输入!")
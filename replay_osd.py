@@ -0,0 +1,92 @@
+"""OSD 记录回放工具
+
+把 out/osd_data_*.json / .osdc 中记录的现场遥测送入真实的 DJIMQTTClient 处理逻辑, 用于离线复现与吞吐测量。
+
+使用示例:
+    python replay_osd.py                                        # 1 倍速, 直接调用 DJIMQTTClient.on_message
+    python replay_osd.py --speed 0                              # 不等待, 测量接收吞吐
+    python replay_osd.py --via loopback --speed 4               # 经进程内 broker 替身 + 机群路由回放
+    python replay_osd.py --video out/output.mp4 --uav 0         # 同时离线运行 StreamPredictor.get_target_pos
+TUI 回放: python TUI_multi_control.py --replay "CluodAPI_Terminal_Client/out/osd_data_*.json" --speed 2
+
+回放不会连接真实的 MQTT broker, 未设置 HOST_ADDR/USERNAME/PASSWORD 时使用占位值。
+"""
+import argparse
+import glob
+import os
+import sys
+
+for _name, _value in (("HOST_ADDR", "127.0.0.1"), ("USERNAME", "replay"), ("PASSWORD", "replay")):
+    os.environ.setdefault(_name, _value)
+
+from CluodAPI_Terminal_Client.single_client_mqtt import DJIMQTTClient, gateway_sn, host_addr, username, password
+from CluodAPI_Terminal_Client.fleet_connection import FleetConnection
+from CluodAPI_Terminal_Client.loopback_broker import LoopbackBroker, LoopbackClient, LoopbackMessage
+from CluodAPI_Terminal_Client.osd_replay import OSDReplayer, assign_sources
+from stream_predict import StreamPredictor
+
+DEFAULT_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CluodAPI_Terminal_Client", "out", "osd_data_*.json")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="OSD 记录回放工具")
+    p.add_argument("files", nargs="*", default=[DEFAULT_FILES], help="回放的记录文件 (支持 glob, 文件名中的编号对应无人机编号)")
+    p.add_argument("--speed", type=float, default=1.0, help="回放倍速, 0 表示尽可能快")
+    p.add_argument("--max-gap", type=float, default=5.0, help="超过该秒数的记录空档压缩为该值")
+    p.add_argument("--via", choices=("direct", "loopback"), default="direct", help="direct: 直接调用 on_message; loopback: 经进程内 broker 与机群路由")
+    p.add_argument("--video", type=str, default=None, help="同时用该视频(本地文件/RTMP)运行 StreamPredictor 目标定位")
+    p.add_argument("--uav", type=int, default=0, help="--video 对应的无人机编号")
+    p.add_argument("--show", action="store_true", help="--video 时显示检测窗口")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = []
+    for pattern in args.files:
+        paths.extend(sorted(glob.glob(pattern)))
+    if not paths:
+        print(f"[error] 未找到记录文件: {args.files}")
+        return 2
+    assigned = assign_sources(paths, gateway_sn)
+
+    fleet = None
+    if args.via == "loopback":
+        broker = LoopbackBroker()
+        fleet = FleetConnection(host_addr, username, password, client=LoopbackClient(broker, "fleet"))
+    clients = {}
+    for code, sn, path in assigned:
+        clients[code] = DJIMQTTClient(code, fleet=fleet, sn=sn)
+        print(f"[info] UAV{code + 1} ({sn}) <- {path}")
+
+    if fleet is not None:
+        fleet.run()
+        sink = LoopbackClient(broker, "replay").publish
+    else:
+        handlers = {f"thing/product/{client.gateway_sn}/drc/up": client.on_message for client in clients.values()}
+        def sink(topic, payload):
+            handlers[topic](None, None, LoopbackMessage(topic, payload))
+
+    predictor = None
+    if args.video:
+        predictor = StreamPredictor(args.video, show_window=args.show, flight_state=clients[args.uav].flight_state, is_get_pos=True)
+        predictor.start_in_thread()
+
+    replayer = OSDReplayer({sn: path for _, sn, path in assigned}, speed=args.speed, max_gap=args.max_gap)
+    try:
+        replayer.run(sink)
+    except KeyboardInterrupt:
+        print("[info] 用户中断回放")
+    print(f"[info] 回放结束: {replayer.get_stats_str()}")
+    for code, client in clients.items():
+        print(f"[info] UAV{code + 1} 分发 {client.dispatcher.dispatched} 条, 跳过 {client.dispatcher.skipped} 条")
+        print(client.flight_state.get_uav_info_str())
+    if predictor is not None:
+        predictor.stop()
+    if fleet is not None:
+        fleet.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
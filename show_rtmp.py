@@ -7,11 +7,13 @@
 4. 可选保存到文件 (--save out.flv / --record-dir 目录分段保存)
 5. 支持无窗口模式 (--headless) 仅统计与测试可用性
 6. 超时与空帧处理 (--open-timeout, --read-timeout)
+7. 解码后端 (--decoder opencv|ffmpeg), ffmpeg 后端可在解码端缩放 (--scale)
 
 使用示例:
 	python show_rtmp.py --url rtmp://81.70.222.38:1935/live/Drone001
 	python show_rtmp.py --url rtmp://x/live/stream --reconnect --max-retries 5
 	python show_rtmp.py --url rtmp://x/live/stream --save out.mp4
+	python show_rtmp.py --url rtmp://x/live/stream --decoder ffmpeg --scale 1280x720
 
 退出: 窗口按 'q' 或 Ctrl+C。
 """
@@ -24,6 +26,7 @@ import os
 import sys
 from pathlib import Path
 from typing import Optional
+from video_capture import open_video_capture, parse_size, VIDEO_DECODER
 
 try:
 	from fps_counter import FPSCounter
@@ -59,6 +62,8 @@ def parse_args(argv=None):
 	p.add_argument("--record-dir", type=str, default=None, help="分段保存到目录 (每 N 秒一个文件) 未实现占位")
 	p.add_argument("--segment-seconds", type=int, default=0, help="分段保存长度(秒) 0=禁用")
 	p.add_argument("--print-every", type=int, default=60, help="每 N 帧打印一次信息")
+	p.add_argument("--decoder", choices=("opencv", "ffmpeg"), default=VIDEO_DECODER, help="解码后端 (默认取 VIDEO_DECODER 环境变量)")
+	p.add_argument("--scale", type=str, default=None, help="ffmpeg 后端解码端缩放, 如 1280x720")
 	return p.parse_args(argv)
 
 
@@ -91,20 +96,21 @@ class StreamRecorder:
 			self.writer = None
 
 
-def open_capture(url: str, timeout: float) -> Optional[cv2.VideoCapture]:
+def open_capture(url: str, timeout: float, decoder: str = "opencv", size=None) -> Optional[cv2.VideoCapture]:
 	start = time.time()
-	cap = cv2.VideoCapture(url)
+	cap = open_video_capture(url, decoder, size)
 	while not cap.isOpened():
 		if time.time() - start > timeout:
 			cap.release()
 			return None
 		time.sleep(0.5)
-		cap = cv2.VideoCapture(url)
+		cap = open_video_capture(url, decoder, size)
 	return cap
 
 
 def run_stream(args):
-	cap = open_capture(args.url, args.open_timeout)
+	size = parse_size(args.scale)
+	cap = open_capture(args.url, args.open_timeout, args.decoder, size)
 	if cap is None:
 		print(f"[error] 打开流失败: {args.url}")
 		return 2
@@ -142,7 +148,7 @@ def run_stream(args):
 						print("[error] 达到最大重连次数，退出。")
 						break
 					time.sleep(args.retry_interval)
-					cap = open_capture(args.url, args.open_timeout)
+					cap = open_capture(args.url, args.open_timeout, args.decoder, size)
 					if cap is None:
 						print("[error] 重连失败，退出。")
 						break
@@ -185,6 +191,8 @@ def run_stream(args):
 		# if frame_idx % max(1, args.print_every) == 0:
 		# 	print(f"[info] 帧:{frame_idx} FPS:{fps_counter.get_fps()} size:{frame.shape[1]}x{frame.shape[0]}")
 
+	if hasattr(cap, "get_stats_str"):
+		print(f"[info] {cap.get_stats_str()}")
 	cap.release()
 	if recorder:
 		recorder.close()
@@ -0,0 +1,50 @@
+"""网关/无人机模拟器
+
+连接真实 broker (HOST_ADDR/USERNAME/PASSWORD) 模拟任意数量的 DJI 网关, 客户端无需改动即可联调和压测。
+
+使用示例:
+    python sim_gateway.py --uav 3 --sn 9N9CN2J0012CXY 9N9CN8400164WH 9N9CN180011TJN    # 冒充现有三台网关
+    python sim_gateway.py --uav 200 --osd-freq 10                                      # 200 架, SIM 开头的序列号
+客户端连接模拟机群: MAIN_CONTROL_Client(200, sn_list=GatewaySimulator.make_sn_list(200))
+"""
+import argparse
+import os
+import sys
+import time
+import paho
+import paho.mqtt.client as mqtt
+from CluodAPI_Terminal_Client.gateway_sim import GatewaySimulator
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="DJI 网关/无人机模拟器")
+    p.add_argument("--uav", type=int, default=3, help="模拟的无人机数量")
+    p.add_argument("--sn", nargs="*", default=None, help="指定网关序列号, 默认 SIM00000000000 起")
+    p.add_argument("--osd-freq", type=int, default=50, help="初始 OSD 频率 (Hz), drc_mode_enter 会按请求修改")
+    p.add_argument("--state-rate", type=float, default=2.0, help="状态/电池推送频率 (Hz)")
+    p.add_argument("--tick", type=float, default=100.0, help="仿真步进频率 (Hz)")
+    p.add_argument("--port", type=int, default=1883)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    host_addr = os.environ.get("HOST_ADDR", "127.0.0.1")
+    sn_list = args.sn if args.sn else GatewaySimulator.make_sn_list(args.uav)
+    client = mqtt.Client(paho.mqtt.enums.CallbackAPIVersion.VERSION2, client_id="gateway_sim", transport="tcp")
+    client.username_pw_set(os.environ.get("USERNAME", ""), os.environ.get("PASSWORD", ""))
+    sim = GatewaySimulator(sn_list, client, tick_hz=args.tick, state_rate=args.state_rate, osd_frequency=args.osd_freq)
+    sim.start(host_addr, args.port)
+    print(f"[info] 模拟 {len(sn_list)} 架无人机, broker {host_addr}:{args.port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"[info] {sim.get_stats_str()}")
+    except KeyboardInterrupt:
+        print("[info] 用户中断")
+    sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
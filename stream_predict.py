@@ -1,21 +1,26 @@
-from ultralytics import YOLO
 import cv2
 import os
 from fps_counter import FPSCounter
 import logging
 import threading
-import queue
 import time
 from DroneGeoLocator import DroneGeoLocator
+from inference_server import InferenceServer, get_inference_server, MAX_BATCH_LATENCY
+from frame_slot import LatestFrameSlot
+from video_capture import open_video_capture, parse_size, VIDEO_DECODER
 from CluodAPI_Terminal_Client.fly_utils import FlightState
 import paho
 import paho.mqtt.client as mqtt
-import json
+from CluodAPI_Terminal_Client import json_codec
 
 logging.getLogger("ultralytics").setLevel(logging.ERROR)
 
 # 默认 RTMP 源（可通过类参数覆盖）
 source = "rtmp://81.70.222.38:1935/live/Drone001"
+# RTMP 画面相对遥测的延迟(秒), 帧采集时刻 = 读到帧的时刻 - 该值
+STREAM_LATENCY = float(os.environ.get("STREAM_LATENCY", "0.4"))
+# ffmpeg 后端解码端缩放尺寸, 如 "1280x720", 空为原尺寸
+VIDEO_DECODE_SIZE = parse_size(os.environ.get("VIDEO_DECODE_SIZE", ""))
 
 
 class StreamPredictor:
@@ -25,6 +30,11 @@ class StreamPredictor:
         predictor = StreamPredictor(rtmp_url)
         predictor.run()  # 阻塞直到用户按 'q' 或 stop()
         predictor.stop() # 可在外部调用以提前结束
+
+    推理由进程内共享的 InferenceServer 完成: 同一组模型路径的所有 StreamPredictor 共用一份模型,
+    各流的最新帧合批推理, 结果回调写入 shared['detections']。
+    采集线程只解码并发布最新帧 (LatestFrameSlot), 叠加显示与视频写入各自一个线程读取最新帧,
+    慢的阶段只会丢自己的帧, 不拖慢采集; get_stats_str() 给出各阶段丢帧数。
     """
 
     def __init__(
@@ -32,7 +42,6 @@ class StreamPredictor:
         rtmp_url: str,
         model_normal_path: str = "model/yolo11s",
         model_drone_path: str = "model/air2air_det_db-yolo11s_i512_c2.pt",
-        max_queue: int = 2,
         window_name: str = "RTMP Stream",
         drone_classes=(0,),
         normal_classes=(0, 2),
@@ -43,29 +52,43 @@ class StreamPredictor:
         save_video: bool = False,
         save_path: str = "out/output.mp4",
         is_get_pos: bool = False,
+        stream_latency: float = STREAM_LATENCY,
+        inference_server: InferenceServer = None,
+        max_batch_latency: float = MAX_BATCH_LATENCY,
+        decoder: str = VIDEO_DECODER,
+        decode_size=VIDEO_DECODE_SIZE,
     ) -> None:
         self.is_get_pos = is_get_pos
+        self.stream_latency = stream_latency
         self.rtmp_url = rtmp_url
         self.window_name = window_name
         self.show_window = show_window
-        # 加载模型（懒加载可再扩展）
-        self.model_normal = YOLO(model_normal_path)
-        self.model_drone = YOLO(model_drone_path)
+        # 解码后端 (opencv / ffmpeg) 与 ffmpeg 解码端缩放尺寸 (宽, 高)
+        self.decoder = decoder
+        self.decode_size = decode_size
+        # 共享推理服务, 模型由 ModelRegistry 在第一次推理时加载, 构造本身不加载
+        self.inference_server = inference_server or get_inference_server(model_normal_path, model_drone_path, max_batch_latency, writer)
         self.drone_classes = list(drone_classes)
         self.normal_classes = list(normal_classes)
 
-        # FPS 计数器
-        self.fps_counter = FPSCounter(); self.fps_counter.start()
-        self.inference_fps_counter = FPSCounter(); self.inference_fps_counter.start()
+        # FPS 计数器, run() 时启动
+        self.fps_counter = FPSCounter()
+        self.inference_fps_counter = FPSCounter()
 
-        # 共享状态与队列、线程控制
-        self.frame_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # 共享状态与推理服务中的位置、线程控制
+        self.slot = None
+        self.last_slot = None       # stop() 注销的 slot, 只用于统计
         # 支持传入跨进程 Event（如 mp.Event），用于父进程控制停止
         self.stop_event = stop_event or threading.Event()
         self.out_lock = threading.Lock()
-        self.shared = {"detections": [], "ts": None}
-        self.worker: threading.Thread | None = None
+        self.shared = {"detections": [], "ts": None, "frame_ts": None}
         self.cap: cv2.VideoCapture | None = None
+        # 采集线程发布最新帧, 叠加显示线程发布叠加后的帧给视频写入线程
+        self.frames = LatestFrameSlot()
+        self.display_frames = LatestFrameSlot()
+        self.readers = []
+        self.capture_thread: threading.Thread | None = None
+        self.recorder_thread: threading.Thread | None = None
         # 保存主循环线程句柄，便于非阻塞启动
         self.main_thread: threading.Thread | None = None
         self.locator = DroneGeoLocator(
@@ -87,53 +110,29 @@ class StreamPredictor:
         self.latest_liveview = None
 
     # --- 推理相关 ---
-    def _run_inference_on_frame(self, frame):
-        detections = []
-        try:
-            # drone 专注模型
-            result_drone = self.model_drone(frame, imgsz=512, verbose=False, conf=0.7, classes=self.drone_classes)
-            for box in result_drone[0].boxes:
-                cls_id = int(box.cls[0]); conf = float(box.conf[0])
-                x1, y1, x2, y2 = [int(v) for v in box.xyxy[0]]
-                label = self.model_drone.names.get(cls_id, str(cls_id))
-                detections.append({"x1": x1, "y1": y1, "x2": x2, "y2": y2, "label": label, "conf": conf})
-
-            # 通用模型
-            results_normal = self.model_normal(frame, classes=self.normal_classes, imgsz=512, verbose=False, vid_stride=1, conf=0.5)
-            for box in results_normal[0].boxes:
-                cls_id = int(box.cls[0]); conf = float(box.conf[0])
-                x1, y1, x2, y2 = [int(v) for v in box.xyxy[0]]
-                label = self.model_normal.names.get(cls_id, str(cls_id))
-                detections.append({"x1": x1, "y1": y1, "x2": x2, "y2": y2, "label": label, "conf": conf})
-        except Exception as e:
-            self.writer(f"Inference error: {e}")
-        return detections
-
-    def _inference_worker(self):
-        while not self.stop_event.is_set():
-            try:
-                frame = self.frame_queue.get(timeout=0.5)
-            except queue.Empty:
-                continue
-            detections = self._run_inference_on_frame(frame)
-            self.inference_fps_counter.increment()
-            with self.out_lock:
-                self.shared['detections'] = detections
-                self.shared['ts'] = time.time()
-            try:
-                self.frame_queue.task_done()
-            except Exception:
-                pass
+    def _on_inference_result(self, detections, frame_ts):
+        """推理服务线程回调"""
+        self.inference_fps_counter.increment()
+        with self.out_lock:
+            self.shared['detections'] = detections
+            self.shared['ts'] = time.time()
+            self.shared['frame_ts'] = frame_ts
 
     def _start_worker(self):
-        if self.worker and self.worker.is_alive():
+        if self.slot is not None:
             return
-        self.worker = threading.Thread(target=self._inference_worker, daemon=True)
-        self.worker.start()
+        self.slot = self.inference_server.register(self.rtmp_url, self._on_inference_result,
+                                                   self.drone_classes, self.normal_classes, self.writer)
+
+    def prewarm(self):
+        """后台加载本实例需要的模型"""
+        self.inference_server.prewarm(self.drone_classes, self.normal_classes)
 
     # --- 主循环 ---
     def run(self):
-        self.cap = cv2.VideoCapture(self.rtmp_url)
+        # 模型加载与 RTMP 连接并行
+        self.prewarm()
+        self.cap = open_video_capture(self.rtmp_url, self.decoder, self.decode_size)
         if not self.cap.isOpened():
             self.writer(f"错误: 无法打开RTMP流 {self.rtmp_url}")
             return
@@ -162,83 +161,159 @@ class StreamPredictor:
             except Exception as e:
                 self.writer(f"初始化视频写入器失败: {e}")
         self._start_worker()
-        font = cv2.FONT_HERSHEY_SIMPLEX; scale = 0.8; thickness = 2; margin = 6
+        self.fps_counter.start()
+        self.inference_fps_counter.start()
+        # 各消费者在第一帧发布之前创建读取位置
+        overlay_reader = self.frames.reader("叠加显示")
+        self.readers = [overlay_reader]
+        if self.video_writer is not None:
+            recorder_reader = self.display_frames.reader("视频写入")
+            self.readers.append(recorder_reader)
+            self.recorder_thread = threading.Thread(target=self._recorder_loop, args=(recorder_reader,), daemon=True)
+            self.recorder_thread.start()
+        self._publish_frame(frame)
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
+        try:
+            self._overlay_loop(overlay_reader)
+        except KeyboardInterrupt:
+            self.writer("用户中断提取过程")
+        except Exception as e:
+            self.writer(f"发生错误: {e}")
+        finally:
+            self.stop()
+
+    def _publish_frame(self, frame):
+        """采集线程: 发布最新帧并送入推理服务, 均不复制"""
+        frame_ts = time.time() - self.stream_latency
+        self.fps_counter.increment()
+        self.frames.publish(frame, frame_ts)
+        # 推理服务只保留每路最新一帧, 覆盖尚未推理的旧帧 (计入推理阶段的"覆盖")
+        slot = self.slot
+        if slot is not None:
+            slot.submit(frame, frame_ts)
+
+    def _capture_loop(self):
+        """只负责解码, 不受显示和编码速度影响; cap 由本线程释放"""
+        # 本地视频文件按原帧率读取 (直播流由源端控制节奏), 避免以解码速度跑完
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if os.path.isfile(self.rtmp_url) else 0
+        period = 1.0 / fps if fps and fps > 0 else 0.0
+        next_ts = time.perf_counter()
         try:
             while not self.stop_event.is_set():
+                if period:
+                    next_ts += period
+                    delay = next_ts - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
                 ret, frame = self.cap.read()
                 if not ret or frame is None:
                     self.writer("无法读取帧或流已结束")
                     break
-                self.fps_counter.increment()
-                display = frame.copy()
-                info_fps = f"FPS: {self.fps_counter.get_fps()}"
-                info_inference_fps = f"Inference FPS: {self.inference_fps_counter.get_fps()}"
-                info_resolution = f"Resolution: {self.locator.image_width}x{self.locator.image_height}"
-                (w1, h1), _ = cv2.getTextSize(info_fps, font, scale, thickness)
-                (w2, h2), _ = cv2.getTextSize(info_inference_fps, font, scale, thickness)
-                (w3, h3), _ = cv2.getTextSize(info_resolution, font, scale, thickness)
-                rect_w = max(w1, w2, w3) + margin * 2
-                rect_h = h1 + h2 + h3 + margin * 4
-                cv2.rectangle(display, (5, 5), (5 + rect_w, 5 + rect_h), (0, 0, 0), -1)
-                cv2.putText(display, info_fps, (10, 10 + h1), font, scale, (0, 255, 0), thickness)
-                cv2.putText(display, info_inference_fps, (10, 10 + h1 + h2 + margin), font, scale, (0, 255, 255), thickness)
-                cv2.putText(display, info_resolution, (10, 10 + h1 + h2 + h3 + margin * 2), font, scale, (255, 255, 0), thickness)
-                # 获取最新检测结果
-                with self.out_lock:
-                    detections = list(self.shared.get('detections', []))
-                if detections:
-                    if self.show_window:
-                        self.draw_detections(display, detections) 
-                    if self.is_get_pos:
-                        self.get_target_pos(detections)                
-                # 将帧送入推理队列（非阻塞）
-                try:
-                    self.frame_queue.put_nowait(frame.copy())
-                except queue.Full:
-                    pass
-                if self.show_window:
-                    # self.writer(self.show_window)
-                    cv2.imshow(self.window_name, display)
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        break
-                # 写入视频（如果启用）
-                if self.save_video and self.video_writer is not None:
-                    try:
-                        # 写入原始分辨率帧（frame）以避免缩放问题
-                        self.video_writer.write(display)
-                    except Exception:
-                        pass
-        except KeyboardInterrupt:
-            self.writer("用户中断提取过程")
+                self._publish_frame(frame)
         except Exception as e:
-            self.writer(f"发生错误: {e}")
+            self.writer(f"采集线程错误: {e}")
         finally:
-            self.stop()
+            self.frames.close()
+            self.cap.release()
 
+    def _overlay_loop(self, reader):
+        """叠加显示: 读取最新帧, 只在需要绘制时复制一份"""
+        font = cv2.FONT_HERSHEY_SIMPLEX; scale = 0.8; thickness = 2; margin = 6
+        draw = self.show_window or self.video_writer is not None
+        while not self.stop_event.is_set():
+            item = reader.read(timeout=0.5)
+            if item is None:
+                if self.frames.closed:
+                    break
+                continue
+            frame, frame_ts = item
+            # 获取最新检测结果
+            with self.out_lock:
+                detections = list(self.shared.get('detections', []))
+                detections_frame_ts = self.shared.get('frame_ts', None)
+            if detections and self.is_get_pos:
+                self.get_target_pos(detections, detections_frame_ts)
+            if not draw:
+                continue
+            display = frame.copy()
+            info_fps = f"FPS: {self.fps_counter.get_fps()}"
+            info_inference_fps = f"Inference FPS: {self.inference_fps_counter.get_fps()}"
+            info_resolution = f"Resolution: {self.locator.image_width}x{self.locator.image_height}"
+            (w1, h1), _ = cv2.getTextSize(info_fps, font, scale, thickness)
+            (w2, h2), _ = cv2.getTextSize(info_inference_fps, font, scale, thickness)
+            (w3, h3), _ = cv2.getTextSize(info_resolution, font, scale, thickness)
+            rect_w = max(w1, w2, w3) + margin * 2
+            rect_h = h1 + h2 + h3 + margin * 4
+            cv2.rectangle(display, (5, 5), (5 + rect_w, 5 + rect_h), (0, 0, 0), -1)
+            cv2.putText(display, info_fps, (10, 10 + h1), font, scale, (0, 255, 0), thickness)
+            cv2.putText(display, info_inference_fps, (10, 10 + h1 + h2 + margin), font, scale, (0, 255, 255), thickness)
+            cv2.putText(display, info_resolution, (10, 10 + h1 + h2 + h3 + margin * 2), font, scale, (255, 255, 0), thickness)
+            if detections and self.show_window:
+                self.draw_detections(display, detections)
+            # 叠加后的帧交给视频写入线程 (不再修改, 不复制)
+            if self.video_writer is not None:
+                self.display_frames.publish(display, frame_ts)
+            if self.show_window:
+                cv2.imshow(self.window_name, display)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+    def _recorder_loop(self, reader):
+        """视频写入: 编码慢时跳过叠加帧, 不影响采集和显示; video_writer 由本线程释放"""
+        try:
+            while True:
+                item = reader.read(timeout=0.5)
+                if item is None:
+                    if self.display_frames.closed:
+                        break
+                    continue
+                try:
+                    self.video_writer.write(item[0])
+                except Exception:
+                    pass
+        finally:
+            self.video_writer.release()
+            self.writer(f"已保存视频到: {self.save_path}")
 
     def stop(self):
         # 允许多次调用
         self.stop_event.set()
-        try:
-            if self.worker:
-                self.worker.join(timeout=1.0)
-        except Exception:
-            pass
-        if self.cap:
+        slot, self.slot = self.slot, None
+        if slot is not None:
+            # 注销后 _start_worker 可重新注册; 保留统计供 get_stats_str 使用
+            slot.close()
+            self.last_slot = slot
+        self.fps_counter.stop()
+        self.inference_fps_counter.stop()
+        current = threading.current_thread()
+        if self.capture_thread is not None:
+            if self.capture_thread is not current:
+                self.capture_thread.join(timeout=1.0)
+        elif self.cap:
+            # 采集线程未启动时由这里释放
             self.cap.release()
-        # 释放视频写入器并提示保存路径
-        try:
-            if self.video_writer:
-                self.video_writer.release()
-                self.writer(f"已保存视频到: {self.save_path}")
-        except Exception:
-            pass
+        self.display_frames.close()
+        if self.recorder_thread is not None and self.recorder_thread is not current:
+            self.recorder_thread.join(timeout=2.0)
         if self.show_window:
             try:
                 cv2.destroyAllWindows()
             except Exception:
                 pass
 
+    def get_stats_str(self):
+        """各阶段处理与丢帧统计"""
+        lines = [f"视频流 {self.rtmp_url}: 采集 {self.frames.seq} 帧"]
+        if hasattr(self.cap, "get_stats_str"):
+            lines.append(f"  {self.cap.get_stats_str()}")
+        lines.extend(f"  {reader.get_stats_str()}" for reader in self.readers)
+        slot = self.slot or self.last_slot
+        if slot is not None:
+            lines.append(f"  推理 {slot.get_stats_str()}")
+        lines.append(self.inference_server.get_stats_str())
+        return "\n".join(lines)
+
     # --- 外部辅助获取当前检测结果 ---
     def get_latest_detections(self):
         with self.out_lock:
@@ -262,10 +337,17 @@ class StreamPredictor:
         if self.main_thread:
             self.main_thread.join(timeout=timeout)
 
-    def get_target_pos(self, detections):
-        """Draw detections on a frame (in-place)."""
+    def get_target_pos(self, detections, frame_ts: float = None):
+        """Draw detections on a frame (in-place).
+
+        frame_ts: 检测所用帧的采集时刻, 给出时使用该时刻插值出的无人机位姿, 否则使用最新状态。
+        """
         if self.flight_state is not None:
-            if self.flight_state.lat is None or self.flight_state.lon is None:
+            # 同一批检测使用同一份位姿, 避免位置和高度来自不同的 OSD 消息
+            snap = self.flight_state.ring.at(frame_ts) if frame_ts is not None else None
+            if snap is None:
+                snap = self.flight_state.snapshot()
+            if snap.lat is None or snap.lon is None:
                 self.writer("无人机GPS位置未知，无法计算目标经纬度")
                 return
             for det in detections:
@@ -277,14 +359,14 @@ class StreamPredictor:
                 display_text = f"{label} {conf:.2f}"
                 # 将最新的 fov_info / liveview（如果有）传入定位器进行更精确的计算
                 target_lat, target_lon = self.locator.pixel_to_geo_coordinates(
-                    self.flight_state.lat, self.flight_state.lon,
-                    self.flight_state.elevation,
-                    center_point_x, center_point_y, self.flight_state.attitude_head,
+                    snap.lat, snap.lon,
+                    snap.elevation,
+                    center_point_x, center_point_y, snap.attitude_head,
                     fov_info=self.latest_fov_info, liveview_region=self.latest_liveview
                 )
                 self.writer(f"像素偏移: dx={center_point_x:.1f}, dy={center_point_y:.1f} 像素")
                 self.writer(f"检测到 {display_text} at (lat: {target_lat}, lon: {target_lon})")
-                self.writer(f"无人机当前位置 (lat: {self.flight_state.lat}, lon: {self.flight_state.lon}, alt: {self.flight_state.elevation} m, head: {self.flight_state.attitude_head}°)")
+                self.writer(f"无人机当前位置 (lat: {snap.lat}, lon: {snap.lon}, alt: {snap.elevation} m, head: {snap.attitude_head}°)")
 
     # ---- API: 更新实时 fov / liveview 信息 ----
     def update_fov_info(self, fov_info: dict):
@@ -350,7 +432,7 @@ if __name__ == "__main__":
                     message = {"detected": True,
                                "timestamp": time.time()}
                     # MQTT payload must be a string/bytes/number; serialize dict to JSON
-                    payload = json.dumps(message)
+                    payload = json_codec.dumps(message)
                     client.publish("indoor/target/detection", payload)
                     print("indoor/target/detection", "payload=", payload)
         time.sleep(0.5)
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""视频解码后端: OpenCV VideoCapture 或 ffmpeg 管道
+
+原先只能用 cv2.VideoCapture(rtmp_url): 无法设置低延迟参数、不能在解码端缩放、也拿不到像素格式控制,
+每次 read() 都新分配一帧数组。FFmpegCapture 提供与 VideoCapture 相同的 isOpened / read / get / release 接口:
+- 启动 ffmpeg 子进程解码为 bgr24 原始帧写到 stdout; 网络流加低延迟参数 (nobuffer / low_delay / 不预读分析)
+- size=(宽, 高) 时在解码端缩放 (例如缩到推理分辨率), 之后的拷贝、绘制、推理预处理都按小图进行
+- 用 readinto 直接把管道数据读进 FramePool 中预分配的 NumPy 数组, 不经过中间 bytes
+- 同时用 showinfo 滤镜输出每帧的显示时间戳 (pts 属性, 秒)
+FramePool 只复用没有其他引用的数组 (CPython 引用计数): 仍被 LatestFrameSlot、推理批次或其视图引用的帧
+不会被覆盖, 池内没有空闲数组时新分配, 池满后分配池外数组。
+VIDEO_DECODER 环境变量 (opencv / ffmpeg) 选择默认后端, 未安装 ffmpeg 时请保持 opencv。
+"""
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import numpy as np
+from CluodAPI_Terminal_Client import json_codec
+
+# 默认解码后端: opencv 或 ffmpeg
+VIDEO_DECODER = os.environ.get("VIDEO_DECODER", "opencv")
+FRAME_POOL_SIZE = 4             # 初始预分配的帧数
+FRAME_POOL_MAX = 16             # 池内最多帧数, 超过后分配池外数组
+PTS_TIMEOUT = 0.1               # 等待 showinfo 时间戳的最长时间(秒)
+# 与 cv2.CAP_PROP_* 相同的取值
+CAP_PROP_FRAME_WIDTH = 3
+CAP_PROP_FRAME_HEIGHT = 4
+CAP_PROP_FPS = 5
+# 网络流低延迟输入参数
+LOW_LATENCY_INPUT = ["-fflags", "nobuffer", "-flags", "low_delay", "-probesize", "32", "-analyzeduration", "0"]
+
+_PTS_RE = re.compile(rb"pts_time:\s*(-?[0-9.]+)")
+
+
+class FramePool:
+    """预分配的帧数组池, 只复用没有外部引用的数组"""
+    def __init__(self, shape, size: int = FRAME_POOL_SIZE, max_size: int = FRAME_POOL_MAX, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.max_size = max_size
+        self.buffers = [np.empty(self.shape, dtype) for _ in range(size)]
+        self.next_index = 0
+        # 统计
+        self.reused = 0
+        self.allocated = size
+        self.unpooled = 0
+
+    def acquire(self) -> np.ndarray:
+        count = len(self.buffers)
+        for offset in range(count):
+            index = (self.next_index + offset) % count
+            # 只有列表本身和 getrefcount 的参数引用时空闲 (视图通过 .base 也计入引用)
+            if sys.getrefcount(self.buffers[index]) <= 2:
+                self.next_index = index + 1
+                self.reused += 1
+                return self.buffers[index]
+        buffer = np.empty(self.shape, self.dtype)
+        if count < self.max_size:
+            self.buffers.append(buffer)
+            self.allocated += 1
+        else:
+            self.unpooled += 1
+        return buffer
+
+    def get_stats_str(self):
+        return f"帧缓冲池: {len(self.buffers)} 帧, 复用 {self.reused} 次, 池内分配 {self.allocated}, 池外分配 {self.unpooled}"
+
+
+def probe_video(url: str, timeout: float = 10.0):
+    """用 ffprobe 读取 (宽, 高, 帧率), 失败时返回 None"""
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate", "-of", "json", url]
+    try:
+        output = subprocess.run(command, capture_output=True, timeout=timeout, check=True).stdout
+        stream = json_codec.loads(output)["streams"][0]
+    except Exception:
+        return None
+    fps = 0.0
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        num, _, den = stream.get(key, "0/0").partition("/")
+        if den and float(den) and float(num):
+            fps = float(num) / float(den)
+            break
+    return int(stream["width"]), int(stream["height"]), fps
+
+
+class FFmpegCapture:
+    """ffmpeg 管道解码, 接口与 cv2.VideoCapture 相同"""
+    def __init__(self, url: str, size=None, low_latency: bool = None, pool_size: int = FRAME_POOL_SIZE,
+                 ffmpeg: str = "ffmpeg", probe_timeout: float = 10.0):
+        """size: (宽, 高) 解码端缩放; low_latency: 默认对网络流 (含 ://) 开启"""
+        self.url = url
+        self.proc = None
+        self.pool = None
+        self.pts = None             # 最近一帧的显示时间戳(秒)
+        self.frames = 0
+        self.pts_queue = queue.Queue()
+        info = probe_video(url, probe_timeout) if shutil.which("ffprobe") else None
+        self.fps = info[2] if info else 0.0
+        if size is not None:
+            self.width, self.height = size
+        elif info is not None:
+            self.width, self.height = info[0], info[1]
+        else:
+            self.width = self.height = 0
+            return
+        if shutil.which(ffmpeg) is None:
+            return
+        if low_latency is None:
+            low_latency = "://" in url
+        filters = ([f"scale={self.width}:{self.height}"] if size is not None else []) + ["showinfo"]
+        command = [ffmpeg, "-hide_banner", "-nostdin", "-nostats", "-loglevel", "info"]
+        if low_latency:
+            command += LOW_LATENCY_INPUT
+        command += ["-i", url, "-an", "-sn", "-vf", ",".join(filters), "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        # bufsize=0: readinto 直接从管道读入帧数组, 不经过 BufferedReader 的缓冲区
+        self.proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        self.pool = FramePool((self.height, self.width, 3), pool_size)
+        self.frame_bytes = self.height * self.width * 3
+        self.stderr_thread = threading.Thread(target=self._read_stderr, daemon=True)
+        self.stderr_thread.start()
+
+    def _read_stderr(self):
+        """解析 showinfo 每帧一行的 pts_time; stderr 由本线程在 ffmpeg 退出后关闭"""
+        try:
+            for line in iter(self.proc.stderr.readline, b""):
+                match = _PTS_RE.search(line)
+                if match:
+                    self.pts_queue.put(float(match.group(1)))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.proc.stderr.close()
+
+    def isOpened(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def read(self):
+        """返回 (ret, frame), frame 为池内数组 (只读共享, 修改前请复制)"""
+        if self.proc is None:
+            return False, None
+        frame = self.pool.acquire()
+        view = memoryview(frame.reshape(-1))
+        got = 0
+        while got < self.frame_bytes:
+            n = self.proc.stdout.readinto(view[got:])
+            if not n:
+                return False, None
+            got += n
+        try:
+            self.pts = self.pts_queue.get(timeout=PTS_TIMEOUT)
+        except queue.Empty:
+            self.pts = None
+        self.frames += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def release(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+        try:
+            self.proc.stdout.close()
+        except Exception:
+            pass
+
+    def get_stats_str(self):
+        if self.pool is None:
+            return f"ffmpeg 解码: 未打开 {self.url}"
+        return f"ffmpeg 解码 {self.width}x{self.height}: {self.frames} 帧, " + self.pool.get_stats_str()
+
+
+def open_video_capture(url: str, decoder: str = VIDEO_DECODER, size=None):
+    """按 decoder 打开视频源; opencv 后端不支持 size, 由调用方自行缩放"""
+    if decoder == "ffmpeg":
+        return FFmpegCapture(url, size=size)
+    import cv2
+    return cv2.VideoCapture(url)
+
+
+def parse_size(text: str):
+    """"1280x720" -> (1280, 720), 空值返回 None"""
+    if not text:
+        return None
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)